@@ -0,0 +1,118 @@
+# backfill.py
+# Tải lịch sử nến sâu (nhiều tháng / năm) vào candle store của kucoin_api.
+# Chia khoảng thời gian thành các trang startAt/endAt, tải song song qua rate scheduler chung,
+# ghi tiến độ để chạy lại sau khi bị ngắt thì chỉ tải phần còn thiếu.
+#
+#   python backfill.py --days 365 --interval 1hour block1 ETH/USDT
+
+import argparse
+import json
+import os
+import threading
+import time
+from concurrent.futures import ThreadPoolExecutor, as_completed
+
+from gpt_signal_builder import BLOCKS
+from kucoin_api import (
+    INTERVAL_SECONDS, KUCOIN_CONCURRENCY, KUCOIN_MAX_CANDLES,
+    fetch_candle_range, merge_into_cache,
+)
+
+STATE_FILE = os.getenv("BACKFILL_STATE_FILE", "backfill_state.json")
+
+_state_lock = threading.Lock()
+
+def load_state():
+    try:
+        with open(STATE_FILE, "r") as f:
+            return json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+
+def save_state(state):
+    tmp = STATE_FILE + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump(state, f)
+    os.replace(tmp, STATE_FILE)
+
+def _state_key(symbol, interval):
+    return f"{symbol.replace('/', '-')}_{interval}"
+
+def plan_chunks(start_at, end_at, interval):
+    """
+    Chia [start_at, end_at] thành các trang <= KUCOIN_MAX_CANDLES nến.
+    Mốc trang căn theo lưới tuyệt đối nên giống nhau giữa các lần chạy -> resume được.
+    """
+    step = INTERVAL_SECONDS[interval]
+    span = (KUCOIN_MAX_CANDLES - 1) * step
+    chunk_start = start_at - start_at % span
+    chunks = []
+    while chunk_start < end_at:
+        chunks.append((chunk_start, min(chunk_start + span, end_at)))
+        chunk_start += span
+    return chunks
+
+def resolve_symbols(names):
+    """Nhận tên block hoặc cặp giao dịch; rỗng = toàn bộ BLOCKS."""
+    if not names:
+        names = list(BLOCKS)
+    symbols = []
+    for name in names:
+        for sym in BLOCKS.get(name, [name]):
+            if sym not in symbols:
+                symbols.append(sym)
+    return symbols
+
+def backfill(symbols, interval="1hour", days=365, workers=None):
+    now = int(time.time())
+    start_at = now - days * 86400
+    state = load_state()
+
+    jobs = []
+    for symbol in symbols:
+        done = {tuple(c) for c in state.get(_state_key(symbol, interval), [])}
+        for chunk in plan_chunks(start_at, now, interval):
+            if chunk not in done:
+                jobs.append((symbol, chunk))
+
+    print(f"📥 Backfill {interval} {days} ngày cho {len(symbols)} mã: {len(jobs)} trang cần tải")
+    if not jobs:
+        return
+
+    def run(symbol, chunk):
+        arrays = fetch_candle_range(symbol, interval, chunk[0], chunk[1])
+        merge_into_cache(symbol, interval, arrays)
+        return len(arrays["ts"])
+
+    ok = failed = 0
+    with ThreadPoolExecutor(max_workers=workers or KUCOIN_CONCURRENCY, thread_name_prefix="backfill") as pool:
+        futures = {pool.submit(run, symbol, chunk): (symbol, chunk) for symbol, chunk in jobs}
+        for fut in as_completed(futures):
+            symbol, chunk = futures[fut]
+            try:
+                n = fut.result()
+            except Exception as e:
+                failed += 1
+                print(f"⚠️ {symbol} trang {chunk[0]}-{chunk[1]} lỗi: {e}")
+                continue
+            ok += 1
+            # trang chứa nến đang chạy chưa được đánh dấu xong để lần sau tải lại
+            if chunk[1] < now - INTERVAL_SECONDS[interval]:
+                with _state_lock:
+                    state.setdefault(_state_key(symbol, interval), []).append(list(chunk))
+                    save_state(state)
+            print(f"✅ {symbol} {interval}: +{n} nến ({ok}/{len(jobs)})")
+
+    print(f"🏁 Backfill xong: {ok} trang OK, {failed} trang lỗi" + (" (chạy lại để tải tiếp)" if failed else ""))
+
+def main():
+    parser = argparse.ArgumentParser(description="Backfill lịch sử nến KuCoin vào candle store")
+    parser.add_argument("symbols", nargs="*", help="tên block hoặc cặp (vd. block1 BTC/USDT); mặc định tất cả")
+    parser.add_argument("--interval", default="1hour", choices=sorted(INTERVAL_SECONDS))
+    parser.add_argument("--days", type=int, default=365)
+    parser.add_argument("--workers", type=int, default=None)
+    args = parser.parse_args()
+    backfill(resolve_symbols(args.symbols), args.interval, args.days, args.workers)
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,198 @@
+# batch_screen.py
+# Sàng lọc cả universe một lượt: xếp close/high/low/volume của mọi mã thành mảng 2D
+# (mỗi hàng 1 mã), tính chỉ báo + momentum 1H + các filter dạng snapshot
+# (rsi_regime / anti_fomo_extension / exhaustion_cooldown) bằng phép toán mảng,
+# trả về mask đạt/trượt kèm lý do cho từng mã. Mã có độ dài chuỗi khác nhau được gom
+# theo độ dài để Wilder / SMA tính đúng như khi chạy riêng từng mã.
+#
+#   python batch_screen.py block1 block2   # fetch + sàng lọc, in mã bị loại
+
+import sys
+from collections import defaultdict
+
+import numpy as np
+
+import indicator_backends
+from candle_frame import as_frame
+from filters import FILTERS_CONFIG
+
+FEATURE_COLUMNS = ("open", "close", "high", "low", "volume")
+INDICATOR_KEYS = ("rsi", "ma20", "ma50", "bb_lower", "bb_mid", "bb_upper", "atr")
+MOMENTUM_KEYS = ("pct_change_1h", "bb_width_ratio", "atr_spike_ratio", "volume_spike_ratio")
+TREND_UNKNOWN = "unknown"
+
+def stack(series_by_symbol):
+    """
+    {symbol: candles} -> [(symbols, {col: mảng 2D})], mỗi phần tử là một nhóm mã cùng số nến.
+    candles nhận list-of-dict, dict cột hoặc CandleFrame.
+    """
+    groups = defaultdict(list)
+    frames = {}
+    for symbol, candles in series_by_symbol.items():
+        frame = as_frame(candles)
+        if len(frame):
+            frames[symbol] = frame
+            groups[len(frame)].append(symbol)
+    out = []
+    for _, symbols in sorted(groups.items()):
+        cols = {c: np.vstack([frames[s][c].astype(np.float64) for s in symbols]) for c in FEATURE_COLUMNS}
+        out.append((symbols, cols))
+    return out
+
+def batch_indicators(cols):
+    backend = indicator_backends.active()
+    close = cols["close"]
+    lower, mid, upper = backend.bollinger(close, 20)
+    return {
+        "rsi": backend.rsi(close),
+        "ma20": backend.sma(close, 20),
+        "ma50": backend.sma(close, 50),
+        "bb_lower": lower,
+        "bb_mid": mid,
+        "bb_upper": upper,
+        "atr": backend.atr(cols["high"], cols["low"], close),
+    }
+
+def _truthy(a):
+    return ~np.isnan(a) & (a != 0)
+
+def batch_trend(close, ma20, ma50):
+    """classify_trend cho vector giá trị nến cuối."""
+    ok = _truthy(ma20) & _truthy(ma50)
+    up = ok & (close > ma20) & (ma20 > ma50)
+    down = ok & (close < ma20) & (ma20 < ma50)
+    return np.select([up, down, ok], ["uptrend", "downtrend", "sideways"], TREND_UNKNOWN).astype(object)
+
+def _spike_ratio(series, lookback, exclude_zero=False):
+    last = series[:, -1]
+    hist = series[:, -(lookback + 1):-1]
+    valid = ~np.isnan(hist)
+    if exclude_zero:
+        valid &= hist != 0
+    count = valid.sum(axis=1)
+    total = np.where(valid, hist, 0.0).sum(axis=1)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        avg = np.where(count > 0, total / np.maximum(count, 1), np.nan)
+        return np.where(_truthy(last) & _truthy(avg), last / avg, np.nan)
+
+def batch_momentum(cols, ind, lookback=20, pct_window=1):
+    """compute_short_term_momentum cho cả nhóm (NaN = None, làm tròn 3 chữ số)."""
+    close = cols["close"]
+    rows, n = close.shape
+    if n < max(lookback + 2, 22):
+        nan = np.full(rows, np.nan)
+        return {k: nan.copy() for k in MOMENTUM_KEYS}
+
+    last, prev = close[:, -1], close[:, -1 - max(1, pct_window)]
+    mid = np.where(_truthy(ind["bb_mid"]), ind["bb_mid"], np.where(_truthy(ind["ma20"]), ind["ma20"], close))
+    has_bb = ~np.isnan(ind["bb_lower"]) & ~np.isnan(ind["bb_upper"]) & _truthy(mid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        pct = np.where(_truthy(prev), (last - prev) / prev * 100.0, np.nan)
+        width = np.where(has_bb, (ind["bb_upper"] - ind["bb_lower"]) / mid, np.nan)
+    return {
+        "pct_change_1h": np.round(pct, 3),
+        "bb_width_ratio": np.round(_spike_ratio(width, lookback), 3),
+        "atr_spike_ratio": np.round(_spike_ratio(ind["atr"], lookback), 3),
+        "volume_spike_ratio": np.round(_spike_ratio(cols["volume"], lookback, exclude_zero=True), 3),
+    }
+
+def _timeframe_features(series_by_symbol, symbols, with_momentum=False):
+    """Giá trị nến cuối (và momentum) của 1 khung cho mọi mã, theo thứ tự `symbols`."""
+    pos = {s: i for i, s in enumerate(symbols)}
+    keys = ("open", "close", "high", "low") + INDICATOR_KEYS + (MOMENTUM_KEYS if with_momentum else ())
+    feats = {k: np.full(len(symbols), np.nan) for k in keys}
+    trend = np.full(len(symbols), TREND_UNKNOWN, dtype=object)
+    for group, cols in stack({s: series_by_symbol[s] for s in symbols if s in series_by_symbol}):
+        idx = np.array([pos[s] for s in group])
+        ind = batch_indicators(cols)
+        for key in ("close", "open", "high", "low"):
+            feats[key][idx] = cols[key][:, -1]
+        for key, values in ind.items():
+            feats[key][idx] = values[:, -1]
+        trend[idx] = batch_trend(cols["close"][:, -1], ind["ma20"][:, -1], ind["ma50"][:, -1])
+        if with_momentum:
+            for key, values in batch_momentum(cols, ind).items():
+                feats[key][idx] = values
+    feats["trend"] = trend
+    return feats
+
+class ScreenResult:
+    """mask[i] = mã symbols[i] qua cả 3 filter snapshot; reasons[symbol] = lý do bị loại."""
+
+    def __init__(self, symbols, mask, reasons, features):
+        self.symbols = symbols
+        self.mask = mask
+        self.reasons = reasons
+        self.features = features   # {tf: {key: mảng theo symbols}}
+
+    def passed(self):
+        return [s for s, ok in zip(self.symbols, self.mask) if ok]
+
+    def rejected(self):
+        return {s: self.reasons[s] for s, ok in zip(self.symbols, self.mask) if not ok}
+
+    def snapshot(self, symbol, tf="4H"):
+        i = self.symbols.index(symbol)
+        out = {}
+        for key, values in self.features.get(tf, {}).items():
+            v = values[i]
+            out[key] = v if isinstance(v, str) else (None if np.isnan(v) else float(v))
+        return out
+
+def screen(universe, cfg=None):
+    """
+    universe: {symbol: {"1H": candles, "4H": candles, "1D": candles}} (như run_block).
+    Áp cùng logic filters.rsi_regime / anti_fomo_extension / exhaustion_cooldown trên snapshot 4H
+    (spike lấy từ 1H, trend từ 1D) cho mọi mã cùng lúc.
+    """
+    cfg = cfg or FILTERS_CONFIG
+    symbols = list(universe)
+    features = {}
+    for tf in ("1H", "4H", "1D"):
+        series = {s: universe[s][tf] for s in symbols if tf in universe[s]}
+        features[tf] = _timeframe_features(series, symbols, with_momentum=(tf == "1H"))
+
+    f4, f1 = features["4H"], features["1H"]
+    close, ma20, atr, rsi = f4["close"], f4["ma20"], f4["atr"], f4["rsi"]
+    trend_1d = features["1D"]["trend"]
+    atr_ok = ~np.isnan(atr) & (atr != 0)
+    base_ok = ~np.isnan(close) & ~np.isnan(ma20) & atr_ok
+    with np.errstate(divide="ignore", invalid="ignore"):
+        dist = np.where(base_ok, (close - ma20) / atr, np.nan)
+
+    # rsi_regime
+    rsi_fail = (base_ok & ~np.isnan(rsi) & (trend_1d == "uptrend")
+                & (rsi > cfg.get("rsi_overheat", 75)) & (np.abs(dist) > cfg.get("rsi_distance_atr", 1.2)))
+    # anti_fomo_extension
+    fomo_fail = base_ok & (dist > cfg.get("anti_fomo_dist_atr", 1.5))
+    # exhaustion_cooldown (spike 1H)
+    atr_sp, vol_sp = f1["atr_spike_ratio"], f1["volume_spike_ratio"]
+    exhaust_fail = (~np.isnan(atr_sp) & ~np.isnan(vol_sp)
+                    & (atr_sp > cfg.get("exhaustion_atr_spike", 1.8)) & (vol_sp > cfg.get("exhaustion_vol_spike", 1.8)))
+
+    mask = ~(rsi_fail | fomo_fail | exhaust_fail)
+    reasons = {}
+    for i in np.flatnonzero(~mask):
+        why = []
+        if rsi_fail[i]:
+            why.append(f"rsi_regime -> rsi_overheat:{rsi[i]:.1f}|dist:{abs(dist[i]):.2f}ATR")
+        if fomo_fail[i]:
+            why.append(f"anti_fomo -> anti_fomo: dist={dist[i]:.2f}ATR")
+        if exhaust_fail[i]:
+            why.append("exhaustion -> exhaustion")
+        reasons[symbols[i]] = why
+    return ScreenResult(symbols, mask, reasons, features)
+
+if __name__ == "__main__":
+    import asyncio
+    from gpt_signal_builder import BLOCKS
+    from kucoin_api import fetch_market_data_async
+    from resampler import derive_timeframes
+
+    names = sys.argv[1:] or list(BLOCKS)
+    syms = [s for name in names for s in BLOCKS.get(name, [name])]
+    fetched = asyncio.run(fetch_market_data_async(syms, {"1H": "1hour"}, limit=101 * 24))
+    result = screen({s: derive_timeframes(fetched[s]["1H"], limit=100) for s in syms})
+    for sym, why in result.rejected().items():
+        print(f"⛔ {sym}: {'; '.join(why)}")
+    print(f"✅ {len(result.passed())}/{len(syms)} mã qua sàng lọc")
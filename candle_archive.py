@@ -0,0 +1,143 @@
+# candle_archive.py
+# Kho nến dài hạn dạng cột nhị phân: mỗi (symbol, interval) một thư mục, mỗi cột một file
+# raw little-endian (ts int64, OHLCV float64). Ghi kiểu append-only, đọc bằng memmap nên
+# tải nhiều năm nến 1H gần như không copy / không parse.
+#
+#   candle_archive/BTC-USDT_1hour/{ts.i8, open.f8, close.f8, high.f8, low.f8, volume.f8}
+
+import os
+import shutil
+import fcntl
+from contextlib import contextmanager
+
+import numpy as np
+
+ARCHIVE_DIR = os.getenv("CANDLE_ARCHIVE_DIR", "candle_archive")
+
+COLUMNS = ("ts", "open", "close", "high", "low", "volume")
+DTYPES = {k: np.dtype("<f8") for k in COLUMNS}
+DTYPES["ts"] = np.dtype("<i8")
+_EXT = {"<i8": "i8", "<f8": "f8"}
+
+def _series_dir(symbol, interval, root=None):
+    return os.path.join(root or ARCHIVE_DIR, f"{symbol.replace('/', '-')}_{interval}")
+
+def _col_path(dirpath, col):
+    return os.path.join(dirpath, f"{col}.{_EXT[DTYPES[col].str]}")
+
+def _empty():
+    return {k: np.empty(0, dtype=DTYPES[k]) for k in COLUMNS}
+
+@contextmanager
+def _locked(dirpath, shared=False):
+    """
+    Khoá file theo series để nhiều process (main / tracker / backfill) không ghi chồng nhau.
+    shared=True cho người đọc: đọc song song được, nhưng chờ lần ghi lại toàn bộ series xong.
+    """
+    os.makedirs(os.path.dirname(dirpath) or ".", exist_ok=True)
+    with open(dirpath + ".lock", "a") as lock_file:
+        fcntl.flock(lock_file, fcntl.LOCK_SH if shared else fcntl.LOCK_EX)
+        try:
+            yield
+        finally:
+            fcntl.flock(lock_file, fcntl.LOCK_UN)
+
+def _length(dirpath):
+    """Số nến hợp lệ = cột ngắn nhất (phòng khi bị ngắt giữa lúc append)."""
+    sizes = []
+    for col in COLUMNS:
+        path = _col_path(dirpath, col)
+        if not os.path.exists(path):
+            return 0
+        sizes.append(os.path.getsize(path) // DTYPES[col].itemsize)
+    return min(sizes)
+
+def load(symbol, interval, start_ts=None, end_ts=None, root=None):
+    """
+    Trả về dict cột (np.memmap read-only) tăng dần theo ts, tuỳ chọn cắt [start_ts, end_ts].
+    Không copy dữ liệu: slice trên memmap chỉ đọc các trang cần dùng.
+    Giữ khoá chia sẻ lúc mở để không rơi vào khoảng _write_all đang đổi thư mục; memmap đã mở
+    vẫn trỏ vào file cũ nên dùng tiếp được sau khi nhả khoá.
+    """
+    dirpath = _series_dir(symbol, interval, root)
+    if not os.path.exists(dirpath + ".lock"):
+        return _empty()   # chưa từng ghi
+    with _locked(dirpath, shared=True):
+        return _load(dirpath, start_ts, end_ts)
+
+def _load(dirpath, start_ts=None, end_ts=None):
+    """Như load nhưng không khoá (người gọi đã giữ khoá)."""
+    n = _length(dirpath)
+    if n == 0:
+        return _empty()
+    cols = {col: np.memmap(_col_path(dirpath, col), dtype=DTYPES[col], mode="r", shape=(n,)) for col in COLUMNS}
+    lo = 0 if start_ts is None else int(np.searchsorted(cols["ts"], start_ts, side="left"))
+    hi = n if end_ts is None else int(np.searchsorted(cols["ts"], end_ts, side="right"))
+    return {col: arr[lo:hi] for col, arr in cols.items()}
+
+def last_ts(symbol, interval, root=None):
+    dirpath = _series_dir(symbol, interval, root)
+    n = _length(dirpath)
+    if n == 0:
+        return None
+    with open(_col_path(dirpath, "ts"), "rb") as f:
+        f.seek((n - 1) * DTYPES["ts"].itemsize)
+        return int(np.frombuffer(f.read(DTYPES["ts"].itemsize), dtype=DTYPES["ts"])[0])
+
+def _write_all(dirpath, arrays):
+    """
+    Ghi lại toàn bộ series (dùng khi chèn dữ liệu cũ hơn đuôi): ghi ra thư mục tạm rồi đổi tên.
+    Giữa hai lần os.replace thư mục không tồn tại, nên người gọi phải giữ khoá ghi (load chờ khoá).
+    """
+    tmp = dirpath + ".tmp"
+    shutil.rmtree(tmp, ignore_errors=True)
+    os.makedirs(tmp)
+    for col in COLUMNS:
+        np.ascontiguousarray(arrays[col], dtype=DTYPES[col]).tofile(_col_path(tmp, col))
+    old = dirpath + ".old"
+    shutil.rmtree(old, ignore_errors=True)
+    if os.path.exists(dirpath):
+        os.replace(dirpath, old)
+    os.replace(tmp, dirpath)
+    shutil.rmtree(old, ignore_errors=True)
+
+def _merge(old, new):
+    """Gộp theo ts; bản ghi của `new` thắng khi trùng ts."""
+    ts = np.concatenate([new["ts"], old["ts"]])
+    _, idx = np.unique(ts, return_index=True)
+    return {col: np.concatenate([new[col], old[col]])[idx] for col in COLUMNS}
+
+def append(symbol, interval, arrays, root=None):
+    """
+    Thêm nến vào series. Trường hợp thường gặp (nến mới hơn đuôi, có thể trùng nến cuối đang chạy)
+    chỉ ghi đè nến cuối tại chỗ + append cuối file. Nếu có nến cũ hơn đuôi (backfill) thì gộp và ghi lại.
+    """
+    new_ts = np.asarray(arrays["ts"], dtype=DTYPES["ts"])
+    if len(new_ts) == 0:
+        return
+    dirpath = _series_dir(symbol, interval, root)
+    with _locked(dirpath):
+        n = _length(dirpath)
+        tail = last_ts(symbol, interval, root) if n else None
+        if tail is not None and new_ts[0] < tail:
+            current = {col: np.array(arr) for col, arr in _load(dirpath).items()}
+            _write_all(dirpath, _merge(current, arrays))
+            return
+
+        os.makedirs(dirpath, exist_ok=True)
+        overwrite_last = tail is not None and new_ts[0] == tail
+        for col in COLUMNS:
+            data = np.ascontiguousarray(arrays[col], dtype=DTYPES[col])
+            path = _col_path(dirpath, col)
+            with open(path, "r+b" if os.path.exists(path) else "wb") as f:
+                # chỉ cắt khi cột dài hơn n nến (phần thừa của lần append bị ngắt trước đó)
+                if os.fstat(f.fileno()).st_size > n * DTYPES[col].itemsize:
+                    f.truncate(n * DTYPES[col].itemsize)
+                f.seek((n - 1 if overwrite_last else n) * DTYPES[col].itemsize)
+                f.write(data.tobytes())
+
+def write(symbol, interval, arrays, root=None):
+    """Ghi đè toàn bộ series."""
+    dirpath = _series_dir(symbol, interval, root)
+    with _locked(dirpath):
+        _write_all(dirpath, arrays)
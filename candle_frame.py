@@ -0,0 +1,185 @@
+# candle_frame.py
+# Khung nến dạng cột: mỗi field một mảng numpy (float64, NaN = thiếu) thay cho list-of-dict.
+# Chỉ báo / filters / eligibility đọc thẳng cột; view dict (frame[-1], iter, to_dicts) giữ
+# tương thích cho gpt_signal_builder / signal_logger.
+
+import math
+from datetime import datetime, timezone
+
+import numpy as np
+
+def _py(v):
+    """Giá trị numpy -> Python thuần (NaN -> None) để json.dump / prompt không đổi."""
+    if isinstance(v, np.generic):
+        v = v.item()
+    if isinstance(v, float) and math.isnan(v):
+        return None
+    return v
+
+class CandleFrame:
+    """
+    - frame["close"]  -> cột numpy
+    - frame[-1]       -> dict snapshot 1 nến (kèm meta như sr_levels nếu là nến cuối)
+    - frame[a:b]      -> CandleFrame con
+    - frame.last(k)   -> giá trị nến cuối của cột k (None nếu thiếu)
+    - meta            -> dict gắn vào nến cuối (vd. "sr_levels")
+
+    Lớp con có thể tính cột theo yêu cầu qua _ensure(key) / _ensure_all() (xem
+    indicators.IndicatorFrame); frame con cắt từ đó lấy cột từ frame cha khi cần.
+    Cột trong `row_hidden` (cột nội bộ như bitmask mẫu nến) không xuất hiện trong view dict.
+    """
+
+    row_hidden = frozenset()
+
+    def __init__(self, columns, meta=None, n=None):
+        self.columns = dict(columns)
+        self.meta = dict(meta or {})
+        if n is None:
+            n = len(next(iter(self.columns.values()))) if self.columns else 0
+        self._n = n
+        self._parent = None   # (frame cha, slice) nếu frame này là lát cắt của frame tính lười
+
+    # --- dựng frame ---
+    @classmethod
+    def from_candles(cls, candles):
+        """list-of-dict (định dạng fetch_coin_data) -> CandleFrame."""
+        if not candles:
+            return cls({})
+        columns = {}
+        meta = {}
+        for key, sample in candles[0].items():
+            if isinstance(sample, str):
+                columns[key] = np.array([c.get(key) for c in candles], dtype=object)
+            elif sample is None or isinstance(sample, (int, float)):
+                vals = [c.get(key) for c in candles]
+                columns[key] = np.array([np.nan if v is None else v for v in vals], dtype=np.float64)
+        for key, val in candles[-1].items():
+            if key not in columns and isinstance(val, (list, tuple, dict)):
+                meta[key] = val
+        return cls(columns, meta)
+
+    @classmethod
+    def from_arrays(cls, arrays):
+        """dict cột từ kucoin_api (ts int64 + OHLCV float64) -> CandleFrame, không copy."""
+        return cls({k: np.asarray(v) for k, v in arrays.items()})
+
+    # --- truy cập ---
+    def __len__(self):
+        return self._n
+
+    def __contains__(self, key):
+        self._ensure(key)
+        return key in self.columns or key in self.meta
+
+    def __getitem__(self, key):
+        if isinstance(key, str):
+            self._ensure(key)
+            return self.columns[key]
+        if isinstance(key, slice):
+            start, stop, _ = key.indices(self._n)
+            at_end = stop == self._n
+            sub = CandleFrame({k: v[key] for k, v in self.columns.items()}, self.meta if at_end else {},
+                              n=len(range(*key.indices(self._n))))
+            if self._lazy():
+                sub._parent = (self, key, at_end)
+            if self.row_hidden:
+                sub.row_hidden = self.row_hidden
+            return sub
+        return self.row(key)
+
+    # --- tính lười (lớp con override) ---
+    def _lazy(self):
+        return self._parent is not None
+
+    def _ensure(self, key):
+        """Bảo đảm cột/meta `key` có sẵn nếu có thể tính được; frame thường không làm gì."""
+        if self._parent is None or key in self.columns or key in self.meta:
+            return
+        parent, sl, at_end = self._parent
+        parent._ensure(key)
+        if key in parent.columns:
+            self.columns[key] = parent.columns[key][sl]
+        elif at_end and key in parent.meta:
+            self.meta[key] = parent.meta[key]
+
+    def _ensure_all(self):
+        if self._parent is None:
+            return
+        parent, _, _ = self._parent
+        parent._ensure_all()
+        for key in list(parent.columns) + list(parent.meta):
+            self._ensure(key)
+
+    def __iter__(self):
+        for i in range(self._n):
+            yield self.row(i)
+
+    def keys(self):
+        self._ensure_all()
+        return list(self.columns)
+
+    def get(self, key, default=None):
+        """Cột `key` hoặc `default` nếu không có."""
+        self._ensure(key)
+        return self.columns.get(key, default)
+
+    def row(self, i):
+        """Dict snapshot của nến thứ i (giá trị Python thuần)."""
+        if i < 0:
+            i += self._n
+        if not 0 <= i < self._n:
+            raise IndexError(i)
+        self._ensure_all()
+        out = {}
+        if "ts" in self.columns and "time" not in self.columns:
+            out["time"] = datetime.fromtimestamp(int(self.columns["ts"][i]), tz=timezone.utc).isoformat()
+        for k, v in self.columns.items():
+            if k not in self.row_hidden:
+                out[k] = _py(v[i])
+        if i == self._n - 1:
+            out.update(self.meta)
+        return out
+
+    def last(self, key, default=None):
+        self._ensure(key)
+        if key in self.meta:
+            return self.meta[key]
+        col = self.columns.get(key)
+        if col is None or self._n == 0:
+            return default
+        v = _py(col[-1])
+        return default if v is None else v
+
+    def series(self, key):
+        """Cột dạng list Python (NaN -> None), cho code còn làm việc với list."""
+        col = self.get(key)
+        if col is None:
+            return [None] * self._n
+        return [_py(v) for v in col.tolist()]
+
+    def valid(self, key):
+        """Các giá trị không thiếu của cột (bỏ NaN), thứ tự giữ nguyên."""
+        col = self.get(key)
+        if col is None:
+            return np.empty(0, dtype=np.float64)
+        if col.dtype == object:
+            return col[np.array([v is not None for v in col], dtype=bool)]
+        return col[~np.isnan(col)]
+
+    def set(self, key, values):
+        self.columns[key] = np.asarray(values, dtype=np.float64)
+
+    def to_dicts(self):
+        return list(self)
+
+def as_frame(candles):
+    """Chấp nhận CandleFrame / list-of-dict / dict cột, luôn trả về CandleFrame."""
+    if isinstance(candles, CandleFrame):
+        return candles
+    if isinstance(candles, dict):
+        return CandleFrame.from_arrays(candles)
+    return CandleFrame.from_candles(candles or [])
+
+def column(values):
+    """list có None -> mảng float64 với NaN."""
+    return np.array([np.nan if v is None else v for v in values], dtype=np.float64)
@@ -0,0 +1,94 @@
+# candle_patterns.py
+# Quét mẫu nến cho mọi nến của chuỗi bằng so sánh mảng, trả về bitmask uint16 mỗi nến
+# (một nến có thể khớp nhiều mẫu). Nhận 1D (1 mã) hoặc 2D (mỗi hàng 1 mã, trục cuối là nến),
+# dùng chung cho pipeline live (cột "patterns" của IndicatorFrame) và backtest.
+
+import numpy as np
+
+from candle_frame import as_frame
+
+BULLISH_ENGULFING = 1 << 0   # nến trước giảm, nến này tăng và đóng trên open nến trước
+BEARISH_ENGULFING = 1 << 1   # nến trước tăng, nến này giảm và đóng dưới open nến trước
+DOJI              = 1 << 2   # thân < 10% biên độ
+HAMMER            = 1 << 3   # bóng dưới >= 2 lần thân, bóng trên <= 25% biên độ
+SHOOTING_STAR     = 1 << 4   # bóng trên >= 2 lần thân, bóng dưới <= 25% biên độ
+INSIDE_BAR        = 1 << 5   # high < high trước và low > low trước
+OUTSIDE_BAR       = 1 << 6   # high > high trước và low < low trước
+BULLISH_MARUBOZU  = 1 << 7   # nến tăng, thân >= 90% biên độ
+BEARISH_MARUBOZU  = 1 << 8   # nến giảm, thân >= 90% biên độ
+MORNING_STAR      = 1 << 9   # giảm thân dài, thân nhỏ, tăng đóng trên giữa thân nến đầu
+EVENING_STAR      = 1 << 10  # tăng thân dài, thân nhỏ, giảm đóng dưới giữa thân nến đầu
+
+PATTERN_NAMES = {
+    BULLISH_ENGULFING: "bullish engulfing",
+    BEARISH_ENGULFING: "bearish engulfing",
+    DOJI: "doji",
+    HAMMER: "hammer",
+    SHOOTING_STAR: "shooting star",
+    INSIDE_BAR: "inside bar",
+    OUTSIDE_BAR: "outside bar",
+    BULLISH_MARUBOZU: "bullish marubozu",
+    BEARISH_MARUBOZU: "bearish marubozu",
+    MORNING_STAR: "morning star",
+    EVENING_STAR: "evening star",
+}
+
+# Thứ tự ưu tiên của main.detect_candle_signal (tín hiệu đơn cho prompt GPT)
+SIGNAL_PRIORITY = (BULLISH_ENGULFING, BEARISH_ENGULFING, DOJI)
+
+def _shift(a, k):
+    """a dịch phải k nến theo trục cuối; k nến đầu là NaN."""
+    out = np.full(a.shape, np.nan)
+    if a.shape[-1] > k:
+        out[..., k:] = a[..., :-k]
+    return out
+
+def scan_arrays(open_, high, low, close):
+    o, h, l, c = (np.asarray(x, dtype=np.float64) for x in (open_, high, low, close))
+    body = np.abs(c - o)
+    rng = h - l
+    upper = h - np.maximum(o, c)
+    lower = np.minimum(o, c) - l
+    bull, bear = c > o, c < o
+
+    po, pc, ph, pl = (_shift(x, 1) for x in (o, c, h, l))
+    o2, c2 = _shift(o, 2), _shift(c, 2)
+    h2, l2 = _shift(h, 2), _shift(l, 2)
+    body1, body2 = _shift(body, 1), np.abs(c2 - o2)
+    mid2 = (o2 + c2) / 2.0
+
+    checks = (
+        (BULLISH_ENGULFING, (pc < po) & bull & (c > po)),
+        (BEARISH_ENGULFING, (pc > po) & bear & (c < po)),
+        (DOJI, body < rng * 0.1),
+        (HAMMER, (rng > 0) & (lower >= 2 * body) & (upper <= 0.25 * rng)),
+        (SHOOTING_STAR, (rng > 0) & (upper >= 2 * body) & (lower <= 0.25 * rng)),
+        (INSIDE_BAR, (h < ph) & (l > pl)),
+        (OUTSIDE_BAR, (h > ph) & (l < pl)),
+        (BULLISH_MARUBOZU, bull & (body >= 0.9 * rng)),
+        (BEARISH_MARUBOZU, bear & (body >= 0.9 * rng)),
+        (MORNING_STAR, (c2 < o2) & (body2 >= 0.5 * (h2 - l2)) & (body1 <= 0.3 * body2) & bull & (c > mid2)),
+        (EVENING_STAR, (c2 > o2) & (body2 >= 0.5 * (h2 - l2)) & (body1 <= 0.3 * body2) & bear & (c < mid2)),
+    )
+    mask = np.zeros(c.shape, dtype=np.uint16)
+    for bit, hit in checks:
+        mask[hit] |= bit
+    return mask
+
+def scan(candles):
+    """Bitmask mẫu nến cho mọi nến của list-of-dict / dict cột / CandleFrame."""
+    frame = as_frame(candles)
+    if not len(frame):
+        return np.zeros(0, dtype=np.uint16)
+    return scan_arrays(frame["open"], frame["high"], frame["low"], frame["close"])
+
+def names(mask_value):
+    """Bitmask 1 nến -> danh sách tên mẫu."""
+    return [name for bit, name in PATTERN_NAMES.items() if int(mask_value) & bit]
+
+def signal(mask_value):
+    """Bitmask 1 nến -> tín hiệu đơn theo SIGNAL_PRIORITY ("none" nếu không khớp)."""
+    for bit in SIGNAL_PRIORITY:
+        if int(mask_value) & bit:
+            return PATTERN_NAMES[bit]
+    return "none"
@@ -3,6 +3,10 @@
 
 from typing import List, Dict, Tuple
 
+import numpy as np
+
+from candle_frame import as_frame
+
 def _linreg_slope(y_vals: List[float]) -> float:
     """
     Trả về slope xấp xỉ cho chuỗi y theo chỉ số [0..n-1].
@@ -19,15 +23,12 @@ def _linreg_slope(y_vals: List[float]) -> float:
     return num / den
 
 def _pct_below_ma(candles_1d: List[Dict], ma_key: str = "ma50", window: int = 60) -> float:
-    last = candles_1d[-window:] if len(candles_1d) >= window else candles_1d[:]
-    if not last:
+    frame = as_frame(candles_1d)
+    last = frame[-window:] if len(frame) >= window else frame
+    if not len(last) or ma_key not in last.columns:
         return 0.0
-    cnt = 0
-    for c in last:
-        close = c.get("close")
-        ma = c.get(ma_key)
-        if close is not None and ma is not None and close < ma:
-            cnt += 1
+    # NaN (thiếu close/ma) so sánh luôn False -> không được đếm
+    cnt = int(np.count_nonzero(last["close"] < last[ma_key]))
     return cnt / len(last)
 
 def _has_higher_high(candles_1d: List[Dict], window: int = 60) -> bool:
@@ -37,23 +38,21 @@ def _has_higher_high(candles_1d: List[Dict], window: int = 60) -> bool:
     """
     if len(candles_1d) < 40:
         return False
-    w = min(window, len(candles_1d))
-    last = candles_1d[-w:]
+    frame = as_frame(candles_1d)
+    w = min(window, len(frame))
+    highs = frame["high"][-w:]
+    highs = np.where(np.isnan(highs) | (highs == 0), -np.inf, highs)  # `high or -inf`
     mid = w // 2
-    a = last[:mid]
-    b = last[mid:]
-    high_a = max((c.get("high") or float("-inf")) for c in a) if a else float("-inf")
-    high_b = max((c.get("high") or float("-inf")) for c in b) if b else float("-inf")
-    return high_b > high_a
+    a = highs[:mid]
+    b = highs[mid:]
+    high_a = a.max() if len(a) else float("-inf")
+    high_b = b.max() if len(b) else float("-inf")
+    return bool(high_b > high_a)
 
 def _ma_series(candles_1d: List[Dict], ma_key: str = "ma50", window: int = 30) -> List[float]:
-    s = []
-    src = candles_1d[-window:] if len(candles_1d) >= window else candles_1d[:]
-    for c in src:
-        v = c.get(ma_key)
-        if v is not None:
-            s.append(float(v))
-    return s
+    frame = as_frame(candles_1d)
+    src = frame[-window:] if len(frame) >= window else frame
+    return src.valid(ma_key).tolist()
 
 def check_short_bias(candles_1d: List[Dict], strict_window: int = 60) -> Tuple[bool, Dict]:
     """
@@ -68,9 +67,9 @@ def check_short_bias(candles_1d: List[Dict], strict_window: int = 60) -> Tuple[b
         return True, {"reason": "no_data"}
 
     # Điều kiện 1
-    last = candles_1d[-1]
-    close = last.get("close")
-    ma50 = last.get("ma50")
+    candles_1d = as_frame(candles_1d)
+    close = candles_1d.last("close")
+    ma50 = candles_1d.last("ma50")
     cond1 = False
     slope_ma50 = None
     ma_seq = _ma_series(candles_1d, "ma50", window=30)
@@ -0,0 +1,159 @@
+# filter_chain.py
+# Chuỗi filter AND cho từng mã: mỗi filter là (tên, fn(ctx) -> (ok, why)) hoặc
+# Filter(tên, fn, fail_closed=True) cho cổng không được coi là đạt khi lỗi. Ghi lại thời gian
+# chạy và tỉ lệ loại của từng filter, rồi sắp lại thứ tự để giảm chi phí kỳ vọng mỗi mã:
+# filter rẻ mà loại nhiều chạy trước (xếp tăng dần theo cost / reject_rate). Mã chỉ đạt khi
+# qua mọi filter nên thứ tự không đổi kết quả đạt/loại, chỉ đổi lý do loại được in ra.
+#
+# Thống kê giữ qua các lần chạy trong filter_stats.json (mỗi block là một process riêng).
+# Filter chưa đủ FILTER_MIN_SAMPLES lượt đo giữ nguyên vị trí khai báo.
+
+import os
+import json
+import time
+import threading
+from collections import namedtuple
+
+FILTER_STATS_FILE = os.getenv("FILTER_STATS_FILE", "filter_stats.json")
+FILTER_MIN_SAMPLES = int(os.getenv("FILTER_MIN_SAMPLES", "30"))
+FILTER_STATS_WINDOW = int(os.getenv("FILTER_STATS_WINDOW", "5000"))   # quá ngưỡng thì chia đôi để theo kịp thị trường
+
+class Filter(namedtuple("Filter", ("name", "fn", "fail_closed"))):
+    """
+    fail_closed=False: filter lỗi coi như đạt (không chặn mã vì lỗi tính toán phụ).
+    fail_closed=True : filter lỗi coi như loại (cổng quyết định cuối, lỗi không được lọt mã).
+    """
+    __slots__ = ()
+
+    def __new__(cls, name, fn, fail_closed=False):
+        return super().__new__(cls, name, fn, fail_closed)
+
+class FilterStats:
+    __slots__ = ("calls", "rejections", "errors", "seconds")
+
+    def __init__(self, calls=0, rejections=0, errors=0, seconds=0.0):
+        self.calls, self.rejections, self.errors, self.seconds = calls, rejections, errors, seconds
+
+    def record(self, seconds, rejected, error=False):
+        self.calls += 1
+        self.rejections += int(rejected)
+        self.errors += int(error)
+        self.seconds += seconds
+        if self.calls > FILTER_STATS_WINDOW:
+            self.calls //= 2
+            self.rejections //= 2
+            self.errors //= 2
+            self.seconds /= 2.0
+
+    @property
+    def reject_rate(self):
+        return self.rejections / self.calls if self.calls else 0.0
+
+    @property
+    def avg_cost(self):
+        return self.seconds / self.calls if self.calls else 0.0
+
+    def score(self):
+        """Chi phí trung bình cho mỗi mã bị loại; filter không bao giờ loại xếp cuối."""
+        rate = self.reject_rate
+        return self.avg_cost / rate if rate > 0 else float("inf")
+
+    def to_dict(self):
+        return {"calls": self.calls, "rejections": self.rejections, "errors": self.errors, "seconds": self.seconds}
+
+class FilterChain:
+    """
+    chain = FilterChain([("debounce_1h", fn), ...])
+    ok, name, why = chain.run(ctx)   # name/why của filter loại mã (None nếu đạt)
+    """
+
+    def __init__(self, filters, stats_file=FILTER_STATS_FILE, adaptive=True):
+        self.filters = [f if isinstance(f, Filter) else Filter(*f) for f in filters]
+        self.stats_file = stats_file
+        self.adaptive = adaptive
+        self._stats = {f.name: FilterStats() for f in self.filters}
+        self._lock = threading.Lock()
+        self._load()
+        self._order = list(self.filters)
+        self.reorder()
+
+    def _load(self):
+        if not self.stats_file:
+            return
+        try:
+            with open(self.stats_file, "r") as f:
+                saved = json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return
+        for name, d in saved.items():
+            if name in self._stats:
+                self._stats[name] = FilterStats(**d)
+
+    def save(self):
+        if not self.stats_file:
+            return
+        with self._lock:
+            data = {name: st.to_dict() for name, st in self._stats.items()}
+        tmp = self.stats_file + ".tmp"
+        with open(tmp, "w") as f:
+            json.dump(data, f, indent=2)
+        os.replace(tmp, self.stats_file)
+
+    def reorder(self):
+        """
+        Sắp lại các filter đã đủ mẫu theo score tăng dần trong chính các vị trí của chúng;
+        filter chưa đủ mẫu đứng yên.
+        """
+        if not self.adaptive:
+            return self.order()
+        with self._lock:
+            ready = [i for i, f in enumerate(self.filters) if self._stats[f.name].calls >= FILTER_MIN_SAMPLES]
+            ranked = sorted((self.filters[i] for i in ready), key=lambda f: self._stats[f.name].score())
+            order = list(self.filters)
+            for slot, item in zip(ready, ranked):
+                order[slot] = item
+            self._order = order
+        return self.order()
+
+    def order(self):
+        return [f.name for f in self._order]
+
+    def run(self, ctx):
+        """
+        Chạy lần lượt theo thứ tự hiện tại, dừng ở filter đầu tiên loại mã.
+        Filter lỗi được ghi nhận và coi như đạt, trừ filter fail_closed (coi như loại).
+        """
+        for name, fn, fail_closed in self._order:
+            start = time.perf_counter()
+            error = None
+            try:
+                ok, why = fn(ctx)
+            except Exception as e:
+                ok, why, error = not fail_closed, f"error: {e}", e
+            elapsed = time.perf_counter() - start
+            with self._lock:
+                self._stats[name].record(elapsed, not ok, error is not None)
+            if error is not None:
+                print(f"⚠️ Filters error on {ctx.get('symbol')} ({name}): {error}")
+            if not ok:
+                return False, name, why
+        return True, None, None
+
+    def stats(self):
+        """{tên: calls / rejections / errors / reject_rate / avg_us} theo thứ tự đang chạy."""
+        with self._lock:
+            return {
+                name: {
+                    "calls": st.calls,
+                    "rejections": st.rejections,
+                    "errors": st.errors,
+                    "reject_rate": round(st.reject_rate, 3),
+                    "avg_us": round(st.avg_cost * 1e6, 1),
+                }
+                for name, st in ((n, self._stats[n]) for n in self.order())
+            }
+
+    def report(self):
+        return " | ".join(
+            f"{name}: {s['rejections']}/{s['calls']} loại, {s['avg_us']}µs" for name, s in self.stats().items()
+        )
@@ -0,0 +1,111 @@
+# filter_features.py
+# Đặc trưng dùng chung cho filters, tính một lần cho mỗi chuỗi nến (symbol × khung):
+# MA20 + slope MA20, cờ close > MA20, high/low trượt cho SFP và OHLC nến cuối.
+# debounce_1h_ok / multi_tf_alignment_ok / breakout_retest_ok / sfp_check chỉ còn tra mảng.
+#
+# MA20 lấy lại cột "ma20" của IndicatorFrame (compute_indicators đã tính) khi chuỗi close
+# không thiếu nến; nếu không thì tính trên các close hợp lệ như filters vẫn làm. Kết quả
+# được giữ trên chính frame, nên frame từ indicator_cache chỉ tính đặc trưng một lần.
+
+import numpy as np
+
+import indicator_backends
+import indicator_engine
+from candle_frame import as_frame
+
+MA_PERIOD = 20
+
+def _rolling_aligned(values, window, fn):
+    """out[i] = fn(values[max(0, i-window+1):i+1]), dài bằng values (cửa sổ đầu ngắn hơn)."""
+    fill = -np.inf if fn is indicator_engine.rolling_max else np.inf
+    return fn(np.concatenate([np.full(window - 1, fill), values]), window)
+
+class FilterFeatures:
+    """
+    - close       : các close hợp lệ (bỏ NaN), như filters._closes
+    - ma20        : MA20 trên `close` (NaN khi chưa đủ 20 nến)
+    - slope       : (ma20[i] - ma20[i-1]) / (ma20[i-1] hoặc 1.0)
+    - slope_sign  : dấu của slope (0 khi MA20 trước bằng 0 hoặc phẳng)
+    - above_ma20  : close[i] > ma20[i]
+    - roll_high / roll_low : max(high) / min(low) của `lookback` nến gần nhất tính tới nến i
+    - open/high/low/bar_close : cột OHLC theo nến (NaN = thiếu)
+    """
+
+    def __init__(self, candles, lookback=20):
+        frame = as_frame(candles)
+        self.frame = frame
+        self.lookback = lookback
+        self.bars = len(frame)
+        cols = {}
+        for key in ("open", "high", "low", "close"):
+            col = frame.get(key)
+            cols[key] = np.full(self.bars, np.nan) if col is None else np.asarray(col, dtype=np.float64)
+        self.open, self.high, self.low, self.bar_close = cols["open"], cols["high"], cols["low"], cols["close"]
+
+        valid = ~np.isnan(self.bar_close)
+        self.close = self.bar_close[valid]
+        self.n = len(self.close)
+        ma20 = frame.get("ma20") if valid.all() else None
+        if ma20 is None or len(ma20) != self.n:
+            ma20 = indicator_backends.active().sma(self.close, MA_PERIOD)
+        self.ma20 = np.asarray(ma20, dtype=np.float64)
+
+        prev, cur = self.ma20[:-1], self.ma20[1:]
+        self.slope = np.full(self.n, np.nan)
+        self.slope_sign = np.zeros(self.n, dtype=np.int8)
+        with np.errstate(invalid="ignore"):
+            self.slope[1:] = (cur - prev) / np.where(prev != 0, prev, 1.0)
+            self.slope_sign[1:] = np.where(prev != 0, np.sign(np.nan_to_num(cur - prev)), 0)
+            self.above_ma20 = self.close > self.ma20
+
+        highs = np.where(np.isnan(self.high), -np.inf, self.high)
+        lows = np.where(np.isnan(self.low), np.inf, self.low)
+        self.roll_high = _rolling_aligned(highs, lookback, indicator_engine.rolling_max)
+        self.roll_low = _rolling_aligned(lows, lookback, indicator_engine.rolling_min)
+
+    # --- tra cứu nến cuối ---
+    def ma20_slope(self):
+        """Slope MA20 nến cuối (0.0 nếu chưa đủ 21 close), như multi_tf_alignment_ok."""
+        if self.n < MA_PERIOD + 1:
+            return 0.0
+        return float(self.slope[-1])
+
+    def is_above_ma20(self):
+        """close cuối > MA20 (None nếu chưa đủ 21 close)."""
+        if self.n < MA_PERIOD + 1:
+            return None
+        return bool(self.above_ma20[-1])
+
+    def last_bar(self):
+        """(open, high, low, close) nến cuối; None nếu thiếu giá trị nào."""
+        if not self.bars:
+            return None
+        bar = (self.open[-1], self.high[-1], self.low[-1], self.bar_close[-1])
+        if any(np.isnan(v) for v in bar):
+            return None
+        return tuple(float(v) for v in bar)
+
+    def range_extremes(self):
+        """(max high, min low) của min(lookback, số nến) nến gần nhất; None nếu cột rỗng."""
+        if not self.bars:
+            return None
+        hi, lo = float(self.roll_high[-1]), float(self.roll_low[-1])
+        if np.isinf(hi) or np.isinf(lo):
+            return None
+        return hi, lo
+
+def features(candles, lookback=20):
+    """
+    FilterFeatures của `candles` (list-of-dict / dict cột / CandleFrame / FilterFeatures).
+    Với CandleFrame, kết quả được giữ trên frame theo lookback.
+    """
+    if isinstance(candles, FilterFeatures):
+        if candles.lookback == lookback:
+            return candles
+        candles = candles.frame
+    frame = as_frame(candles)
+    memo = frame.__dict__.setdefault("_filter_features", {})
+    feats = memo.get(lookback)
+    if feats is None:
+        feats = memo[lookback] = FilterFeatures(frame, lookback)
+    return feats
@@ -1,6 +1,11 @@
 # filters.py
 # Bộ tiêu chí hạn chế bull/bear trap & quá mua/quá bán sâu.
 from typing import Dict, Tuple, List
+
+import numpy as np
+
+from resampler import rolling_ohlc
+from filter_features import features
 # === Runtime filters configuration (centralized here to avoid circular imports) ===
 FILTERS_CONFIG = {
 # Soft confirmations for hourly scanning
@@ -57,18 +62,21 @@ def exhaustion_cooldown(snapshot: Dict, cfg: Dict) -> Tuple[bool, str]:
     return True, "ok"
 
 def sfp_check(candles_4h: List[Dict], cfg: Dict) -> Tuple[bool, str]:
-    n = min(cfg.get("sfp_lookback", 20), len(candles_4h))
+    feats = features(candles_4h, cfg.get("sfp_lookback", 20))
+    n = min(feats.lookback, feats.bars)
     if n < 5:
         return True, "insufficient"
-    window = candles_4h[-n:]
-    hi = max(c.get("high") for c in window if c.get("high") is not None)
-    lo = min(c.get("low") for c in window if c.get("low") is not None)
-    last = candles_4h[-1]
-    if last.get("low") is None or last.get("high") is None or last.get("close") is None or last.get("open") is None:
+    extremes = feats.range_extremes()
+    if extremes is None:
+        return True, "insufficient"
+    hi, lo = extremes
+    last = feats.last_bar()
+    if last is None:
         return True, "insufficient"
-    if last["low"] < lo and last["close"] > lo:
+    _, last_high, last_low, last_close = last
+    if last_low < lo and last_close > lo:
         return False, "sfp_bullish"
-    if last["high"] > hi and last["close"] < hi:
+    if last_high > hi and last_close < hi:
         return False, "sfp_bearish"
     return True, "ok"
 
@@ -85,29 +93,25 @@ def breakout_retest_ok(candles_tf: list, breakout_zone: tuple, cfg: dict) -> tup
 # Tính slope MA20 1D nếu có dữ liệu
     slope_threshold = cfg.get("slope_strong_threshold", 0.5)
     slope_val = None
-    try:
-        closes = [c.get("close") for c in candles_tf if c.get("close") is not None]
-        ma20_vals = []
-        if len(closes) >= 21:
-            for i in range(len(closes)-20):
-                ma20_vals.append(sum(closes[i:i+20])/20)
-        if len(ma20_vals) >= 2:
-            slope_val = (ma20_vals[-1] - ma20_vals[-2]) / ma20_vals[-2]
-    except Exception:
-        pass
+    feats = features(candles_tf)
+# MA20 của các nến trước nến cuối (giữ nguyên cách tính cũ: cần >= 22 close)
+    if feats.n >= 22 and feats.ma20[-3]:
+        slope_val = float((feats.ma20[-2] - feats.ma20[-3]) / feats.ma20[-3])
 
     if mode == "auto" and slope_val is not None and abs(slope_val) > slope_threshold:
         return True, f"momentum strong skip slope={slope_val:.3f}"
 
-    N = min(cfg.get("retest_max_candles", 3), len(candles_tf))
+    N = min(cfg.get("retest_max_candles", 3), feats.bars)
     lo, hi = breakout_zone
-    for c in candles_tf[-N:]:
-        if c.get("low") is None or c.get("high") is None or c.get("close") is None or c.get("open") is None:
+    bars = (feats.open[-N:], feats.high[-N:], feats.low[-N:], feats.bar_close[-N:]) if N else ((),) * 4
+    for c_open, c_high, c_low, c_close in zip(*bars):
+        # bỏ nến thiếu bất kỳ giá trị OHLC nào (NaN), như bản dict bỏ nến có None
+        if np.isnan(c_open) or np.isnan(c_high) or np.isnan(c_low) or np.isnan(c_close):
             continue
 # Retest định nghĩa: low chạm vùng breakout + close > open (bull) hoặc high chạm vùng breakout + close < open (bear)
-        if c["low"] <= hi and c["low"] >= lo and c["close"] > c["open"]:
+        if c_low <= hi and c_low >= lo and c_close > c_open:
             return True, "bull_retest"
-        if c["high"] >= lo and c["high"] <= hi and c["close"] < c["open"]:
+        if c_high >= lo and c_high <= hi and c_close < c_open:
             return True, "bear_retest"
     return False, "no_retest"
 
@@ -121,36 +125,22 @@ def multi_tf_alignment_ok(candles_fast: list, candles_slow: list, cfg: dict) ->
         return True, "skip"
     threshold = cfg.get("tf_confirm_threshold", 0.0)
 
-    def slope_ma20(candles):
-        closes = [c.get("close") for c in candles if c.get("close") is not None]
-        if len(closes) >= 21:
-            ma20_vals = [sum(closes[i:i+20])/20 for i in range(len(closes)-19)]
-            if len(ma20_vals) >= 2:
-                last, prev = ma20_vals[-1], ma20_vals[-2]
-                return (last - prev) / (prev if prev else 1.0)
-        return 0.0
-
     # Cho phép dùng 4H mềm nếu bật cấu hình hoặc không có 4H thật
     if cfg.get("use_soft_4h", True) and (not candles_slow or len(candles_slow) < 5):
         proxy = build_soft_htf_from_1h(candles_fast, group=4)
         candles_slow = proxy if proxy else candles_slow
 
-    slope_fast = slope_ma20(candles_fast)
-    slope_slow = slope_ma20(candles_slow)
+    fast, slow = features(candles_fast), features(candles_slow)
+    slope_fast = fast.ma20_slope()
+    slope_slow = slow.ma20_slope()
 
     # Direction-only mode
     if threshold is None or threshold <= 0:
         if slope_fast * slope_slow < 0:
             return False, f"opposite slopes {slope_fast:.3f} vs {slope_slow:.3f}"
         # fallback: nếu slope_slow ~0, dùng quan hệ với MA20
-        def above_ma20(candles):
-            closes = [c.get("close") for c in candles if c.get("close") is not None]
-            if len(closes) < 21:
-                return None
-            ma20 = sum(closes[-20:]) / 20.0
-            return closes[-1] > ma20
-        slow_bias = above_ma20(candles_slow)
-        fast_bias = above_ma20(candles_fast)
+        slow_bias = slow.is_above_ma20()
+        fast_bias = fast.is_above_ma20()
         if slow_bias is not None and fast_bias is not None and (slow_bias != fast_bias):
             return False, "direction mismatch by MA20"
         return True, f"aligned by direction (slow_slope={slope_slow:.3f})"
@@ -162,49 +152,24 @@ def multi_tf_alignment_ok(candles_fast: list, candles_slow: list, cfg: dict) ->
         return False, f"weak slow slope {slope_slow:.3f}"
     return True, f"aligned slopes {slope_fast:.3f} vs {slope_slow:.3f}"
 
-def build_soft_htf_from_1h(candles_1h: list, group: int = 4, limit: int = 60) -> list:
+def build_soft_htf_from_1h(candles_1h: list, group: int = 4, limit: int = 60, rolling: bool = True):
     """
-    Gộp 4 cây 1H đã đóng thành 1 cây 4H proxy (rolling).
-    Trả về danh sách "nến 4H mềm" (không tính lại full indicator).
+    Gộp `group` cây 1H đã đóng thành 1 cây HTF proxy (rolling hoặc theo cụm không chồng nhau).
+    Trả về CandleFrame "nến 4H mềm" (không tính lại full indicator).
     """
-    if not candles_1h or len(candles_1h) < group:
-        return []
-    soft = []
-# dùng các field: open, high, low, close
-    n = len(candles_1h)
-    start = max(0, n - limit*group)
-    for i in range(start+group-1, n):
-        chunk = candles_1h[max(0, i-group+1):i+1]  # rolling 4 nến gần nhất
-        if len(chunk) < group:
-            continue
-        open_ = chunk[0].get("open")
-        close_ = chunk[-1].get("close")
-        highs = [c.get("high") for c in chunk if c.get("high") is not None]
-        lows = [c.get("low") for c in chunk if c.get("low") is not None]
-        if open_ is None or close_ is None or not highs or not lows:
-            continue
-        soft.append({"open": open_, "close": close_, "high": max(highs), "low": min(lows)})
-    return soft
+    return rolling_ohlc(candles_1h, group=group, limit=limit, rolling=rolling)
 
 def debounce_1h_ok(candles_1h: list, bars: int = 2) -> tuple:
     """
     Yêu cầu 'bars' nến 1H gần nhất có slope MA20 cùng dấu (xấp xỉ bằng slope(close)).
     """
-    closes = [c.get("close") for c in candles_1h if c.get("close") is not None]
-    if len(closes) < max(21, bars+1):
+    feats = features(candles_1h)
+    if feats.n < max(21, bars+1):
         return True, "insufficient"
-# slope gần đúng: so sánh MA20 gần nhất với trước đó
-    ma20_vals = [sum(closes[i:i+20])/20 for i in range(len(closes)-19)]
-    if len(ma20_vals) < bars+1:
+# slope gần đúng: so sánh MA20 gần nhất với trước đó (số MA20 hợp lệ = n - 19)
+    if feats.n - 19 < bars+1:
         return True, "insufficient"
-    signs = []
-    for k in range(1, bars+1):
-        prev, cur = ma20_vals[-k-1], ma20_vals[-k]
-        if prev == 0:
-            signs.append(0)
-        else:
-            slope = (cur - prev) / abs(prev)
-            signs.append(1 if slope > 0 else (-1 if slope < 0 else 0))
+    signs = feats.slope_sign[:-bars-1:-1].tolist()
     if 0 in signs:
         return False, "flat momentum"
     if not all(s == signs[0] for s in signs):
@@ -5,45 +5,38 @@ import json
 from utils import parse_signal_response
 from trade_policy import GPT_MODEL
 
-# Gửi từng coin một với prompt có định dạng từ PROMPT_TEMPLATE
-async def get_gpt_signals(data_by_symbol, suggested_tps_by_symbol, test_mode=False):
-    results = {}
-
-    openai.api_key = os.getenv("OPENAI_API_KEY")
-
-    async with openai.AsyncOpenAI() as client:
-        for symbol, tf_data in data_by_symbol.items():
-            try:
-                if not test_mode:
-                    current_time = datetime.now(UTC)
-                    ENFORCE_4H_CLOSE = os.getenv("ENFORCE_4H_CLOSE", "0") == "1"
-                    if ENFORCE_4H_CLOSE and (current_time.hour % 4 != 0):
-                        print(f"⏳ Bỏ qua {symbol} vì nến 4H chưa đóng (set ENFORCE_4H_CLOSE=0 để bỏ qua).")
-                        continue
-                else:
-                    print(f"🧪 [TEST MODE] Luôn xử lý {symbol} bất kể giờ.")
-                summary_lines = []
-                for tf in ["1H", "4H", "1D"]:
-                    item = tf_data.get(tf, {})
-                    if item:
-                        base = f"[{tf}] Trend: {item.get('trend')}, RSI: {item.get('rsi')}, MA20: {item.get('ma20')}, MA50: {item.get('ma50')}, Candle: {item.get('candle_signal')}, BB: ({item.get('bb_lower')}, {item.get('bb_upper')})"
-                        slopes = f", SLOPE: ma20={item.get('slope_ma20')}, ma50={item.get('slope_ma50')}, rsi={item.get('slope_rsi')}, bbw={item.get('slope_bb_width')}, atr={item.get('slope_atr')}"
-                        if tf == "1H":
-                            momo = f", MOMO: pct={item.get('pct_change_1h')}, bbw={item.get('bb_width_ratio')}, atr={item.get('atr_spike_ratio')}, vol={item.get('volume_spike_ratio')}"
-                            summary_lines.append(base + slopes + momo)
-                        else:
-                            summary_lines.append(base + slopes)
-                current_price = tf_data.get("4H", {}).get("close", "N/A")
-                trend_1h = tf_data.get("1H", {}).get("trend", "unknown")
-                trend_4h = tf_data.get("4H", {}).get("trend", "unknown")
-                trend_1d = tf_data.get("1D", {}).get("trend", "unknown")
-                rsi_4h = tf_data.get("4H", {}).get("rsi")
-                bb_width_4h = tf_data.get("4H", {}).get("bb_upper", 0) - tf_data.get("4H", {}).get("bb_lower", 0)
-                suggested_tps = suggested_tps_by_symbol.get(symbol, [])
-
-                json_tps = json.dumps(suggested_tps, ensure_ascii=False)
-
-                prompt = f"""
+# Phân tích 1 coin với prompt có định dạng từ PROMPT_TEMPLATE; trả về dict tín hiệu hoặc None
+async def gpt_signal_for(client, symbol, tf_data, suggested_tps=None, test_mode=False):
+    if not test_mode:
+        current_time = datetime.now(UTC)
+        ENFORCE_4H_CLOSE = os.getenv("ENFORCE_4H_CLOSE", "0") == "1"
+        if ENFORCE_4H_CLOSE and (current_time.hour % 4 != 0):
+            print(f"⏳ Bỏ qua {symbol} vì nến 4H chưa đóng (set ENFORCE_4H_CLOSE=0 để bỏ qua).")
+            return None
+    else:
+        print(f"🧪 [TEST MODE] Luôn xử lý {symbol} bất kể giờ.")
+    summary_lines = []
+    for tf in ["1H", "4H", "1D"]:
+        item = tf_data.get(tf, {})
+        if item:
+            base = f"[{tf}] Trend: {item.get('trend')}, RSI: {item.get('rsi')}, MA20: {item.get('ma20')}, MA50: {item.get('ma50')}, Candle: {item.get('candle_signal')}, BB: ({item.get('bb_lower')}, {item.get('bb_upper')})"
+            slopes = f", SLOPE: ma20={item.get('slope_ma20')}, ma50={item.get('slope_ma50')}, rsi={item.get('slope_rsi')}, bbw={item.get('slope_bb_width')}, atr={item.get('slope_atr')}"
+            if tf == "1H":
+                momo = f", MOMO: pct={item.get('pct_change_1h')}, bbw={item.get('bb_width_ratio')}, atr={item.get('atr_spike_ratio')}, vol={item.get('volume_spike_ratio')}"
+                summary_lines.append(base + slopes + momo)
+            else:
+                summary_lines.append(base + slopes)
+    current_price = tf_data.get("4H", {}).get("close", "N/A")
+    trend_1h = tf_data.get("1H", {}).get("trend", "unknown")
+    trend_4h = tf_data.get("4H", {}).get("trend", "unknown")
+    trend_1d = tf_data.get("1D", {}).get("trend", "unknown")
+    rsi_4h = tf_data.get("4H", {}).get("rsi")
+    bb_width_4h = tf_data.get("4H", {}).get("bb_upper", 0) - tf_data.get("4H", {}).get("bb_lower", 0)
+    suggested_tps = suggested_tps or []
+
+    json_tps = json.dumps(suggested_tps, ensure_ascii=False)
+
+    prompt = f"""
 - Decide dynamically whether Entry 2 is needed based on market structure, volatility, and strategy type. If not needed, set Entry 2 as None.
 Bạn là một trợ lý giao dịch crypto chuyên nghiệp.
 Dưới đây là dữ liệu kỹ thuật của {symbol} theo từng khung thời gian:
@@ -86,34 +79,46 @@ Chỉ TRẢ VỀ nội dung JSON THUẦN TÚY, KHÔNG bao gồm ```json, ``` ho
 - Tất cả trường trên đều nên có; RIÊNG `entry_2` có thể bỏ qua hoặc để `null` nếu không phù hợp.
 """
 
-                now = datetime.now(UTC)
-                print(f"\n🤖 GPT analyzing {symbol} at {now.isoformat()}...")
+    now = datetime.now(UTC)
+    print(f"\n🤖 GPT analyzing {symbol} at {now.isoformat()}...")
 
-                response = await client.chat.completions.create(
-                    model=GPT_MODEL,
-                    messages=[{"role": "user", "content": prompt.strip()}],
-                    temperature=0.4,
-                    max_tokens=1200,
-                    timeout=30
-                )
+    response = await client.chat.completions.create(
+        model=GPT_MODEL,
+        messages=[{"role": "user", "content": prompt.strip()}],
+        temperature=0.4,
+        max_tokens=1200,
+        timeout=30
+    )
 
-                reply = response.choices[0].message.content.strip()
-                print(f"📩 GPT raw reply for {symbol}:", reply)
+    reply = response.choices[0].message.content.strip()
+    print(f"📩 GPT raw reply for {symbol}:", reply)
 
-                # Strip leading/trailing non-json characters for safety
-                json_start = reply.find('{')
-                json_end = reply.rfind('}') + 1
-                cleaned = reply[json_start:json_end].strip()
+    # Strip leading/trailing non-json characters for safety
+    json_start = reply.find('{')
+    json_end = reply.rfind('}') + 1
+    cleaned = reply[json_start:json_end].strip()
 
-                parsed = parse_signal_response(cleaned)
+    parsed = parse_signal_response(cleaned)
 
-                if not parsed:
-                    print(f"⚠️ GPT trả về định dạng không hợp lệ cho {symbol}.")
-                    continue
+    if not parsed:
+        print(f"⚠️ GPT trả về định dạng không hợp lệ cho {symbol}.")
+        return None
 
-                parsed["pair"] = symbol
+    parsed["pair"] = symbol
+    return parsed
 
-                results[symbol] = parsed
+# Gửi từng coin một với prompt có định dạng từ PROMPT_TEMPLATE
+async def get_gpt_signals(data_by_symbol, suggested_tps_by_symbol, test_mode=False):
+    results = {}
+
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+
+    async with openai.AsyncOpenAI() as client:
+        for symbol, tf_data in data_by_symbol.items():
+            try:
+                parsed = await gpt_signal_for(client, symbol, tf_data, suggested_tps_by_symbol.get(symbol, []), test_mode)
+                if parsed:
+                    results[symbol] = parsed
 
             except Exception as e:
                 print(f"❌ GPT failed for {symbol}: {e}")
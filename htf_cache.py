@@ -0,0 +1,108 @@
+# htf_cache.py
+# Kết quả dẫn xuất của khung 4H / 1D (chỉ báo nến cuối, trend, nến tín hiệu, S/R, SFP...)
+# chỉ đổi khi có nến mới đóng, trong khi lượt quét chạy mỗi giờ. Cache này
+# giữ kết quả tính trên các nến ĐÃ ĐÓNG, khoá theo nến đóng cuối cùng: tới lần đóng nến
+# tiếp theo key đổi và kết quả tự tính lại. 3/4 lượt quét 4H (23/24 lượt 1D) chỉ còn tính
+# lớp 1H. Ghi ra htf_cache.json vì mỗi block là một process riêng.
+
+import os
+import json
+import fcntl
+import threading
+
+from candle_frame import as_frame
+
+HTF_CACHE_FILE = os.getenv("HTF_CACHE_FILE", "htf_cache.json")
+
+def _jsonable(results):
+    # lưu đúng dạng sẽ đọc lại từ file (tuple -> list...) để lượt hit / miss giống nhau
+    return json.loads(json.dumps(results))
+
+class HTFCache:
+    def __init__(self, path=HTF_CACHE_FILE):
+        self.path = path
+        self.hits = 0
+        self.misses = 0
+        self._entries = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _load_file(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    @staticmethod
+    def key(frame, extra=()):
+        """Nến đóng cuối (nến áp chót của chuỗi, nến cuối là nến đang chạy) + số nến + tham số."""
+        closed = frame[-2:-1]
+        stamp = closed.last("ts")
+        if stamp is None:
+            stamp = closed.last("time")
+        bar = [closed.last(k) for k in ("open", "high", "low", "close", "volume")]
+        return [stamp, len(frame), bar, list(extra)]
+
+    def results_for(self, symbol, interval, candles, compute, extra=()):
+        """
+        Kết quả `compute(closed)` với closed = `candles` bỏ nến đang chạy; tính lại khi
+        có nến mới đóng (hoặc `extra` - tham số ảnh hưởng kết quả - đổi).
+        """
+        frame = as_frame(candles)
+        if len(frame) < 2:
+            return _jsonable(compute(frame[:0]))
+        name = f"{symbol}|{interval}"
+        key = _jsonable(self.key(frame, extra))
+        with self._lock:
+            if self._entries is None:
+                self._entries = self._load_file()
+            entry = self._entries.get(name)
+            if entry is not None and entry["key"] == key:
+                self.hits += 1
+                return entry["results"]
+            self.misses += 1
+        results = _jsonable(compute(frame[:-1]))
+        with self._lock:
+            self._entries[name] = {"key": key, "results": results}
+            self._dirty.add(name)
+        return results
+
+    def save(self):
+        """Ghi các mục đã đổi; gộp với file hiện có dưới khoá như sr_store."""
+        with self._lock:
+            if not self._dirty:
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    data = self._load_file()
+                    for name in self._dirty:
+                        data[name] = self._entries[name]
+                    tmp = self.path + ".tmp"
+                    with open(tmp, "w") as f:
+                        json.dump(data, f)
+                    os.replace(tmp, self.path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._dirty.clear()
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+_cache = HTFCache()
+
+def results_for(symbol, interval, candles, compute, extra=()):
+    return _cache.results_for(symbol, interval, candles, compute, extra)
+
+def save():
+    _cache.save()
+
+def cache_stats():
+    return _cache.stats()
@@ -0,0 +1,166 @@
+# indicator_backends.py
+# Backend tính SMA / Bollinger / RSI / ATR cho indicators:
+#   - reference: vòng lặp Python thuần theo từng nến (định nghĩa gốc, dùng làm chuẩn đối chiếu)
+#   - numpy:     indicator_engine (vector hoá)
+#   - numba:     như numpy nhưng vòng đệ quy Wilder (RSI / ATR) được JIT (cần cài numba)
+# Mặc định chọn backend nhanh nhất có sẵn; ép bằng env INDICATOR_BACKEND=reference|numpy|numba.
+# Mọi backend trả về mảng float64 (NaN = chưa đủ dữ liệu), 1D hoặc 2D (mỗi hàng 1 mã).
+#
+#   python -m pytest tests/test_indicator_backends.py   # kiểm tra khớp số giữa các backend
+
+import os
+
+import numpy as np
+
+import indicator_engine
+
+try:
+    import numba  # JIT cho vòng Wilder (tùy chọn)
+except ImportError:
+    numba = None
+
+INDICATOR_BACKEND = os.getenv("INDICATOR_BACKEND", "auto")
+
+def _per_row(fn):
+    """Cho hàm 1D chạy trên mảng 2D (mỗi hàng 1 mã); tham số vô hướng (period...) giữ nguyên."""
+    def wrapper(*arrays, **kwargs):
+        first = np.asarray(arrays[0], dtype=np.float64)
+        if first.ndim == 1:
+            return fn(*arrays, **kwargs)
+        def row(a, i):
+            return np.asarray(a)[i] if np.ndim(a) == first.ndim else a
+        rows = [fn(*(row(a, i) for a in arrays), **kwargs) for i in range(first.shape[0])]
+        if isinstance(rows[0], tuple):
+            return tuple(np.vstack(parts) for parts in zip(*rows))
+        return np.vstack(rows)
+    return wrapper
+
+def _array(values, n):
+    out = np.full(n, np.nan)
+    for i, v in enumerate(values[:n]):
+        if v is not None:
+            out[i] = v
+    return out
+
+class ReferenceBackend:
+    """Thuật toán gốc của indicators (trước khi vector hoá), từng nến một."""
+    name = "reference"
+
+    @staticmethod
+    @_per_row
+    def sma(values, period):
+        values = np.asarray(values, dtype=np.float64).tolist()
+        if len(values) < period:
+            return _array([], len(values))
+        return _array([None] * (period - 1) + [
+            np.mean(values[i - period + 1:i + 1]) for i in range(period - 1, len(values))
+        ], len(values))
+
+    @staticmethod
+    @_per_row
+    def bollinger(values, period=20, mult=2):
+        values = np.asarray(values, dtype=np.float64).tolist()
+        n = len(values)
+        lower, mid, upper = np.full(n, np.nan), np.full(n, np.nan), np.full(n, np.nan)
+        for i in range(period - 1, n):
+            window = values[i - period + 1:i + 1]
+            mean = np.mean(window)
+            std = np.std(window)
+            lower[i], mid[i], upper[i] = mean - mult * std, mean, mean + mult * std
+        return lower, mid, upper
+
+    @staticmethod
+    @_per_row
+    def rsi(values, period=14):
+        values = np.asarray(values, dtype=np.float64).tolist()
+        if len(values) < period:
+            return _array([], len(values))
+        deltas = np.diff(values)
+        seed = deltas[:period]
+        up = seed[seed > 0].sum() / period
+        down = -seed[seed < 0].sum() / period
+        rs = up / down if down != 0 else 0
+        rsi_series = [100 - 100 / (1 + rs)]
+        for delta in deltas[period:]:
+            gain = max(delta, 0)
+            loss = -min(delta, 0)
+            up = (up * (period - 1) + gain) / period
+            down = (down * (period - 1) + loss) / period
+            rs = up / down if down != 0 else 0
+            rsi_series.append(100 - 100 / (1 + rs))
+        # len == period: bản gốc trả về dư 1 phần tử, compute_indicators bỏ phần dư
+        return _array([None] * period + rsi_series, len(values))
+
+    @staticmethod
+    @_per_row
+    def atr(high, low, close, period=14):
+        highs, lows, closes = (np.asarray(a, dtype=np.float64).tolist() for a in (high, low, close))
+        trs = []
+        for i in range(1, len(closes)):
+            tr = max(highs[i] - lows[i], abs(highs[i] - closes[i - 1]), abs(lows[i] - closes[i - 1]))
+            trs.append(tr)
+        if len(trs) < period:
+            return _array([], len(closes))
+        atr_vals = [None] * (period - 1)
+        atr_vals.append(np.mean(trs[:period]))
+        for i in range(period, len(trs)):
+            atr_vals.append((atr_vals[-1] * (period - 1) + trs[i]) / period)
+        return _array([None] + atr_vals, len(closes))
+
+class NumpyBackend:
+    name = "numpy"
+    sma = staticmethod(indicator_engine.sma)
+    bollinger = staticmethod(indicator_engine.bollinger)
+    rsi = staticmethod(indicator_engine.rsi)
+    atr = staticmethod(indicator_engine.atr)
+
+if numba is not None:
+    @numba.njit(cache=True)
+    def _wilder_jit(seed, x, period):
+        rows, m = x.shape
+        out = np.empty((rows, m + 1))
+        for r in range(rows):
+            prev = seed[r]
+            out[r, 0] = prev
+            for k in range(m):
+                prev = (prev * (period - 1) + x[r, k]) / period
+                out[r, k + 1] = prev
+        return out
+
+    def _wilder_numba(seed, x, period):
+        return _wilder_jit(np.ascontiguousarray(seed, dtype=np.float64),
+                           np.ascontiguousarray(x, dtype=np.float64), period)
+
+class NumbaBackend(NumpyBackend):
+    """SMA / Bollinger như numpy; vòng Wilder của RSI / ATR chạy bằng mã JIT."""
+    name = "numba"
+
+    @staticmethod
+    def rsi(values, period=14):
+        return indicator_engine.rsi(values, period, wilder=_wilder_numba)
+
+    @staticmethod
+    def atr(high, low, close, period=14):
+        return indicator_engine.atr(high, low, close, period, wilder=_wilder_numba)
+
+BACKENDS = {"reference": ReferenceBackend, "numpy": NumpyBackend}
+if numba is not None:
+    BACKENDS["numba"] = NumbaBackend
+
+def _select(name):
+    if name in (None, "", "auto"):
+        return NumbaBackend if numba is not None else NumpyBackend
+    if name not in BACKENDS:
+        print(f"⚠️ INDICATOR_BACKEND={name} không khả dụng, dùng numpy")
+        return NumpyBackend
+    return BACKENDS[name]
+
+_active = _select(INDICATOR_BACKEND)
+
+def active():
+    return _active
+
+def set_backend(name):
+    global _active
+    _active = _select(name)
+    return _active
@@ -0,0 +1,85 @@
+# indicator_cache.py
+# Memo chỉ báo trong process: cùng một chuỗi nến (symbol, khung, nến cuối, số nến) chỉ được
+# compute_indicators một lần trong process đó (vd. main: lớp 1H/4H/1D gọi lặp trong cùng lượt
+# quét). Không chia sẻ giữa các process: mỗi block của main và signal_tracker có cache
+# riêng. LRU + đếm hit/miss.
+#
+# Nến cuối của chuỗi fetch về thường là nến đang chạy nên key gồm cả OHLCV của nó: nến còn
+# đổi giá thì tính lại, chuỗi y hệt (nến đã đóng / gọi lặp trong cùng lượt quét) thì hit.
+
+import os
+import threading
+from collections import OrderedDict
+
+from candle_frame import as_frame
+from indicators import compute_indicators
+from resampler import candle_ts
+
+INDICATOR_CACHE_SIZE = int(os.getenv("INDICATOR_CACHE_SIZE", "512"))
+
+# main dùng "1H"/"4H"/"1D", kucoin_api dùng "1hour"/...: cùng một khung -> cùng key
+_INTERVAL_ALIASES = {"1H": "1hour", "4H": "4hour", "1D": "1day"}
+
+class IndicatorCache:
+    def __init__(self, maxsize=INDICATOR_CACHE_SIZE):
+        self.maxsize = maxsize
+        self.hits = 0
+        self.misses = 0
+        self._data = OrderedDict()
+        self._lock = threading.Lock()
+
+    @staticmethod
+    def key(symbol, interval, frame):
+        last = frame[-1:]
+        # list-of-dict có "time" ISO, mảng cột có "ts" int: quy về epoch giây để cùng key
+        ts, time = last.last("ts"), last.last("time")
+        stamp = candle_ts({"ts": ts, "time": time}) if ts is not None or time else None
+        bar = tuple(last.last(k) for k in ("open", "high", "low", "close", "volume"))
+        return (symbol, _INTERVAL_ALIASES.get(interval, interval), stamp, len(frame), bar)
+
+    def get(self, symbol, interval, candles):
+        """IndicatorFrame của `candles`, tính (lười) một lần cho mỗi key."""
+        frame = as_frame(candles)
+        if not len(frame):
+            return compute_indicators(frame)
+        key = self.key(symbol, interval, frame)
+        with self._lock:
+            cached = self._data.get(key)
+            if cached is not None:
+                self._data.move_to_end(key)
+                self.hits += 1
+                return cached
+            self.misses += 1
+        result = compute_indicators(frame)
+        with self._lock:
+            self._data[key] = result
+            self._data.move_to_end(key)
+            while len(self._data) > self.maxsize:
+                self._data.popitem(last=False)
+        return result
+
+    def stats(self):
+        with self._lock:
+            total = self.hits + self.misses
+            return {
+                "hits": self.hits,
+                "misses": self.misses,
+                "size": len(self._data),
+                "hit_rate": round(self.hits / total, 3) if total else None,
+            }
+
+    def clear(self):
+        with self._lock:
+            self._data.clear()
+            self.hits = self.misses = 0
+
+_cache = IndicatorCache()
+
+def cached_indicators(symbol, interval, candles):
+    return _cache.get(symbol, interval, candles)
+
+def cache_stats():
+    return _cache.stats()
+
+def clear_cache():
+    _cache.clear()
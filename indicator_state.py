@@ -0,0 +1,278 @@
+# indicator_state.py
+# Chỉ báo cập nhật tăng dần: mỗi nến mới (update) hoặc nến đang chạy thay đổi (replace_last)
+# chỉ tốn O(1), thay vì tính lại cả cửa sổ như indicators.sma / rsi / bollinger_bands / atr.
+# Cùng định nghĩa với bản batch (seed Wilder bằng trung bình `period` giá trị đầu, rs = 0 khi
+# down = 0...), chỉ khác ở mức làm tròn do cộng dồn. State serialize được (to_dict / from_dict)
+# để giữ qua các lần chạy.
+
+import json
+import math
+import os
+from collections import deque
+
+STATE_FILE = os.getenv("INDICATOR_STATE_FILE", "indicator_state.json")
+
+class _WindowState:
+    """Cửa sổ trượt `period` giá trị với tổng và tổng bình phương (dịch theo mốc `shift`)."""
+
+    def __init__(self, period):
+        self.period = period
+        self.window = deque(maxlen=period)
+        self.shift = None   # trừ mốc trước khi cộng để tổng bình phương không mất chính xác
+        self.s1 = 0.0
+        self.s2 = 0.0
+        self._ticks = 0
+
+    def update(self, x):
+        """Nến mới đóng/mở: đẩy giá trị vào cửa sổ."""
+        if self.shift is None:
+            self.shift = x
+        if len(self.window) == self.period:
+            self._remove(self.window[0])
+        self.window.append(x)
+        self._add(x)
+        self._tick()
+
+    def replace_last(self, x):
+        """Nến cuối (đang chạy) đổi giá trị."""
+        if not self.window:
+            return self.update(x)
+        self._remove(self.window[-1])
+        self.window[-1] = x
+        self._add(x)
+        self._tick()
+
+    def _add(self, x):
+        d = x - self.shift
+        self.s1 += d
+        self.s2 += d * d
+
+    def _remove(self, x):
+        d = x - self.shift
+        self.s1 -= d
+        self.s2 -= d * d
+
+    def _tick(self):
+        # Cộng/trừ lâu ngày trôi sai số: cứ `period` lần cập nhật thì cộng lại từ đầu (O(1) khấu hao)
+        self._ticks += 1
+        if self._ticks >= self.period:
+            self._ticks = 0
+            self.shift = self.window[-1]
+            self.s1 = math.fsum(x - self.shift for x in self.window)
+            self.s2 = math.fsum((x - self.shift) ** 2 for x in self.window)
+
+    @property
+    def ready(self):
+        return len(self.window) == self.period
+
+    def mean(self):
+        return self.shift + self.s1 / self.period if self.ready else None
+
+    def std(self):
+        if not self.ready:
+            return None
+        m = self.s1 / self.period
+        return math.sqrt(max(self.s2 / self.period - m * m, 0.0))
+
+    def to_dict(self):
+        return {"period": self.period, "window": list(self.window), "shift": self.shift,
+                "s1": self.s1, "s2": self.s2, "ticks": self._ticks}
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls(d["period"])
+        obj.window.extend(d["window"])
+        obj.shift, obj.s1, obj.s2, obj._ticks = d["shift"], d["s1"], d["s2"], d["ticks"]
+        return obj
+
+class SMAState(_WindowState):
+    @property
+    def value(self):
+        return self.mean()
+
+class BollingerState(_WindowState):
+    def __init__(self, period=20, mult=2):
+        super().__init__(period)
+        self.mult = mult
+
+    @property
+    def value(self):
+        """(lower, mid, upper) như indicators.bollinger_bands."""
+        mid = self.mean()
+        if mid is None:
+            return (None, None, None)
+        std = self.std()
+        return (mid - self.mult * std, mid, mid + self.mult * std)
+
+    def to_dict(self):
+        return {**super().to_dict(), "mult": self.mult}
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = super().from_dict(d)
+        obj.mult = d.get("mult", 2)
+        return obj
+
+class _WilderState:
+    """
+    Trạng thái Wilder dạng dict nhỏ; `_base` là bản chụp trước nến cuối để replace_last
+    áp lại nến đang chạy lên đúng trạng thái đã chốt.
+    """
+
+    def __init__(self, period=14):
+        self.period = period
+        self._base = self._initial()
+        self.s = dict(self._base)
+
+    def update(self, *bar):
+        self._base = self.s
+        self.s = self._advance(self._base, *bar)
+
+    def replace_last(self, *bar):
+        if self.s["n"] == 0:
+            return self.update(*bar)
+        self.s = self._advance(self._base, *bar)
+
+    def _wilder(self, s, key, sum_key, x):
+        # x là phần tử thứ s["n"] của chuỗi (đếm từ 1): seed = trung bình `period` phần tử đầu
+        n, p = s["n"], self.period
+        if n <= p:
+            s[sum_key] += x
+            if n == p:
+                s[key] = s[sum_key] / p
+        else:
+            s[key] = (s[key] * (p - 1) + x) / p
+
+    def to_dict(self):
+        return {"period": self.period, "base": self._base, "s": self.s}
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls(d["period"])
+        obj._base, obj.s = dict(d["base"]), dict(d["s"])
+        return obj
+
+class RSIState(_WilderState):
+    def _initial(self):
+        return {"n": 0, "last": None, "gain_sum": 0.0, "loss_sum": 0.0, "up": None, "down": None}
+
+    def _advance(self, base, close):
+        s = dict(base)
+        if s["last"] is not None:
+            delta = close - s["last"]
+            self._wilder(s, "up", "gain_sum", max(delta, 0))
+            self._wilder(s, "down", "loss_sum", -min(delta, 0))
+        s["last"] = close
+        s["n"] += 1
+        return s
+
+    @property
+    def value(self):
+        up, down = self.s["up"], self.s["down"]
+        if up is None:
+            return None
+        rs = up / down if down != 0 else 0
+        return 100 - 100 / (1 + rs)
+
+class ATRState(_WilderState):
+    def _initial(self):
+        return {"n": 0, "last_close": None, "tr_sum": 0.0, "atr": None}
+
+    def _advance(self, base, high, low, close):
+        s = dict(base)
+        pc = s["last_close"]
+        if pc is not None:
+            tr = max(high - low, abs(high - pc), abs(low - pc))
+            self._wilder(s, "atr", "tr_sum", tr)
+        s["last_close"] = close
+        s["n"] += 1
+        return s
+
+    @property
+    def value(self):
+        return self.s["atr"]
+
+class IndicatorState:
+    """
+    Bộ chỉ báo của compute_indicators cho 1 (symbol, interval), nhận row kline
+    [ts, open, close, high, low, volume] như KlineBuffer.upsert.
+    """
+
+    def __init__(self):
+        self.last_ts = None
+        self.rsi = RSIState(14)
+        self.atr = ATRState(14)
+        self.ma20 = SMAState(20)
+        self.ma50 = SMAState(50)
+        self.bb = BollingerState(20)
+
+    def upsert(self, row):
+        ts, _open, close, high, low = row[0], row[1], row[2], row[3], row[4]
+        if self.last_ts is not None and ts < self.last_ts:
+            return  # nến cũ hơn nến cuối: đã tính
+        if ts == self.last_ts:
+            for st in (self.rsi, self.ma20, self.ma50, self.bb):
+                st.replace_last(close)
+            self.atr.replace_last(high, low, close)
+        else:
+            for st in (self.rsi, self.ma20, self.ma50, self.bb):
+                st.update(close)
+            self.atr.update(high, low, close)
+            self.last_ts = ts
+
+    @classmethod
+    def from_rows(cls, rows):
+        obj = cls()
+        for row in rows:
+            obj.upsert(row)
+        return obj
+
+    def values(self):
+        """Giá trị nến cuối, cùng key với compute_indicators."""
+        lower, mid, upper = self.bb.value
+        return {
+            "rsi": self.rsi.value,
+            "ma20": self.ma20.value,
+            "ma50": self.ma50.value,
+            "bb_lower": lower,
+            "bb_mid": mid,
+            "bb_upper": upper,
+            "atr": self.atr.value,
+        }
+
+    def to_dict(self):
+        return {
+            "last_ts": self.last_ts,
+            "rsi": self.rsi.to_dict(), "atr": self.atr.to_dict(),
+            "ma20": self.ma20.to_dict(), "ma50": self.ma50.to_dict(), "bb": self.bb.to_dict(),
+        }
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls()
+        obj.last_ts = d["last_ts"]
+        obj.rsi = RSIState.from_dict(d["rsi"])
+        obj.atr = ATRState.from_dict(d["atr"])
+        obj.ma20 = SMAState.from_dict(d["ma20"])
+        obj.ma50 = SMAState.from_dict(d["ma50"])
+        obj.bb = BollingerState.from_dict(d["bb"])
+        return obj
+
+def _key(symbol, interval):
+    return f"{symbol}|{interval}"
+
+def save_states(states, path=None):
+    """states: {(symbol, interval): IndicatorState} -> file JSON (ghi tạm rồi đổi tên)."""
+    path = path or STATE_FILE
+    tmp = path + ".tmp"
+    with open(tmp, "w") as f:
+        json.dump({_key(*k): st.to_dict() for k, st in states.items()}, f)
+    os.replace(tmp, path)
+
+def load_states(path=None):
+    try:
+        with open(path or STATE_FILE, "r") as f:
+            raw = json.load(f)
+    except (FileNotFoundError, json.JSONDecodeError):
+        return {}
+    return {tuple(k.split("|", 1)): IndicatorState.from_dict(v) for k, v in raw.items()}
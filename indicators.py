@@ -1,64 +1,28 @@
 import numpy as np
+import indicator_engine
+import indicator_backends
+import candle_patterns
+from candle_frame import CandleFrame, as_frame
+
+def _to_list(arr):
+    """Mảng NaN-padded của indicator_engine -> list với None như API cũ."""
+    return [None if v != v else v for v in arr.tolist()]
 
 def sma(values, period):
-    if len(values) < period:
-        return [None] * len(values)
-    return [None] * (period - 1) + [
-        np.mean(values[i - period + 1:i + 1]) for i in range(period - 1, len(values))
-    ]
+    return _to_list(indicator_backends.active().sma(values, period))
 
 def rsi(values, period=14):
-    if len(values) < period:
-        return [None] * len(values)
-
-    deltas = np.diff(values)
-    seed = deltas[:period]
-    up = seed[seed > 0].sum() / period
-    down = -seed[seed < 0].sum() / period
-    rs = up / down if down != 0 else 0
-    rsi_series = [100 - 100 / (1 + rs)]
-
-    for delta in deltas[period:]:
-        gain = max(delta, 0)
-        loss = -min(delta, 0)
-        up = (up * (period - 1) + gain) / period
-        down = (down * (period - 1) + loss) / period
-        rs = up / down if down != 0 else 0
-        rsi_series.append(100 - 100 / (1 + rs))
-
-    return [None] * period + rsi_series
+    return _to_list(indicator_backends.active().rsi(values, period))
 
 def bollinger_bands(values, period=20):
-    if len(values) < period:
-        return [(None, None, None)] * len(values)
-
-    bands = [(None, None, None)] * (period - 1)
-    for i in range(period - 1, len(values)):
-        window = values[i - period + 1:i + 1]
-        mean = np.mean(window)
-        std = np.std(window)
-        upper = mean + 2 * std
-        lower = mean - 2 * std
-        bands.append((lower, mean, upper))
-    return bands
+    lower, mid, upper = (_to_list(x) for x in indicator_backends.active().bollinger(values, period))
+    return list(zip(lower, mid, upper))
 
 def atr(candles, period=14):
-    trs = []
-    for i in range(1, len(candles)):
-        high = candles[i]['high']
-        low = candles[i]['low']
-        prev_close = candles[i - 1]['close']
-        tr = max(high - low, abs(high - prev_close), abs(low - prev_close))
-        trs.append(tr)
-    if len(trs) < period:
-        return [None] * len(candles)
-    atr_vals = [None] * (period - 1)
-    atr_vals.append(np.mean(trs[:period]))
-    for i in range(period, len(trs)):
-        prev_atr = atr_vals[-1]
-        new_atr = (prev_atr * (period - 1) + trs[i]) / period
-        atr_vals.append(new_atr)
-    return [None] + atr_vals
+    frame = as_frame(candles)
+    if not len(frame):
+        return []
+    return _to_list(indicator_backends.active().atr(frame["high"], frame["low"], frame["close"], period))
 
 def detect_support_resistance(candles, window=20, tol_atr_mul=0.6):
     """
@@ -68,93 +32,142 @@ def detect_support_resistance(candles, window=20, tol_atr_mul=0.6):
     if not candles or len(candles) < window * 2 + 3:
         return []
 
-    highs = [c["high"] for c in candles]
-    lows  = [c["low"]  for c in candles]
-    atrs  = [c.get("atr") for c in candles]
+    frame = as_frame(candles)
+    return _sr_levels(frame["high"], frame["low"], frame.series("atr"), window, tol_atr_mul)
+
+def detect_support_resistance_multi(candles, windows=(10, 20, 50), tol_atr_mul=0.6):
+    """S/R ở nhiều thang pivot cùng lúc: {window: [(idx, price, type)]}."""
+    frame = as_frame(candles)
+    if not len(frame):
+        return {w: [] for w in windows}
+    highs, lows, atrs = frame["high"], frame["low"], frame.series("atr")
+    return {
+        w: _sr_levels(highs, lows, atrs, w, tol_atr_mul) if len(frame) >= w * 2 + 3 else []
+        for w in windows
+    }
+
+def _sr_levels(highs, lows, atrs, window, tol_atr_mul):
     atr_ref = None
     hist_atr = [x for x in atrs[-(window*2+50):] if x is not None]
     if hist_atr:
         atr_ref = sum(hist_atr) / len(hist_atr)
 
-    levels = []
-    n = len(candles)
-    for i in range(window, n - window):
-        h = highs[i]; l = lows[i]
-        left_h  = max(highs[i-window:i]) if i-window>=0 else None
-        right_h = max(highs[i+1:i+1+window]) if i+1+window<=n else None
-        left_l  = min(lows[i-window:i]) if i-window>=0 else None
-        right_l = min(lows[i+1:i+1+window]) if i+1+window<=n else None
-
-        # pivot high / pivot low
-        if left_h is not None and right_h is not None and h >= left_h and h >= right_h:
-            levels.append((i, h, 'resistance'))
-        if left_l is not None and right_l is not None and l <= left_l and l <= right_l:
-            levels.append((i, l, 'support'))
+    # pivot high / pivot low (max/min trượt O(n)); thứ tự như vòng lặp cũ: theo idx, resistance trước
+    idx_h, idx_l = indicator_engine.pivots(highs, lows, window)
+    hs, ls = highs.tolist(), lows.tolist()
+    levels = sorted(
+        [(i, hs[i], 'resistance') for i in idx_h.tolist()] + [(i, ls[i], 'support') for i in idx_l.tolist()],
+        key=lambda x: (x[0], x[2] == 'support'),
+    )
 
     # gom cụm theo tolerance dựa trên ATR (fallback 0.5% nếu thiếu ATR)
-    filtered = []
     def too_close(p, q):
         if atr_ref and atr_ref > 0:
             return abs(p - q) < tol_atr_mul * atr_ref
         # fallback %
         return abs(p - q) / ((p+q)/2.0) < 0.005
 
+    # Quét theo giá tăng dần: các mức cùng loại trong `filtered` tăng dần và cách nhau >= tol,
+    # nên mức duy nhất có thể gần giá hiện tại là mức cuối cùng của loại đó.
+    filtered = []
+    last_of = {}
     for idx, price, typ in sorted(levels, key=lambda x: x[1]):
-        merged = False
-        for j, (ii, pp, tt) in enumerate(filtered):
-            if tt == typ and too_close(price, pp):
-                # giữ mức “mạnh” hơn bằng cách chọn xa giá hiện tại hơn
-                filtered[j] = (idx, (pp + price)/2.0, typ)
-                merged = True
-                break
-        if not merged:
+        j = last_of.get(typ)
+        if j is not None and too_close(price, filtered[j][1]):
+            # giữ mức “mạnh” hơn bằng cách chọn xa giá hiện tại hơn
+            filtered[j] = (idx, (filtered[j][1] + price)/2.0, typ)
+        else:
+            last_of[typ] = len(filtered)
             filtered.append((idx, price, typ))
 
     return filtered
-    levels = []
-    for i in range(window, len(prices) - window):
-        curr_price = prices[i]
-        before = prices[i - window:i]
-        after = prices[i + 1:i + 1 + window]
-
-        if all(curr_price < x for x in before) and all(curr_price < x for x in after):
-            levels.append((i, curr_price, 'support'))
-        elif all(curr_price > x for x in before) and all(curr_price > x for x in after):
-            levels.append((i, curr_price, 'resistance'))
 
-    filtered = []
-    for idx, price, level_type in levels:
-        if not any(abs(price - p[1]) / price < tolerance for p in filtered if p[2] == level_type):
-            filtered.append((idx, price, level_type))
+# Chỉ báo tính theo yêu cầu: key -> (các key được tạo cùng lúc, phụ thuộc, hàm tính).
+# Thứ tự khai báo = thứ tự cột trong snapshot dict (như compute_indicators bản tính hết).
+INDICATORS = {}
+META_KEYS = {"sr_levels"}   # gắn vào nến cuối thay vì là cột
 
-    return filtered
+def _register(outputs, deps, fn):
+    for key in outputs:
+        INDICATORS[key] = (outputs, deps, fn)
 
-def compute_indicators(candles):
-    closes = [c['close'] for c in candles]
+def _bollinger_columns(frame):
+    lower, mid, upper = indicator_backends.active().bollinger(frame["close"], 20)
+    return {"bb_lower": lower, "bb_mid": mid, "bb_upper": upper}
 
-    rsi_vals = rsi(closes)
-    ma20_vals = sma(closes, 20)
-    ma50_vals = sma(closes, 50)
-    bb_vals = bollinger_bands(closes, 20)
-    atr_vals = atr(candles)
+_register(("rsi",), (), lambda f: {"rsi": indicator_backends.active().rsi(f["close"])})
+_register(("ma20",), (), lambda f: {"ma20": indicator_backends.active().sma(f["close"], 20)})
+_register(("ma50",), (), lambda f: {"ma50": indicator_backends.active().sma(f["close"], 50)})
+_register(("bb_lower", "bb_mid", "bb_upper"), (), _bollinger_columns)
+_register(("atr",), (), lambda f: {"atr": indicator_backends.active().atr(f["high"], f["low"], f["close"])})
+_register(("sr_levels",), ("atr",), lambda f: {"sr_levels": detect_support_resistance(f)})
+_register(("patterns",), (), lambda f: {"patterns": candle_patterns.scan(f)})
 
-    for i in range(len(candles)):
-        candles[i]['rsi'] = rsi_vals[i]
-        candles[i]['ma20'] = ma20_vals[i]
-        candles[i]['ma50'] = ma50_vals[i]
-        candles[i]['bb_lower'], candles[i]['bb_mid'], candles[i]['bb_upper'] = bb_vals[i]
-        candles[i]['atr'] = atr_vals[i]
+class IndicatorFrame(CandleFrame):
+    """
+    CandleFrame tính chỉ báo lần đầu được đọc (frame["ma20"], last, series, ...) rồi ghi nhớ.
+    Phụ thuộc được tính trước (sr_levels cần atr). Đọc cả nến dạng dict (frame[-1], iter)
+    thì tính đủ mọi chỉ báo như compute_indicators bản cũ. Bitmask "patterns" chỉ đọc qua cột
+    (detect_candle_signal giải mã thành candle_signal), không nằm trong snapshot dict.
+    """
 
-    candles[-1]["sr_levels"] = detect_support_resistance(candles)
+    row_hidden = frozenset({"patterns"})
+
+    def _lazy(self):
+        return True
+
+    def _ensure(self, key):
+        if key in self.columns or key in self.meta:
+            return
+        spec = INDICATORS.get(key)
+        if spec is None or not self._n:
+            return
+        _, deps, fn = spec
+        for dep in deps:
+            self._ensure(dep)
+        for out_key, values in fn(self).items():
+            if out_key in META_KEYS:
+                self.meta[out_key] = values
+            else:
+                self.columns[out_key] = values
+
+    def _ensure_all(self):
+        if all(k in self.columns or k in self.meta for k in INDICATORS):
+            return
+        for key in INDICATORS:
+            self._ensure(key)
+        # giữ thứ tự cột ổn định bất kể chỉ báo nào được đọc trước
+        base = {k: v for k, v in self.columns.items() if k not in INDICATORS}
+        self.columns = {**base, **{k: self.columns[k] for k in INDICATORS if k in self.columns}}
+
+    def materialize(self):
+        """Tính ngay mọi chỉ báo (vd. trước khi chia sẻ frame sang luồng khác)."""
+        self._ensure_all()
+        return self
 
-    return candles
+def compute_indicators(candles):
+    """
+    RSI / MA20 / MA50 / Bollinger / ATR và S/R (meta "sr_levels" của nến cuối), tính lười:
+    mỗi chỉ báo chỉ được tính khi có người đọc. Nhận list-of-dict, dict cột hoặc CandleFrame;
+    trả về IndicatorFrame.
+    """
+    if isinstance(candles, IndicatorFrame):
+        return candles
+    frame = as_frame(candles)
+    # bỏ chỉ báo có sẵn trong đầu vào để luôn được tính lại trên dữ liệu hiện tại
+    columns = {k: v for k, v in frame.columns.items() if k not in INDICATORS}
+    meta = {k: v for k, v in frame.meta.items() if k not in INDICATORS}
+    return IndicatorFrame(columns, meta, n=len(frame))
 
 def classify_trend(candles):
-    if not candles or candles[-1].get("ma20") is None:
+    if not candles:
+        return "unknown"
+    frame = as_frame(candles)
+    if frame.last("ma20") is None:
         return "unknown"
-    price = candles[-1]["close"]
-    ma20 = candles[-1]["ma20"]
-    ma50 = candles[-1]["ma50"]
+    price = frame.last("close")
+    ma20 = frame.last("ma20")
+    ma50 = frame.last("ma50")
 
     if ma20 and ma50:
         if price > ma20 > ma50:
@@ -255,10 +268,11 @@ def compute_short_term_momentum(candles_1h, lookback=20, pct_window=1):
             "volume_spike_ratio": None
         }
 
-    closes = [c["close"] for c in candles_1h]
-    last_close = closes[-1]
+    frame = as_frame(candles_1h)
+    closes = frame["close"]
+    last_close = float(closes[-1])
     prev_idx = -1 - max(1, pct_window)
-    prev_close = closes[prev_idx]
+    prev_close = float(closes[prev_idx])
 
     try:
         pct_change_1h = (last_close - prev_close) / prev_close * 100.0 if prev_close else None
@@ -266,15 +280,7 @@ def compute_short_term_momentum(candles_1h, lookback=20, pct_window=1):
         pct_change_1h = None
 
     # Chuẩn bị BB width series (ưu tiên dùng bb có sẵn nếu đã tính)
-    bb_width_series = []
-    for c in candles_1h:
-        lo = c.get("bb_lower")
-        up = c.get("bb_upper")
-        mid = c.get("bb_mid") or c.get("ma20") or c.get("close")
-        if lo is None or up is None or mid is None or mid == 0:
-            bb_width_series.append(None)
-        else:
-            bb_width_series.append((up - lo) / mid)
+    bb_width_series = _bb_width_series(frame)
 
     last_bb_width = bb_width_series[-1] if bb_width_series else None
     hist_bb = [x for x in bb_width_series[-(lookback+1):-1] if x is not None]
@@ -282,14 +288,14 @@ def compute_short_term_momentum(candles_1h, lookback=20, pct_window=1):
     bb_width_ratio = (last_bb_width / bb_width_avg) if (last_bb_width and bb_width_avg and bb_width_avg != 0) else None
 
     # ATR spike
-    atr_series = [c.get("atr") for c in candles_1h]
+    atr_series = frame.series("atr")
     last_atr = atr_series[-1]
     hist_atr = [x for x in atr_series[-(lookback+1):-1] if x is not None]
     atr_avg = sum(hist_atr) / len(hist_atr) if hist_atr else None
     atr_spike_ratio = (last_atr / atr_avg) if (last_atr and atr_avg and atr_avg != 0) else None
 
     # Volume spike
-    vols = [c.get("volume") for c in candles_1h]
+    vols = frame.series("volume")
     last_vol = vols[-1]
     hist_vol = [x for x in vols[-(lookback+1):-1] if x not in (None, 0)]
     vol_avg = sum(hist_vol) / len(hist_vol) if hist_vol else None
@@ -304,19 +310,27 @@ def compute_short_term_momentum(candles_1h, lookback=20, pct_window=1):
 
 
 def _safe_series(candles, key):
-    return [c.get(key) for c in candles]
+    return as_frame(candles).series(key)
+
+def _truthy(col):
+    """Mặt nạ tương đương `bool(v)` của từng phần tử (NaN/None/0 -> False)."""
+    return ~np.isnan(col) & (col != 0)
 
 def _bb_width_series(candles):
-    out = []
-    for c in candles:
-        lo = c.get("bb_lower")
-        up = c.get("bb_upper")
-        mid = c.get("bb_mid") or c.get("ma20") or c.get("close")
-        if lo is None or up is None or mid in (None, 0):
-            out.append(None)
-        else:
-            out.append((up - lo) / mid)
-    return out
+    frame = as_frame(candles)
+    n = len(frame)
+    nan = np.full(n, np.nan)
+    lo = frame.get("bb_lower", nan)
+    up = frame.get("bb_upper", nan)
+    bb_mid = frame.get("bb_mid", nan)
+    ma20 = frame.get("ma20", nan)
+    close = frame.get("close", nan)
+    # mid = bb_mid or ma20 or close
+    mid = np.where(_truthy(bb_mid), bb_mid, np.where(_truthy(ma20), ma20, close))
+    ok = ~np.isnan(lo) & ~np.isnan(up) & _truthy(mid)
+    with np.errstate(divide="ignore", invalid="ignore"):
+        width = np.where(ok, (up - lo) / np.where(ok, mid, 1.0), np.nan)
+    return [None if v != v else v for v in width.tolist()]
 
 def _slope_from_series(series, window=5):
     if series is None or len(series) < window + 1:
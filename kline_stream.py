@@ -0,0 +1,360 @@
+# kline_stream.py
+# Nhận kline KuCoin qua WebSocket vào ring buffer trong RAM, để run_block / check_signals
+# đọc nến và giá mà không cần gọi REST. Tự reconnect + resubscribe, lấp khoảng trống
+# sau khi mất kết nối bằng REST. Có server giả lập cục bộ để chạy thử offline:
+#
+#   python kline_stream.py            # stream thật cho toàn bộ BLOCKS
+#   python kline_stream.py --offline  # chạy với FakeKucoinServer
+#   python -m pytest tests/test_kline_stream.py
+
+import os
+import sys
+import json
+import time
+import uuid
+import random
+import asyncio
+import tempfile
+import threading
+from collections import deque
+
+import requests
+import websockets
+
+import kucoin_api
+import shm_store
+import indicator_state
+from kucoin_api import (
+    INTERVAL_SECONDS, fetch_candle_range, arrays_from_rows, rows_from_arrays, candles_from_arrays,
+)
+
+STREAM_INTERVALS = os.getenv("KLINE_STREAM_INTERVALS", "1hour,4hour,1day").split(",")
+RING_SIZE = int(os.getenv("KLINE_RING_SIZE", "2500"))  # đủ cho chuỗi 1H dựng 100 nến 1D
+KUCOIN_WS_URL = os.getenv("KUCOIN_WS_URL")  # bỏ qua bước xin token (vd. server giả lập)
+# Giữ RSI / ATR / MA / BB cập nhật O(1) theo từng update kline (lưu ra indicator_state.json)
+TRACK_INDICATORS = os.getenv("KLINE_TRACK_INDICATORS", "1") == "1"
+RECONNECT_MAX_DELAY = 30.0
+# Số buffer lấp bằng REST song song (mỗi request vẫn qua rate scheduler của kucoin_api)
+BACKFILL_CONCURRENCY = int(os.getenv("KLINE_BACKFILL_CONCURRENCY", str(kucoin_api.KUCOIN_CONCURRENCY)))
+BULLET_URL = "https://api.kucoin.com/api/v1/bullet-public"
+
+def _topic(symbol, interval):
+    return f"/market/candles:{symbol.replace('/', '-')}_{interval}"
+
+def _parse_topic(topic):
+    pair, interval = topic.rsplit(":", 1)[1].rsplit("_", 1)
+    return pair.replace("-", "/"), interval
+
+class KlineBuffer:
+    """Ring buffer cố định cho 1 (symbol, interval): row [ts, open, close, high, low, volume]."""
+
+    def __init__(self, size=RING_SIZE):
+        self.rows = deque(maxlen=size)
+
+    def upsert(self, row):
+        if self.rows and row[0] == self.rows[-1][0]:
+            self.rows[-1] = row          # nến đang chạy được cập nhật
+        elif not self.rows or row[0] > self.rows[-1][0]:
+            self.rows.append(row)        # nến mới mở
+        # row cũ hơn nến cuối: bỏ qua (đã có trong buffer)
+
+    def last_ts(self):
+        return self.rows[-1][0] if self.rows else None
+
+class KlineStream:
+    def __init__(self, symbols, intervals=None, ring_size=RING_SIZE, ws_url=KUCOIN_WS_URL,
+                 rest_fetch=fetch_candle_range, track_indicators=TRACK_INDICATORS, ping_ms=18000):
+        self.symbols = list(symbols)
+        self.intervals = list(intervals or STREAM_INTERVALS)
+        self.ws_url = ws_url
+        self.ping_ms = ping_ms   # chu kỳ ping khi dùng ws_url cố định (bullet-public tự trả pingInterval)
+        self.rest_fetch = rest_fetch
+        self.buffers = {(s, i): KlineBuffer(ring_size) for s in self.symbols for i in self.intervals}
+        self.track_indicators = track_indicators
+        # state đã lưu từ lần chạy trước; được nối tiếp (hoặc dựng lại nếu hụt) khi backfill
+        self.indicators = indicator_state.load_states() if track_indicators else {}
+        self.synced = False   # False khi đang mất kết nối / chưa lấp xong khoảng trống
+        self.reconnects = 0
+        self._live = False    # False: push nhận trong lúc backfill được giữ lại trong _pending
+        self._pending = []
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+
+    def stop(self):
+        self._stop.set()
+
+    # --- đọc từ luồng khác (kucoin_api live source) ---
+    def get_candles(self, symbol, interval, limit, as_arrays=False):
+        with self._lock:
+            buf = self.buffers.get((symbol, interval))
+            if not self.synced or buf is None or len(buf.rows) < limit:
+                return None
+            rows = list(buf.rows)[-limit:]
+        arrays = arrays_from_rows(rows)
+        return arrays if as_arrays else candles_from_arrays(arrays)
+
+    def get_price(self, symbol):
+        with self._lock:
+            for interval in self.intervals:
+                buf = self.buffers.get((symbol, interval))
+                if self.synced and buf is not None and buf.rows:
+                    return buf.rows[-1][2]
+        return None
+
+    def get_indicators(self, symbol, interval):
+        """Chỉ báo nến cuối (cùng key với compute_indicators), tính trên toàn bộ lịch sử stream."""
+        with self._lock:
+            st = self.indicators.get((symbol, interval))
+            if not self.synced or st is None:
+                return None
+            return st.values()
+
+    def _sync_indicators(self, key, buf):
+        # gọi khi đang giữ _lock
+        rows = list(buf.rows)
+        st = self.indicators.get(key)
+        if st is None or st.last_ts is None or not rows or st.last_ts < rows[0][0]:
+            self.indicators[key] = indicator_state.IndicatorState.from_rows(rows)
+            return
+        for row in rows:
+            if row[0] >= st.last_ts:
+                st.upsert(row)
+
+    def save_indicators(self):
+        if not self.track_indicators:
+            return
+        with self._lock:
+            indicator_state.save_states(self.indicators)
+
+    # --- REST: seed ban đầu và lấp khoảng trống sau khi reconnect ---
+    async def _backfill_one(self, symbol, interval, buf, now, sem):
+        step = INTERVAL_SECONDS[interval]
+        start = buf.last_ts()
+        if start is None:
+            start = now - buf.rows.maxlen * step
+        async with sem:
+            try:
+                arrays = await asyncio.to_thread(self.rest_fetch, symbol, interval, start, now)
+            except Exception as e:
+                print(f"⚠️ Không lấp được khoảng trống {symbol} {interval}: {e}")
+                return
+        with self._lock:
+            for row in rows_from_arrays(arrays):
+                buf.upsert(row)
+            if self.track_indicators:
+                self._sync_indicators((symbol, interval), buf)
+            snapshot = arrays_from_rows(list(buf.rows))
+        if kucoin_api.USE_CANDLE_SHM and kucoin_api.CANDLE_SHM_WRITER:
+            shm_store.publish(symbol, interval, snapshot)
+
+    async def _backfill(self):
+        now = int(time.time())
+        sem = asyncio.Semaphore(max(1, BACKFILL_CONCURRENCY))
+        await asyncio.gather(*[
+            self._backfill_one(symbol, interval, buf, now, sem)
+            for (symbol, interval), buf in self.buffers.items()
+        ])
+        self.save_indicators()
+
+    async def _connect_url(self):
+        if self.ws_url:
+            return self.ws_url, self.ping_ms
+        resp = await asyncio.to_thread(requests.post, BULLET_URL, timeout=10)
+        data = resp.json()["data"]
+        server = data["instanceServers"][0]
+        return f"{server['endpoint']}?token={data['token']}&connectId={uuid.uuid4().hex}", server["pingInterval"]
+
+    async def _ping_loop(self, ws, interval_ms):
+        while True:
+            await asyncio.sleep(interval_ms / 1000.0)
+            await ws.send(json.dumps({"id": uuid.uuid4().hex, "type": "ping"}))
+
+    def _on_message(self, msg):
+        if msg.get("type") != "message" or msg.get("subject") != "trade.candles.update":
+            return
+        symbol, interval = _parse_topic(msg["topic"])
+        c = msg["data"]["candles"]
+        row = [int(c[0]), float(c[1]), float(c[2]), float(c[3]), float(c[4]), float(c[5])]
+        with self._lock:
+            buf = self.buffers.get((symbol, interval))
+            if buf is not None:
+                buf.upsert(row)
+                st = self.indicators.get((symbol, interval))
+                if st is not None:
+                    st.upsert(row)
+        if buf is not None and kucoin_api.USE_CANDLE_SHM and kucoin_api.CANDLE_SHM_WRITER:
+            shm_store.upsert(symbol, interval, row)
+
+    async def _read_loop(self, ws):
+        async for raw in ws:
+            msg = json.loads(raw)
+            if self._live:
+                self._on_message(msg)
+            else:
+                self._pending.append(msg)
+
+    def _go_live(self):
+        # cùng event loop với _read_loop và không await: không push nào lọt giữa replay và cờ _live
+        pending, self._pending = self._pending, []
+        for msg in pending:
+            self._on_message(msg)
+        self._live = True
+        with self._lock:
+            self.synced = True
+
+    async def _session(self):
+        url, ping_ms = await self._connect_url()
+        async with websockets.connect(url) as ws:
+            self._live = False
+            self._pending = []
+            for symbol, interval in self.buffers:
+                await ws.send(json.dumps({
+                    "id": uuid.uuid4().hex, "type": "subscribe", "topic": _topic(symbol, interval),
+                    "privateChannel": False, "response": True,
+                }))
+            # Đọc socket + ping ngay từ đầu để kết nối không timeout trong lúc backfill;
+            # push nhận trong lúc đó được giữ lại và áp sau khi lấp xong khoảng trống
+            pinger = asyncio.create_task(self._ping_loop(ws, ping_ms))
+            reader = asyncio.create_task(self._read_loop(ws))
+            backfill = asyncio.create_task(self._backfill())
+            try:
+                done, _ = await asyncio.wait({reader, backfill}, return_when=asyncio.FIRST_COMPLETED)
+                if reader in done:
+                    reader.result()   # mất kết nối trước khi đồng bộ xong: ném lỗi để reconnect
+                    return
+                backfill.result()
+                self._go_live()
+                print(f"✅ Kline stream: {len(self.buffers)} topic đã đồng bộ")
+                await reader
+            finally:
+                for task in (pinger, reader, backfill):
+                    task.cancel()
+
+    async def run(self):
+        delay = 1.0
+        while not self._stop.is_set():
+            try:
+                await self._session()
+                delay = 1.0
+            except Exception as e:
+                print(f"⚠️ Kline stream mất kết nối: {e}")
+            with self._lock:
+                self.synced = False
+            self._live = False
+            self.save_indicators()
+            if self._stop.is_set():
+                break
+            self.reconnects += 1
+            await asyncio.sleep(random.uniform(0.5, 1.0) * delay)
+            delay = min(delay * 2, RECONNECT_MAX_DELAY)
+
+def start_background(symbols=None, intervals=None, **kwargs):
+    """
+    Chạy KlineStream trong luồng nền và đăng ký làm live source cho kucoin_api,
+    để fetch_coin_data / fetch_realtime_price đọc từ buffer khi đã đồng bộ.
+    """
+    if symbols is None:
+        from gpt_signal_builder import BLOCKS
+        symbols = [s for block in BLOCKS.values() for s in block]
+    stream = KlineStream(symbols, intervals, **kwargs)
+    thread = threading.Thread(target=lambda: asyncio.run(stream.run()), name="kline-stream", daemon=True)
+    thread.start()
+    kucoin_api.set_live_source(stream)
+    return stream
+
+class FakeKucoinServer:
+    """
+    WebSocket server cục bộ nói cùng giao thức KuCoin (welcome / ack / pong / candles.update).
+    publish() đẩy nến cho client đã subscribe; drop_all() cắt kết nối để thử reconnect.
+    """
+
+    def __init__(self, host="127.0.0.1", port=0):
+        self.host = host
+        self.port = port
+        self.clients = {}   # ws -> set(topic)
+        self.pings = 0
+        self.subscribes = 0
+        self._server = None
+
+    @property
+    def url(self):
+        return f"ws://{self.host}:{self.port}"
+
+    async def start(self):
+        self._server = await websockets.serve(self._handler, self.host, self.port)
+        self.port = list(self._server.sockets)[0].getsockname()[1]
+        return self
+
+    async def stop(self):
+        self._server.close()
+        await self._server.wait_closed()
+
+    async def _handler(self, ws):
+        self.clients[ws] = set()
+        await ws.send(json.dumps({"id": uuid.uuid4().hex, "type": "welcome"}))
+        try:
+            async for raw in ws:
+                msg = json.loads(raw)
+                if msg.get("type") == "subscribe":
+                    self.clients[ws].add(msg["topic"])
+                    self.subscribes += 1
+                    await ws.send(json.dumps({"id": msg["id"], "type": "ack"}))
+                elif msg.get("type") == "ping":
+                    self.pings += 1
+                    await ws.send(json.dumps({"id": msg["id"], "type": "pong"}))
+        except websockets.ConnectionClosed:
+            pass
+        finally:
+            self.clients.pop(ws, None)
+
+    async def publish(self, symbol, interval, row):
+        topic = _topic(symbol, interval)
+        payload = json.dumps({
+            "type": "message", "topic": topic, "subject": "trade.candles.update",
+            "data": {"symbol": symbol.replace("/", "-"), "candles": [str(x) for x in row] + ["0"],
+                     "time": time.time_ns()},
+        })
+        for ws, topics in list(self.clients.items()):
+            if topic in topics:
+                await ws.send(payload)
+
+    async def drop_all(self):
+        for ws in list(self.clients):
+            await ws.close()
+
+async def _offline_demo():
+    """Chạy stream với server giả lập: seed, nhận update, mất kết nối, reconnect + lấp khoảng trống."""
+    step = INTERVAL_SECONDS["1hour"]
+    t0 = int(time.time()) // step * step
+    indicator_state.STATE_FILE = os.path.join(tempfile.gettempdir(), "indicator_state_demo.json")
+
+    def fake_rest(symbol, interval, start_at, end_at):
+        return arrays_from_rows([[ts, 1.0, 1.0, 1.0, 1.0, 1.0] for ts in range(start_at - start_at % step, end_at + 1, step)])
+
+    server = await FakeKucoinServer().start()
+    stream = KlineStream(["BTC/USDT"], ["1hour"], ring_size=50, ws_url=server.url, rest_fetch=fake_rest)
+    task = asyncio.create_task(stream.run())
+    while not stream.synced:
+        await asyncio.sleep(0.05)
+
+    await server.publish("BTC/USDT", "1hour", [t0, 1.0, 2.0, 2.5, 0.5, 10.0])
+    await asyncio.sleep(0.1)
+    print("giá sau update:", stream.get_price("BTC/USDT"))
+
+    await server.drop_all()
+    while stream.reconnects == 0 or not stream.synced:
+        await asyncio.sleep(0.05)
+    print("reconnects:", stream.reconnects, "| số nến trong buffer:", len(stream.buffers[("BTC/USDT", "1hour")].rows))
+    print("chỉ báo:", stream.get_indicators("BTC/USDT", "1hour"))
+
+    stream.stop()
+    task.cancel()
+    await server.stop()
+
+if __name__ == "__main__":
+    if "--offline" in sys.argv:
+        asyncio.run(_offline_demo())
+    else:
+        from gpt_signal_builder import BLOCKS
+        syms = [s for block in BLOCKS.values() for s in block]
+        asyncio.run(KlineStream(syms).run())
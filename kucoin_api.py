@@ -1,58 +1,504 @@
+import os
+import json
+import random
+import asyncio
+import threading
 import requests
 import time
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime, timezone
+from requests.adapters import HTTPAdapter
+import numpy as np
 
-def fetch_coin_data(symbol, interval="4hour", limit=100):
-    base_url = "https://api.kucoin.com/api/v1/market/candles"
+import candle_archive
+import shm_store
+
+try:
+    import orjson  # parser JSON nhanh (tùy chọn)
+    _json_loads = orjson.loads
+except ImportError:
+    _json_loads = json.loads
+
+# Số request KuCoin chạy song song tối đa (env override)
+KUCOIN_CONCURRENCY = int(os.getenv("KUCOIN_CONCURRENCY", "8"))
+
+_session = None
+_session_lock = threading.Lock()
+
+def _get_session():
+    """
+    Session dùng chung cho mọi request KuCoin: giữ kết nối keep-alive,
+    pool đủ lớn để KUCOIN_CONCURRENCY luồng không phải mở kết nối mới.
+    """
+    global _session
+    with _session_lock:
+        if _session is None:
+            session = requests.Session()
+            adapter = HTTPAdapter(pool_connections=1, pool_maxsize=max(KUCOIN_CONCURRENCY, 10))
+            session.mount("https://", adapter)
+            _session = session
+    return _session
+
+# Nguồn dữ liệu trực tiếp trong process (vd. kline_stream.KlineStream): có get_candles / get_price,
+# trả về None khi chưa đồng bộ -> fallback REST
+_live_source = None
+
+def set_live_source(source):
+    global _live_source
+    _live_source = source
+
+# === Rate limit / backoff / circuit breaker dùng chung cho mọi endpoint KuCoin ===
+KUCOIN_BASE_URL = "https://api.kucoin.com"
+KUCOIN_MAX_RETRIES = int(os.getenv("KUCOIN_MAX_RETRIES", "4"))
+KUCOIN_BACKOFF_BASE = float(os.getenv("KUCOIN_BACKOFF_BASE", "0.5"))   # giây
+KUCOIN_BACKOFF_CAP = float(os.getenv("KUCOIN_BACKOFF_CAP", "20"))      # giây
+KUCOIN_BREAKER_THRESHOLD = int(os.getenv("KUCOIN_BREAKER_THRESHOLD", "5"))
+KUCOIN_BREAKER_COOLDOWN = float(os.getenv("KUCOIN_BREAKER_COOLDOWN", "30"))
+# Khi quota còn lại (header gw-ratelimit-remaining) xuống dưới mức này thì tạm dừng tới lúc reset
+KUCOIN_RATE_RESERVE = int(os.getenv("KUCOIN_RATE_RESERVE", "30"))
+
+# Budget theo endpoint: (request/giây, burst). Pool public của KuCoin ~2000 weight/30s,
+# candles weight 3, level1 weight 2 -> để dư biên cho các process khác cùng IP.
+ENDPOINT_BUDGETS = {
+    "candles": (float(os.getenv("KUCOIN_RATE_CANDLES", "15")), 30),
+    "level1": (float(os.getenv("KUCOIN_RATE_LEVEL1", "10")), 20),
+    "allTickers": (float(os.getenv("KUCOIN_RATE_ALLTICKERS", "1")), 2),
+}
+_DEFAULT_BUDGET = (5.0, 10)
+
+class _TokenBucket:
+    """Token bucket cho phép đặt chỗ: token âm = hàng đợi, người gọi ngủ tới lượt của mình."""
+
+    def __init__(self, rate, capacity):
+        self.rate = float(rate)
+        self.capacity = float(capacity)
+        self.tokens = float(capacity)
+        self.updated = time.monotonic()
+        self.paused_until = 0.0
+
+    def reserve(self, now):
+        self.tokens = min(self.capacity, self.tokens + (now - self.updated) * self.rate)
+        self.updated = now
+        self.tokens -= 1.0
+        wait = -self.tokens / self.rate if self.tokens < 0 else 0.0
+        return max(wait, self.paused_until - now)
+
+    def pause(self, now, seconds):
+        self.paused_until = max(self.paused_until, now + seconds)
+
+class _RateScheduler:
+    def __init__(self, budgets):
+        self._lock = threading.Lock()
+        self._buckets = {name: _TokenBucket(*b) for name, b in budgets.items()}
+
+    def _bucket(self, endpoint):
+        if endpoint not in self._buckets:
+            self._buckets[endpoint] = _TokenBucket(*_DEFAULT_BUDGET)
+        return self._buckets[endpoint]
+
+    def acquire(self, endpoint):
+        with self._lock:
+            wait = self._bucket(endpoint).reserve(time.monotonic())
+        if wait > 0:
+            time.sleep(wait)
+
+    def pause(self, endpoint, seconds):
+        with self._lock:
+            self._bucket(endpoint).pause(time.monotonic(), seconds)
+
+    def observe(self, endpoint, headers):
+        """Đọc header rate limit của KuCoin; gần cạn quota thì dừng endpoint tới lúc reset."""
+        try:
+            remaining = int(headers.get("gw-ratelimit-remaining"))
+            reset_ms = int(headers.get("gw-ratelimit-reset"))
+        except (TypeError, ValueError):
+            return
+        if remaining <= KUCOIN_RATE_RESERVE:
+            self.pause(endpoint, reset_ms / 1000.0)
+
+class _CircuitBreaker:
+    """
+    Sau N lỗi liên tiếp thì mở mạch: fail ngay trong cooldown. Hết cooldown (half-open) chỉ một
+    luồng được gửi request thử (kể cả các lần retry của chính nó); các luồng khác vẫn fail ngay
+    tới khi lượt thử thành công (đóng mạch) hoặc lỗi (mở lại). Lượt thử treo quá cooldown thì
+    nhường cho luồng khác thử.
+    """
+
+    def __init__(self, threshold, cooldown):
+        self.threshold = threshold
+        self.cooldown = cooldown
+        self.failures = 0
+        self.opened_at = None
+        self._trial_owner = None
+        self._trial_started = 0.0
+        self._lock = threading.Lock()
+
+    def check(self):
+        with self._lock:
+            if self.opened_at is None:
+                return
+            now = time.monotonic()
+            if now - self.opened_at < self.cooldown:
+                raise Exception("⛔️ KuCoin đang lỗi liên tục (circuit open), bỏ qua request.")
+            me = threading.get_ident()
+            if self._trial_owner not in (None, me) and now - self._trial_started < self.cooldown:
+                raise Exception("⛔️ KuCoin đang thử lại sau lỗi (circuit half-open), bỏ qua request.")
+            if self._trial_owner != me:
+                self._trial_owner, self._trial_started = me, now
+
+    def record_success(self):
+        with self._lock:
+            self.failures = 0
+            self.opened_at = None
+            self._trial_owner = None
+
+    def record_failure(self):
+        with self._lock:
+            self.failures += 1
+            if self._trial_owner is not None or self.failures >= self.threshold:
+                self.opened_at = time.monotonic()
+                self._trial_owner = None
+
+_scheduler = _RateScheduler(ENDPOINT_BUDGETS)
+_breaker = _CircuitBreaker(KUCOIN_BREAKER_THRESHOLD, KUCOIN_BREAKER_COOLDOWN)
+
+# Mã lỗi trong body (HTTP 200/4xx): 429000 = throttle như HTTP 429; mã request sai (4xxxxx,
+# 9xxxxx: tham số sai, symbol không tồn tại...) có retry cũng vô ích nên báo lỗi ngay;
+# còn lại (500000, lỗi gateway...) coi là lỗi tạm thời và retry như 5xx.
+KUCOIN_THROTTLE_CODE = "429000"
+
+def _is_request_error(code):
+    return code != KUCOIN_THROTTLE_CODE and str(code).startswith(("4", "9"))
+
+def _backoff_delay(attempt):
+    """Exponential backoff + full jitter."""
+    return random.uniform(0, min(KUCOIN_BACKOFF_CAP, KUCOIN_BACKOFF_BASE * (2 ** attempt)))
+
+def _kucoin_get(endpoint, path, params, label=""):
+    """
+    GET qua scheduler chung: chờ token của endpoint, retry 429/5xx/lỗi mạng/JSON hỏng/mã lỗi
+    tạm thời với backoff, báo lỗi cho circuit breaker. Chỉ lỗi request (_is_request_error) báo
+    ngay. Trả về trường "data" của response.
+    """
+    last_error = None
+    for attempt in range(KUCOIN_MAX_RETRIES):
+        _breaker.check()
+        _scheduler.acquire(endpoint)
+        try:
+            response = _get_session().get(KUCOIN_BASE_URL + path, params=params, timeout=10)
+        except requests.RequestException as e:
+            last_error = e
+            _breaker.record_failure()
+            print(f"⛔️ Lỗi mạng KuCoin {label} (thử {attempt+1}/{KUCOIN_MAX_RETRIES}): {e}")
+            time.sleep(_backoff_delay(attempt))
+            continue
+
+        _scheduler.observe(endpoint, response.headers)
+
+        try:
+            data = _json_loads(response.content)
+        except ValueError:
+            data = None
+        code = data.get("code") if isinstance(data, dict) else None
+
+        if response.status_code == 429 or code == KUCOIN_THROTTLE_CODE:
+            # Bị throttle: không tính là sàn lỗi, chờ tới lúc quota reset (hoặc backoff)
+            last_error = Exception(f"429 Too Many Requests: {response.text}")
+            try:
+                reset = int(response.headers.get("gw-ratelimit-reset")) / 1000.0
+            except (TypeError, ValueError):
+                reset = 0.0
+            _scheduler.pause(endpoint, max(reset, _backoff_delay(attempt)))
+            print(f"⛔️ KuCoin rate limit {label} (thử {attempt+1}/{KUCOIN_MAX_RETRIES})")
+            continue
+
+        if response.status_code >= 500:
+            last_error = Exception(f"Lỗi API Kucoin {response.status_code}: {response.text}")
+            _breaker.record_failure()
+            print(f"⛔️ KuCoin lỗi server {label} (thử {attempt+1}/{KUCOIN_MAX_RETRIES}): {response.status_code}")
+            time.sleep(_backoff_delay(attempt))
+            continue
+
+        if response.status_code != 200 or _is_request_error(code):
+            # sàn vẫn trả lời bình thường, lỗi nằm ở request: không retry, không tính vào breaker
+            _breaker.record_success()
+            raise Exception(f"Lỗi API Kucoin: {response.text}")
+
+        if code != "200000":
+            # JSON hỏng / mã lỗi tạm thời trong body (HTTP 200)
+            last_error = Exception(f"Kucoin trả về lỗi: {data if data is not None else response.text[:200]}")
+            _breaker.record_failure()
+            print(f"⛔️ KuCoin lỗi tạm thời {label} (thử {attempt+1}/{KUCOIN_MAX_RETRIES}): {code}")
+            time.sleep(_backoff_delay(attempt))
+            continue
+
+        _breaker.record_success()
+        return data["data"]
+
+    raise Exception(f"❌ Không thể gọi KuCoin {label} sau {KUCOIN_MAX_RETRIES} lần thử: {last_error}")
+
+# Kho nến shared memory giữa các process: 1 writer (CANDLE_SHM_WRITER=1), còn lại chỉ đọc
+USE_CANDLE_SHM = os.getenv("USE_CANDLE_SHM", "0") == "1"
+CANDLE_SHM_WRITER = os.getenv("CANDLE_SHM_WRITER", "0") == "1"
+CANDLE_SHM_MAX_AGE = float(os.getenv("CANDLE_SHM_MAX_AGE", "300"))  # giây
+
+# Candle cache trên đĩa (candle_archive): chỉ fetch phần nến mới hơn đuôi của store
+USE_CANDLE_CACHE = os.getenv("USE_CANDLE_CACHE", "1") == "1"
+
+KUCOIN_MAX_CANDLES = 1500  # KuCoin trả tối đa 1500 nến mỗi request
+
+INTERVAL_SECONDS = {
+    "1min": 60, "3min": 180, "5min": 300, "15min": 900, "30min": 1800,
+    "1hour": 3600, "2hour": 7200, "4hour": 14400, "6hour": 21600,
+    "8hour": 28800, "12hour": 43200, "1day": 86400, "1week": 604800,
+}
+
+_cache_locks = {}
+_cache_locks_guard = threading.Lock()
+
+def _cache_lock(symbol, interval):
+    key = (symbol, interval)
+    with _cache_locks_guard:
+        if key not in _cache_locks:
+            _cache_locks[key] = threading.Lock()
+        return _cache_locks[key]
+
+# === Giải mã nến dạng cột: ts int64 (epoch giây), OHLCV float64 ===
+CANDLE_COLUMNS = ("ts", "open", "close", "high", "low", "volume")  # cùng thứ tự payload KuCoin
+
+def empty_arrays():
+    out = {k: np.empty(0, dtype=np.float64) for k in CANDLE_COLUMNS}
+    out["ts"] = np.empty(0, dtype=np.int64)
+    return out
+
+def decode_candles(payload):
+    """Payload /market/candles (list chuỗi, mới nhất trước) -> dict cột numpy tăng dần theo thời gian."""
+    if not payload:
+        return empty_arrays()
+    mat = np.array([c[:6] for c in payload], dtype=np.float64)[::-1]
+    out = {k: np.ascontiguousarray(mat[:, i]) for i, k in enumerate(CANDLE_COLUMNS)}
+    out["ts"] = out["ts"].astype(np.int64)
+    return out
+
+def arrays_from_rows(rows):
+    if not rows:
+        return empty_arrays()
+    mat = np.asarray(rows, dtype=np.float64)
+    out = {k: np.ascontiguousarray(mat[:, i]) for i, k in enumerate(CANDLE_COLUMNS)}
+    out["ts"] = out["ts"].astype(np.int64)
+    return out
+
+def rows_from_arrays(arrays):
+    cols = [arrays[k].tolist() for k in CANDLE_COLUMNS]
+    return [list(r) for r in zip(*cols)]
+
+def slice_arrays(arrays, start=None, stop=None):
+    return {k: v[start:stop] for k, v in arrays.items()}
+
+def merge_arrays(old, new):
+    """Gộp theo ts (dedupe, tăng dần); bản ghi của `new` thắng khi trùng ts (nến đang chạy)."""
+    if len(old["ts"]) == 0:
+        return new
+    if len(new["ts"]) == 0:
+        return old
+    ts = np.concatenate([new["ts"], old["ts"]])
+    _, idx = np.unique(ts, return_index=True)  # lấy lần xuất hiện đầu = bản của `new`
+    return {k: np.concatenate([new[k], old[k]])[idx] for k in CANDLE_COLUMNS}
+
+def candles_from_arrays(arrays):
+    """Adapter tương thích ngược: dict cột -> list-of-dict như fetch_coin_data cũ."""
+    ts, o, c, h, l, v = (arrays[k].tolist() for k in CANDLE_COLUMNS)
+    return [{
+        "time": datetime.fromtimestamp(t, tz=timezone.utc).isoformat(),
+        "open": o[i],
+        "close": c[i],
+        "high": h[i],
+        "low": l[i],
+        "volume": v[i]
+    } for i, t in enumerate(ts)]
+
+def load_cached(symbol, interval, start_ts=None, end_ts=None):
+    """Đọc nến trong store (memmap, không copy)."""
+    return candle_archive.load(symbol, interval, start_ts, end_ts)
+
+def merge_into_cache(symbol, interval, arrays):
+    """Gộp thêm nến vào store (dedupe theo ts), dùng cho backfill."""
+    with _cache_lock(symbol, interval):
+        candle_archive.append(symbol, interval, arrays)
+
+def _request_candles(symbol, interval, start_at=None, end_at=None):
+    """Một request /market/candles; trả về dict cột tăng dần theo thời gian."""
     symbol_kucoin = symbol.replace("/", "-")
 
     params = {
         "symbol": symbol_kucoin,
         "type": interval,
-        "limit": limit
     }
+    if start_at is not None:
+        params["startAt"] = int(start_at)
+    if end_at is not None:
+        params["endAt"] = int(end_at)
 
-    for attempt in range(3):
-        try:
-            response = requests.get(base_url, params=params, timeout=10)
-            if response.status_code != 200:
-                raise Exception(f"Lỗi API Kucoin: {response.text}")
-
-            data = response.json()
-            if data.get("code") != "200000":
-                raise Exception(f"Kucoin trả về lỗi: {data}")
-
-            candles = data["data"]
-
-            result = []
-            for c in reversed(candles):  # đảo ngược về thời gian gần nhất
-                result.append({
-                    "time": datetime.fromtimestamp(int(c[0]) / 1000, tz=timezone.utc).isoformat(),
-                    "open": float(c[1]),
-                    "close": float(c[2]),
-                    "high": float(c[3]),
-                    "low": float(c[4]),
-                    "volume": float(c[5])
-                })
-
-            return result
-        except Exception as e:
-            print(f"⛔️ Lỗi khi fetch {symbol} (thử {attempt+1}/3): {e}")
-            time.sleep(1)
+    # KuCoin trả nến mới nhất trước, ts tính bằng giây
+    return decode_candles(_kucoin_get("candles", "/api/v1/market/candles", params, label=f"{symbol} {interval}"))
+
+def fetch_candle_range(symbol, interval, start_at, end_at=None):
+    """
+    Fetch [start_at, end_at] (epoch giây), tự chia trang theo KUCOIN_MAX_CANDLES nến.
+    """
+    step = INTERVAL_SECONDS[interval]
+    end_at = int(end_at if end_at is not None else time.time())
+    out = empty_arrays()
+    page_end = end_at
+    while page_end > start_at:
+        page_start = max(int(start_at), page_end - (KUCOIN_MAX_CANDLES - 1) * step)
+        page = _request_candles(symbol, interval, page_start, page_end)
+        out = merge_arrays(page, out)
+        if len(page["ts"]) and page["ts"][0] < page_start + step:
+            page_end = page_start
+        else:
+            # Sàn không có nến cũ hơn (coin mới list) -> dừng
+            break
+    return out
+
+def fetch_coin_data(symbol, interval="4hour", limit=100, use_cache=None, as_arrays=False):
+    """
+    Trả về `limit` nến gần nhất (cũ -> mới): list-of-dict, hoặc dict cột numpy nếu as_arrays.
+    Có cache: chỉ fetch nến từ high-water mark của cache trở đi (startAt), gộp rồi cắt cửa sổ.
+    """
+    if _live_source is not None:
+        live = _live_source.get_candles(symbol, interval, limit, as_arrays=as_arrays)
+        if live is not None:
+            return live
+    if USE_CANDLE_SHM and not CANDLE_SHM_WRITER:
+        shared = shm_store.read(symbol, interval, limit, max_age=CANDLE_SHM_MAX_AGE)
+        if shared is not None:
+            return shared if as_arrays else candles_from_arrays(shared)
+    if use_cache is None:
+        use_cache = USE_CANDLE_CACHE
+    step = INTERVAL_SECONDS.get(interval)
+    if step is None:
+        # interval lạ: không biết bước thời gian -> fetch 1 trang như cũ
+        arrays = slice_arrays(_request_candles(symbol, interval), -limit)
+        return arrays if as_arrays else candles_from_arrays(arrays)
+
+    now = int(time.time())
+    need_start = now - (limit + 1) * step
+
+    with _cache_lock(symbol, interval):
+        cached = load_cached(symbol, interval) if use_cache else empty_arrays()
+        if len(cached["ts"]) and cached["ts"][-1] >= need_start:
+            fresh = fetch_candle_range(symbol, interval, int(cached["ts"][-1]), now)
+            if cached["ts"][0] > need_start + step:
+                # cache chưa đủ sâu cho `limit` -> bổ sung phần cũ hơn
+                fresh = merge_arrays(fetch_candle_range(symbol, interval, need_start, int(cached["ts"][0])), fresh)
+        else:
+            fresh = fetch_candle_range(symbol, interval, need_start, now)
+
+        if use_cache:
+            # append-only: ghi đè nến đang chạy + nối nến mới; lịch sử cũ (vd. từ backfill) được giữ nguyên
+            candle_archive.append(symbol, interval, fresh)
+            arrays = load_cached(symbol, interval)
+        else:
+            arrays = fresh
+
+    if USE_CANDLE_SHM and CANDLE_SHM_WRITER:
+        shm_store.publish(symbol, interval, arrays)
+
+    window = {k: np.array(v) for k, v in slice_arrays(arrays, -limit).items()}
+    return window if as_arrays else candles_from_arrays(window)
 
-    raise Exception(f"❌ Không thể fetch dữ liệu cho {symbol} sau 3 lần thử.")
+async def fetch_market_data_async(symbols, intervals, limit=100, concurrency=None):
+    """
+    Fetch đồng thời mọi cặp symbol × timeframe.
+    intervals: {"1H": "1hour", "4H": "4hour", ...}
+    Trả về {symbol: {tf: candles}}. Lỗi của bất kỳ cặp nào được ném lại như fetch_coin_data.
+    """
+    workers = max(1, concurrency or KUCOIN_CONCURRENCY)
+    jobs = [(symbol, tf) for symbol in symbols for tf in intervals]
+    loop = asyncio.get_running_loop()
+    with ThreadPoolExecutor(max_workers=workers, thread_name_prefix="kucoin") as pool:
+        results = await asyncio.gather(*[
+            loop.run_in_executor(pool, fetch_coin_data, symbol, intervals[tf], limit)
+            for symbol, tf in jobs
+        ])
+
+    out = {symbol: {} for symbol in symbols}
+    for (symbol, tf), candles in zip(jobs, results):
+        out[symbol][tf] = candles
+    return out
+
+def fetch_market_data(symbols, intervals, limit=100, concurrency=None):
+    """Bản đồng bộ của fetch_market_data_async (dùng cho script không có event loop)."""
+    return asyncio.run(fetch_market_data_async(symbols, intervals, limit, concurrency))
+
+def _local_price(symbol):
+    """Giá từ nguồn không tốn request: kline_stream trong process, rồi shm (close nến 1H cuối)."""
+    if _live_source is not None:
+        live = _live_source.get_price(symbol)
+        if live is not None:
+            return live
+    if USE_CANDLE_SHM and not CANDLE_SHM_WRITER:
+        shared = shm_store.read(symbol, "1hour", 1, max_age=CANDLE_SHM_MAX_AGE)
+        if shared is not None:
+            return float(shared["close"][-1])
+    return None
 
 def fetch_realtime_price(symbol):
-    base_url = "https://api.kucoin.com/api/v1/market/orderbook/level1"
+    local = _local_price(symbol)
+    if local is not None:
+        return local
     symbol_kucoin = symbol.replace("/", "-")
     params = {"symbol": symbol_kucoin}
 
-    response = requests.get(base_url, params=params, timeout=10)
-    if response.status_code != 200:
-        raise Exception(f"Lỗi realtime price Kucoin: {response.text}")
+    data = _kucoin_get("level1", "/api/v1/market/orderbook/level1", params, label=f"{symbol} level1")
+    return float(data["price"])
+
+# Snapshot giá toàn sàn: 1 request cho mọi cặp, dùng lại trong PRICE_SNAPSHOT_TTL giây
+PRICE_SNAPSHOT_TTL = float(os.getenv("PRICE_SNAPSHOT_TTL", "5"))
+_price_snapshot = {"at": 0.0, "prices": {}}
+_price_snapshot_lock = threading.Lock()
+
+def fetch_all_prices(max_age=None):
+    """
+    Giá last của mọi cặp từ /market/allTickers, dạng {"BTC/USDT": 65000.0, ...}.
+    Snapshot còn mới hơn max_age (mặc định PRICE_SNAPSHOT_TTL) giây thì dùng lại, không gọi sàn.
+    """
+    max_age = PRICE_SNAPSHOT_TTL if max_age is None else max_age
+    with _price_snapshot_lock:
+        if _price_snapshot["prices"] and time.monotonic() - _price_snapshot["at"] < max_age:
+            return _price_snapshot["prices"]
 
-    data = response.json()
-    return float(data["data"]["price"])
+        data = _kucoin_get("allTickers", "/api/v1/market/allTickers", {}, label="allTickers")
+        prices = {}
+        for t in data.get("ticker", []):
+            last = t.get("last")
+            if last is not None:
+                prices[t["symbol"].replace("-", "/")] = float(last)
+        _price_snapshot["prices"] = prices
+        _price_snapshot["at"] = time.monotonic()
+        return prices
+
+def fetch_prices(symbols):
+    """
+    {symbol: giá} cho `symbols`: lấy từ stream / shm trước, chỉ gọi allTickers khi còn cặp
+    nguồn local không phục vụ được. Cặp không có giá ở đâu thì vắng mặt trong kết quả.
+    """
+    prices, missing = {}, []
+    for symbol in symbols:
+        local = _local_price(symbol)
+        if local is None:
+            missing.append(symbol)
+        else:
+            prices[symbol] = local
+    if missing:
+        try:
+            snapshot = fetch_all_prices()
+        except Exception as e:
+            print(f"⚠️ Không lấy được snapshot giá toàn sàn: {e}")
+            snapshot = {}
+        prices.update({s: snapshot[s] for s in missing if s in snapshot})
+    return prices
 
 def get_market_data(symbols: list[str], interval="4hour", limit=100):
     result = {}
@@ -1,23 +1,67 @@
+import os
 import sys
 import json
 import traceback
 import asyncio
 import time
 from datetime import datetime, UTC
-from gpt_signal_builder import get_gpt_signals, BLOCKS
-from kucoin_api import fetch_coin_data
+import openai
+from gpt_signal_builder import gpt_signal_for, BLOCKS
+from kucoin_api import fetch_coin_data, fetch_market_data_async
+from pipeline import Stage, run_pipeline
 from telegram_bot import send_message, format_message
+from resampler import derive_timeframes
+from candle_frame import as_frame
+from indicator_cache import cached_indicators, cache_stats
+from batch_screen import screen
+import sr_store
+import htf_cache
+from candle_patterns import scan as scan_patterns, signal as candle_signal
 from signal_logger import save_signals
-from indicators import compute_indicators, generate_suggested_tps, compute_short_term_momentum, generate_stop_loss
+from indicators import generate_suggested_tps, compute_short_term_momentum, generate_stop_loss
 from filters import anti_fomo_extension, rsi_regime, exhaustion_cooldown, sfp_check, multi_tf_alignment_ok, build_soft_htf_from_1h, debounce_1h_ok
 from signal_tracker import resolve_duplicate_signal
 from momentum_config import get_thresholds
 from filters import FILTERS_CONFIG
+from filter_chain import FilterChain, Filter
 
 
 ACTIVE_FILE = "active_signals.json"
 
 TF_MAP = {"1H": "1hour", "4H": "4hour", "1D": "1day"}
+CANDLE_LIMIT = 100
+
+# "1" = chỉ fetch 1H rồi dựng 4H/1D tại chỗ (căn mốc UTC); "0" = fetch riêng từng khung
+DERIVE_HTF_FROM_1H = os.getenv("DERIVE_HTF_FROM_1H", "1") == "1"
+
+# "1" = sr_levels 4H / 1D lấy từ sr_store (pivot lịch sử sâu gieo từ candle_archive, cập nhật dần)
+# thay vì dò lại trên CANDLE_LIMIT nến; "0" = detect_support_resistance như trước
+USE_SR_STORE = os.getenv("USE_SR_STORE", "0") == "1"
+SR_STORE_TFS = ("4H", "1D")
+
+# "1" = sàng lọc rsi_regime / anti_fomo / exhaustion cho cả block bằng mảng 2D trước vòng lặp từng mã
+BATCH_SCREEN = os.getenv("BATCH_SCREEN", "0") == "1"
+
+# "1" = sắp lại thứ tự filter theo thống kê cost / tỉ lệ loại (filter_stats.json); "0" = thứ tự cố định
+ADAPTIVE_FILTERS = os.getenv("ADAPTIVE_FILTERS", "1") == "1"
+
+# "1" = kết quả 4H / 1D (trend, candle_signal, sfp, chỉ báo) tính trên nến ĐÃ ĐÓNG và cache tới lần
+# đóng nến kế tiếp (htf_cache.json): khác kết quả trên nến đang chạy và khác batch_screen;
+# "0" = tính lại mọi khung mỗi lượt quét, gồm cả nến đang chạy (như trước)
+HTF_RESULT_CACHE = os.getenv("HTF_RESULT_CACHE", "0") == "1"
+HTF_CACHED_TFS = ("4H", "1D")
+
+# Số worker đồng thời của từng stage trong pipeline run_block; validate / send giữ 1 vì
+# ghi active_signals.json và gửi Telegram theo từng tín hiệu
+PIPELINE_CONCURRENCY = {
+    "fetch": int(os.getenv("PIPELINE_FETCH_CONCURRENCY", "8")),
+    "indicators": int(os.getenv("PIPELINE_INDICATOR_CONCURRENCY", "4")),
+    "filters": 2,
+    "tps": 2,
+    "gpt": int(os.getenv("GPT_CONCURRENCY", "4")),
+    "validate": 1,
+    "send": 1,
+}
 
 TEST_MODE = True  # Set to False to enforce 4H candle closure
 
@@ -79,11 +123,14 @@ def strong_momentum_flag(m, symbol):
 
 
 def classify_trend(candles):
-    if not candles or candles[-1].get("ma20") is None:
+    if not candles:
         return "unknown"
-    price = candles[-1]["close"]
-    ma20 = candles[-1]["ma20"]
-    ma50 = candles[-1]["ma50"]
+    frame = as_frame(candles)
+    if frame.last("ma20") is None:
+        return "unknown"
+    price = frame.last("close")
+    ma20 = frame.last("ma20")
+    ma50 = frame.last("ma50")
     if ma20 and ma50:
         if price > ma20 > ma50:
             return "uptrend"
@@ -96,18 +143,361 @@ def classify_trend(candles):
 def detect_candle_signal(candles):
     if len(candles) < 2:
         return "none"
-    c1 = candles[-2]
-    c2 = candles[-1]
-    if c1["close"] < c1["open"] and c2["close"] > c2["open"] and c2["close"] > c1["open"]:
-        return "bullish engulfing"
-    elif c1["close"] > c1["open"] and c2["close"] < c2["open"] and c2["close"] < c1["open"]:
-        return "bearish engulfing"
-    elif abs(c2["close"] - c2["open"]) < (c2["high"] - c2["low"]) * 0.1:
-        return "doji"
-    return "none"
+    frame = as_frame(candles)
+    # IndicatorFrame giữ sẵn bitmask mẫu nến của cả chuỗi; frame thường chỉ cần quét vài nến cuối
+    patterns = frame.get("patterns")
+    if patterns is None:
+        patterns = scan_patterns(frame[-3:])
+    return candle_signal(patterns[-1])
+
+def _htf_layer(symbol, tf, closed):
+    """Kết quả khung lớn trên các nến đã đóng; htf_cache giữ tới lần đóng nến kế tiếp."""
+    candles = cached_indicators(symbol, tf, closed)
+    if USE_SR_STORE and tf in SR_STORE_TFS:
+        candles.meta["sr_levels"] = sr_store.levels_for(symbol, TF_MAP[tf], candles, running_last=False)
+    raw_keys = set(closed.columns) | {"time"}
+    layer = {
+        "trend": classify_trend(candles),
+        "candle_signal": detect_candle_signal(candles),
+        "indicators": {k: v for k, v in (candles[-1] if len(candles) else {}).items() if k not in raw_keys},
+    }
+    if tf == "4H":
+        layer["sfp"] = sfp_check(candles, FILTERS_CONFIG)
+    return layer
+
+# === Filter theo từng mã: mỗi filter nhận ctx, trả về (ok, why) ===
+def _filter_context(symbol, candles_map, enriched, htf=None):
+    # RSI regime / anti-FOMO / exhaustion dựa snapshot 4H, nếu thiếu spike lấy từ 1H
+    snap_4h = dict(enriched.get("4H", {}))
+    spikes_1h = {k: enriched.get("1H", {}).get(k) for k in ("atr_spike_ratio","volume_spike_ratio","bb_width_ratio","pct_change_1h")}
+    for k, v in spikes_1h.items():
+        snap_4h.setdefault(k, v)
+    return {
+        "symbol": symbol,
+        "cfg": FILTERS_CONFIG,
+        "candles_map": candles_map,
+        "enriched": enriched,
+        "snap_4h": snap_4h,
+        "trend_1d": enriched.get("1D", {}).get("trend", "unknown"),
+        "htf": htf or {},
+    }
+
+def _debounce_filter(ctx):
+    # Debounce 1H: yêu cầu nến 1H gần nhất đồng thuận slope
+    return debounce_1h_ok(ctx["candles_map"].get("1H", []), bars=ctx["cfg"].get("debounce_1h_bars", 2))
+
+def _multi_tf_filter(ctx):
+    # Multi-TF alignment (1H vs 4H-soft)
+    candles_map = ctx["candles_map"]
+    return multi_tf_alignment_ok(candles_map.get("1H", []), candles_map.get("4H", []), ctx["cfg"])
+
+def _rsi_regime_filter(ctx):
+    return rsi_regime(ctx["snap_4h"], ctx["trend_1d"], ctx["cfg"])
+
+def _anti_fomo_filter(ctx):
+    return anti_fomo_extension(ctx["snap_4h"], ctx["cfg"])
+
+def _exhaustion_filter(ctx):
+    return exhaustion_cooldown(ctx["snap_4h"], ctx["cfg"])
+
+def _sfp_filter(ctx):
+    # SFP check (dùng 4H thật nếu có, nếu không soft-4H); 4H đã cache thì lấy kết quả trên nến đã đóng
+    cached = ctx["htf"].get("4H", {}).get("sfp")
+    if cached is not None:
+        return tuple(cached)
+    candles4h_for_sfp = ctx["candles_map"].get("4H")
+    if not candles4h_for_sfp:
+        candles4h_for_sfp = build_soft_htf_from_1h(ctx["candles_map"].get("1H", []), group=4)
+    return sfp_check(candles4h_for_sfp or [], ctx["cfg"])
+
+def _trend_consensus_filter(ctx):
+    # Siết đồng thuận khung giờ
+    enriched = ctx["enriched"]
+    t1h = enriched.get("1H", {}).get("trend", "unknown")
+    t4h = enriched.get("4H", {}).get("trend", "unknown")
+    t1d = enriched.get("1D", {}).get("trend", "unknown")
+    candle4h = enriched.get("4H", {}).get("candle_signal", "none")
+
+    # Rule chính: 4H phải KHÔNG sideways và đồng hướng với 1D
+    if t4h in ("uptrend", "downtrend") and t1d == t4h:
+        return True, "ok"
+    # Rule phụ: 1D không sideways, 4H không ngược 1D (và 4H không sideways)
+    if t1d in ("uptrend", "downtrend") and not is_opposite_trend(t4h, t1d) and t4h != "sideways":
+        return True, "ok"
+    # Ngoại lệ: 4H có nến tín hiệu mạnh + momentum 1H bùng nổ
+    mmm = {
+        "pct_change_1h": enriched.get("1H", {}).get("pct_change_1h"),
+        "bb_width_ratio": enriched.get("1H", {}).get("bb_width_ratio"),
+        "atr_spike_ratio": enriched.get("1H", {}).get("atr_spike_ratio"),
+        "volume_spike_ratio": enriched.get("1H", {}).get("volume_spike_ratio"),
+    }
+    if candle4h in ("bullish engulfing", "bearish engulfing") and strong_momentum_flag(mmm, ctx["symbol"]):
+        return True, "strong candle + momentum"
+    return False, f"không đạt đồng thuận 4H/1D (t4h={t4h}, t1d={t1d})"
+
+# Thứ tự khai báo = thứ tự cũ; chain tự sắp lại theo cost / tỉ lệ loại khi đủ thống kê.
+# trend_consensus là cổng chấp nhận cuối: lỗi thì loại mã chứ không cho qua.
+FILTER_CHAIN = FilterChain([
+    ("debounce_1h", _debounce_filter),
+    ("multi_tf_alignment", _multi_tf_filter),
+    ("rsi_regime", _rsi_regime_filter),
+    ("anti_fomo", _anti_fomo_filter),
+    ("exhaustion", _exhaustion_filter),
+    ("sfp", _sfp_filter),
+    Filter("trend_consensus", _trend_consensus_filter, fail_closed=True),
+], adaptive=ADAPTIVE_FILTERS)
+
+def _fetch_symbol(item):
+    """Stage fetch: nến thô mọi khung của 1 mã (bỏ qua nếu đã fetch sẵn cho batch screen)."""
+    if item.get("raw") is None:
+        symbol = item["symbol"]
+        if DERIVE_HTF_FROM_1H:
+            # 1 chuỗi 1H đủ dài cho CANDLE_LIMIT nến 1D (+ nến đang chạy)
+            candles_1h = fetch_coin_data(symbol, interval=TF_MAP["1H"], limit=(CANDLE_LIMIT + 1) * 24)
+            item["raw"] = derive_timeframes(candles_1h, limit=CANDLE_LIMIT)
+        else:
+            item["raw"] = {tf: fetch_coin_data(symbol, interval=interval, limit=CANDLE_LIMIT) for tf, interval in TF_MAP.items()}
+    return item
+
+def _enrich_symbol(item):
+    """Stage indicators: snapshot + trend + nến tín hiệu từng khung, động lượng 1H."""
+    symbol, raw_data = item["symbol"], item["raw"]
+    enriched = {}
+    candles_map = {}
+    htf = {}
+    for tf in raw_data:
+        if HTF_RESULT_CACHE and tf in HTF_CACHED_TFS:
+            # chỉ báo / trend / S/R khung lớn lấy từ nến đã đóng; giá nến đang chạy vẫn là giá live
+            candles = as_frame(raw_data[tf])
+            layer = htf_cache.results_for(
+                symbol, TF_MAP[tf], candles,
+                lambda closed, tf=tf: _htf_layer(symbol, tf, closed),
+                extra=(FILTERS_CONFIG.get("sfp_lookback", 20), USE_SR_STORE),
+            )
+            htf[tf] = layer
+            candles_map[tf] = candles
+            enriched[tf] = {
+                "trend": layer["trend"],
+                "candle_signal": layer["candle_signal"],
+                **candles[-1],
+                **layer["indicators"]
+            }
+            continue
+        candles = cached_indicators(symbol, tf, raw_data[tf])
+        if USE_SR_STORE and tf in SR_STORE_TFS:
+            # đặt trước khi đọc snapshot để frame lười không dò S/R lại
+            candles.meta["sr_levels"] = sr_store.levels_for(symbol, TF_MAP[tf], candles)
+        candles_map[tf] = candles
+        trend = classify_trend(candles)
+        signal = detect_candle_signal(candles)
+        enriched[tf] = {
+            "trend": trend,
+            "candle_signal": signal,
+            **candles[-1]
+        }
+    # Gắn động lượng 1H
+    if "1H" in raw_data:
+        try:
+            momo = compute_short_term_momentum(candles_map["1H"])
+            if isinstance(momo, dict):
+                enriched.setdefault("1H", {}).update({
+                    "pct_change_1h": momo.get("pct_change_1h"),
+                    "bb_width_ratio": momo.get("bb_width_ratio"),
+                    "atr_spike_ratio": momo.get("atr_spike_ratio"),
+                    "volume_spike_ratio": momo.get("volume_spike_ratio"),
+                })
+        except Exception as _e:
+            print(f"⚠️ Không tính được momentum 1H cho {symbol}: {_e}")
+    item.update(enriched=enriched, candles_map=candles_map, htf=htf)
+    return item
+
+def _filter_symbol(item):
+    """Stage filters: soft confirmations, filters & đồng thuận 4H/1D (thứ tự do FILTER_CHAIN tự sắp)."""
+    symbol = item["symbol"]
+    ok, name, why = FILTER_CHAIN.run(_filter_context(symbol, item["candles_map"], item["enriched"], item["htf"]))
+    if not ok:
+        print(f"⛔ {symbol}: {name} -> {why}")
+        return None
+    return item
+
+def _suggest_tps(item):
+    """Stage TP: vùng TP gợi ý theo S/R 4H (rỗng nếu thiếu dữ liệu)."""
+    item["tps"] = []
+    tf_data = item["enriched"].get("4H", {})
+    direction = tf_data.get("trend", "sideways")
+    price = tf_data.get("close")
+    sr_levels = tf_data.get("sr_levels", [])
+    atr_val = tf_data.get("atr")
+    if price and direction and sr_levels:
+        suggested = generate_suggested_tps(price, direction, sr_levels, atr_val=atr_val)
+        item["tps"] = suggested
+    return item
+
+def _validate_signal(item):
+    """Stage validation: kiểm tra entry / SL / TP / R:R của tín hiệu GPT, gắn ETA."""
+    sig = item["signal"]
+    sym = sig.get("pair") or sig.get("symbol")
+    tf_data = item["enriched"].get("4H", {})
+
+    direction = sig.get("direction")
+    current_price = tf_data.get("close")
+    atr_val = tf_data.get("atr")
+    sr_levels = tf_data.get("sr_levels", [])
+
+    if not all([direction, current_price, atr_val]):
+        print(f"⚠️ Thiếu dữ liệu cho {sym} -> BỎ QUA")
+        return None
+
+    entry_1 = safe_float(sig.get("entry_1") or sig.get("entry1"))
+    if entry_1 is None:
+        print(f"⚠️ Thiếu dữ liệu entry hoặc giá hiện tại -> BỎ QUA {sym}")
+        return None
+
+    sig["entry_1"] = entry_1
+
+    if direction.lower() == "long" and entry_1 > current_price * 1.1:
+        print(f"⚠️ Entry LONG quá xa: entry={entry_1}, price={current_price} -> BỎ QUA {sym}")
+        return None
+    elif direction.lower() == "short" and entry_1 < current_price * 0.9:
+        print(f"⚠️ Entry SHORT quá xa: entry={entry_1}, price={current_price} -> BỎ QUA {sym}")
+        return None
+    elif direction.lower() not in ["long", "short"]:
+        print(f"⚠️ Hướng giao dịch không rõ ràng: {direction} -> BỎ QUA {sym}")
+        return None
+
+    stop_loss = safe_float(sig.get("stop_loss") or sig.get("StopLoss") or sig.get("stoploss"))
+    if stop_loss is None:
+        print(f"⚠️ Không có Stop Loss hợp lệ từ GPT cho {sym} -> BỎ QUA")
+        return None
+
+    sig["stop_loss"] = stop_loss
+
+    tps = sig.get("take_profits") or sig.get("take_profit") or sig.get("tp")
+    if isinstance(tps, str):
+        try:
+            tps = json.loads(tps)
+        except:
+            try:
+                tps = [float(x.strip()) for x in tps.strip('[]').split(',') if x.strip()]
+            except:
+                print(f"⚠️ Không thể chuyển đổi TP cho {sym}, bỏ qua")
+                sig["tp"] = []
+                return None
+
+    if isinstance(tps, list):
+        tps_clean = [safe_float(tp) for tp in tps[:5]]
+        for i, tp_val in enumerate(tps_clean):
+            sig[f"tp{i+1}"] = tp_val
+        sig["tp"] = tps_clean
+    else:
+        sig["tp"] = []
+
+    tp_list = sig.get("tp", [])
+    tp1 = safe_float(tp_list[0]) if isinstance(tp_list, list) and len(tp_list) > 0 else None
+
+    rr_ratio = abs(entry_1 - stop_loss)
+    if rr_ratio == 0:
+        print(f"⚠️ R:R không hợp lệ với {sym} -> BỎ QUA")
+        return None
+    if tp1:
+        rr_reward = abs(tp1 - entry_1)
+        rr = rr_reward / rr_ratio
+        if rr < 1.2:
+            print(f"⚠️ R:R quá thấp ({rr:.2f}) cho {sym} | entry: {entry_1}, sl: {stop_loss}, tp1: {tp1}")
+            return None
+        else:
+            print(f"✅ R:R = {rr:.2f} cho {sym}")
+    else:
+        print(f"⚠️ Không có TP1 cho {sym} -> BỎ QUA")
+        return None
+
+    # === ETA (4H-based back-of-the-envelope) ===
+    try:
+        tp_list_vals = [v for v in (sig.get("tp") or []) if v is not None]
+        etas = []
+        for tpv in tp_list_vals[:3]:
+            eta_h = _estimate_eta_hours(entry_1, tpv, atr_val, tf_hours=4)
+            etas.append(eta_h)
+
+        def _fmt(x, unit='h'):
+            return f"{x:.0f}{unit}" if isinstance(x, (int, float)) and x is not None else "—"
+
+        print(f"🕒 ETA: TP1={_fmt(etas[0]) if len(etas)>0 else '—'}, TP2={_fmt(etas[1]) if len(etas)>1 else '—'}, TP3={_fmt(etas[2]) if len(etas)>2 else '—'}")
+
+        if len(etas)>0: sig["eta_tp1_h"] = etas[0]
+        if len(etas)>1: sig["eta_tp2_h"] = etas[1]
+        if len(etas)>2: sig["eta_tp3_h"] = etas[2]
+    except Exception as _e:
+        print(f"⚠️ ETA calc error for {sym}: {_e}")
+
+    item["signal"] = sig
+    return item
+
+def _send_signal(item):
+    """Stage send: xử lý tín hiệu trùng rồi gửi Telegram."""
+    sig = resolve_duplicate_signal(item["signal"])
+    sym = item["symbol"]
+    try:
+        text = format_message(sig)
+        message_id = send_message(text)
+        sig["message_id"] = message_id
+        return sig
+    except Exception as e:
+        print(f"❌ Lỗi khi gửi {sym} tới Telegram: {e}")
+        return None
+
+async def _run_block_async(block_name, symbols):
+    """
+    fetch → indicators → filters → TP → GPT → validation → send, nối bằng hàng đợi có giới hạn:
+    mã nào xong stage trước thì sang stage kế trước, không chờ cả block.
+    """
+    prefetched = {}
+    if BATCH_SCREEN:
+        # sàng lọc cần cả universe cùng lúc: fetch trước toàn block rồi mới vào pipeline
+        print("📥 Fetching market data...")
+        if DERIVE_HTF_FROM_1H:
+            fetched = await fetch_market_data_async(symbols, {"1H": TF_MAP["1H"]}, limit=(CANDLE_LIMIT + 1) * 24)
+            prefetched = {symbol: derive_timeframes(fetched[symbol]["1H"], limit=CANDLE_LIMIT) for symbol in symbols}
+        else:
+            prefetched = await fetch_market_data_async(symbols, TF_MAP, limit=CANDLE_LIMIT)
+        screened = screen(prefetched, FILTERS_CONFIG)
+        for symbol, reasons in screened.rejected().items():
+            print(f"⛔ {symbol}: {reasons[0]}")
+        symbols = screened.passed()
+
+    data_by_symbol = {}
+
+    def filters_stage(item):
+        item = _filter_symbol(item)
+        if item is not None:
+            data_by_symbol[item["symbol"]] = item["enriched"]
+        return item
+
+    openai.api_key = os.getenv("OPENAI_API_KEY")
+    async with openai.AsyncOpenAI() as client:
+        async def gpt_stage(item):
+            sig = await gpt_signal_for(client, item["symbol"], item["enriched"], item["tps"], test_mode=TEST_MODE)
+            if not sig:
+                return None
+            item["signal"] = sig
+            return item
+
+        final_signals, stats = await run_pipeline(
+            [{"symbol": symbol, "raw": prefetched.get(symbol)} for symbol in symbols],
+            [
+                Stage("fetch", _fetch_symbol, PIPELINE_CONCURRENCY["fetch"], blocking=True),
+                Stage("indicators", _enrich_symbol, PIPELINE_CONCURRENCY["indicators"], blocking=True),
+                Stage("filters", filters_stage, PIPELINE_CONCURRENCY["filters"]),
+                Stage("tps", _suggest_tps, PIPELINE_CONCURRENCY["tps"]),
+                Stage("gpt", gpt_stage, PIPELINE_CONCURRENCY["gpt"]),
+                Stage("validate", _validate_signal, PIPELINE_CONCURRENCY["validate"], blocking=True),
+                Stage("send", _send_signal, PIPELINE_CONCURRENCY["send"], blocking=True),
+            ],
+            label=lambda item: item["symbol"],
+        )
+    return final_signals, data_by_symbol, stats
 
 def run_block(block_name):
-    timeout_sent = {}  # Track timeout messages per symbol
     if TEST_MODE:
         print(f"⏳ [TEST MODE] Bỏ qua kiểm tra giờ, luôn chạy block {block_name}")
     else:
@@ -124,249 +514,23 @@ def run_block(block_name):
     print(f"\n📦 Đang xử lý block: {block_name} với {len(symbols)} mã: {symbols}")
 
     try:
-        print("📥 Fetching market data...")
-        data_by_symbol = {}
-        raw_data_by_symbol = {}
-        for symbol in symbols:
-            raw_data = {
-                tf: fetch_coin_data(symbol, interval=TF_MAP[tf]) for tf in TF_MAP
-            }
-            raw_data_by_symbol[symbol] = raw_data
-            enriched = {}
-            candles_map = {}
-            for tf in raw_data:
-                candles = compute_indicators(raw_data[tf])
-                candles_map[tf] = candles
-                trend = classify_trend(candles)
-                signal = detect_candle_signal(candles)
-                enriched[tf] = {
-                    "trend": trend,
-                    "candle_signal": signal,
-                    **candles[-1]
-                }
-            # Gắn động lượng 1H
-            if "1H" in raw_data:
-                try:
-                    candles_1h = compute_indicators(raw_data["1H"])
-                    momo = compute_short_term_momentum(candles_1h)
-                    if isinstance(momo, dict):
-                        enriched.setdefault("1H", {}).update({
-                            "pct_change_1h": momo.get("pct_change_1h"),
-                            "bb_width_ratio": momo.get("bb_width_ratio"),
-                            "atr_spike_ratio": momo.get("atr_spike_ratio"),
-                            "volume_spike_ratio": momo.get("volume_spike_ratio"),
-                        })
-                except Exception as _e:
-                    print(f"⚠️ Không tính được momentum 1H cho {symbol}: {_e}")
-
-
-            # === Soft confirmations & filters for hourly scan ===
-            try:
-                cfg = FILTERS_CONFIG
-
-                # 0) Debounce 1H: yêu cầu nến 1H gần nhất đồng thuận slope
-                ok, why = debounce_1h_ok(candles_map.get("1H", []), bars=cfg.get("debounce_1h_bars", 2))
-                if not ok:
-                    print(f"⛔ {symbol}: debounce_1h -> {why}")
-                    continue
-
-                # 1) Multi-TF alignment (1H vs 4H-soft)
-                candles_fast = candles_map.get("1H", [])
-                candles_slow = candles_map.get("4H", [])
-                ok, why = multi_tf_alignment_ok(candles_fast, candles_slow, cfg)
-                if not ok:
-                    print(f"⛔ {symbol}: multi_tf_alignment -> {why}")
-                    continue
-
-                # 2) RSI regime (dựa snapshot 4H, nếu thiếu spike lấy từ 1H)
-                snap_4h = dict(enriched.get("4H", {}))
-                spikes_1h = {k: enriched.get("1H", {}).get(k) for k in ("atr_spike_ratio","volume_spike_ratio","bb_width_ratio","pct_change_1h")}
-                for k, v in spikes_1h.items():
-                    snap_4h.setdefault(k, v)
-                trend_1d = enriched.get("1D", {}).get("trend", "unknown")
-                ok, why = rsi_regime(snap_4h, trend_1d, cfg)
-                if not ok:
-                    print(f"⛔ {symbol}: rsi_regime -> {why}")
-                    continue
-
-                # 3) Anti-FOMO extension
-                ok, why = anti_fomo_extension(snap_4h, cfg)
-                if not ok:
-                    print(f"⛔ {symbol}: anti_fomo -> {why}")
-                    continue
-
-                # 4) Exhaustion cooldown
-                ok, why = exhaustion_cooldown(snap_4h, cfg)
-                if not ok:
-                    print(f"⛔ {symbol}: exhaustion -> {why}")
-                    continue
-
-                # 5) SFP check (dùng 4H thật nếu có, nếu không soft-4H)
-                candles4h_for_sfp = candles_map.get("4H")
-                if not candles4h_for_sfp:
-                    candles4h_for_sfp = build_soft_htf_from_1h(candles_map.get("1H", []), group=4)
-                ok, why = sfp_check(candles4h_for_sfp or [], cfg)
-                if not ok:
-                    print(f"⛔ {symbol}: sfp -> {why}")
-                    continue
-
-            except Exception as _e:
-                print(f"⚠️ Filters error on {symbol}: {_e}")
-
-            # Siết đồng thuận khung giờ
-            t1h = enriched.get("1H", {}).get("trend", "unknown")
-            t4h = enriched.get("4H", {}).get("trend", "unknown")
-            t1d = enriched.get("1D", {}).get("trend", "unknown")
-            candle4h = enriched.get("4H", {}).get("candle_signal", "none")
-
-            accept = False
-            # Rule chính: 4H phải KHÔNG sideways và đồng hướng với 1D
-            if t4h in ("uptrend", "downtrend") and t1d == t4h:
-                accept = True
-            # Rule phụ: 1D không sideways, 4H không ngược 1D (và 4H không sideways)
-            elif t1d in ("uptrend", "downtrend") and not is_opposite_trend(t4h, t1d) and t4h != "sideways":
-                accept = True
-            else:
-                # Ngoại lệ: 4H có nến tín hiệu mạnh + momentum 1H bùng nổ
-                mmm = {
-                    "pct_change_1h": enriched.get("1H", {}).get("pct_change_1h"),
-                    "bb_width_ratio": enriched.get("1H", {}).get("bb_width_ratio"),
-                    "atr_spike_ratio": enriched.get("1H", {}).get("atr_spike_ratio"),
-                    "volume_spike_ratio": enriched.get("1H", {}).get("volume_spike_ratio"),
-                }
-                if candle4h in ("bullish engulfing", "bearish engulfing") and strong_momentum_flag(mmm, symbol):
-                    accept = True
-
-            if not accept:
-                print(f"⛔ {symbol}: không đạt đồng thuận 4H/1D (t4h={t4h}, t1d={t1d}), bỏ qua.")
-                continue
-
-            data_by_symbol[symbol] = enriched
-
-        suggested_tps_by_symbol = {}
-        for symbol in data_by_symbol:
-            tf_data = data_by_symbol[symbol].get("4H", {})
-            direction = tf_data.get("trend", "sideways")
-            price = tf_data.get("close")
-            sr_levels = tf_data.get("sr_levels", [])
-            atr_val = tf_data.get("atr")
-            if price and direction and sr_levels:
-                suggested = generate_suggested_tps(price, direction, sr_levels, atr_val=atr_val)
-                suggested_tps_by_symbol[symbol] = suggested
-
-        print("📊 Sending to GPT...")
-        signals_dict = asyncio.run(get_gpt_signals(data_by_symbol, suggested_tps_by_symbol, test_mode=TEST_MODE))
-        signals = list(signals_dict.values())
-        print(f"✅ Số tín hiệu hợp lệ sau lọc: {len(signals)}")
-
-        final_signals = []
-        for sig in signals:
-            sym = sig.get("pair") or sig.get("symbol")
-            tf_data = data_by_symbol.get(sym, {}).get("4H", {})
-            raw_4h = raw_data_by_symbol.get(sym, {}).get("4H", [])
-
-            direction = sig.get("direction")
-            current_price = tf_data.get("close")
-            atr_val = tf_data.get("atr")
-            sr_levels = tf_data.get("sr_levels", [])
-
-            if not all([direction, current_price, atr_val]):
-                print(f"⚠️ Thiếu dữ liệu cho {sym} -> BỎ QUA")
-                continue
-
-            entry_1 = safe_float(sig.get("entry_1") or sig.get("entry1"))
-            if entry_1 is None:
-                print(f"⚠️ Thiếu dữ liệu entry hoặc giá hiện tại -> BỎ QUA {sym}")
-                continue
-
-            sig["entry_1"] = entry_1
-
-            if direction.lower() == "long" and entry_1 > current_price * 1.1:
-                print(f"⚠️ Entry LONG quá xa: entry={entry_1}, price={current_price} -> BỎ QUA {sym}")
-                continue
-            elif direction.lower() == "short" and entry_1 < current_price * 0.9:
-                print(f"⚠️ Entry SHORT quá xa: entry={entry_1}, price={current_price} -> BỎ QUA {sym}")
-                continue
-            elif direction.lower() not in ["long", "short"]:
-                print(f"⚠️ Hướng giao dịch không rõ ràng: {direction} -> BỎ QUA {sym}")
-                continue
-
-            stop_loss = safe_float(sig.get("stop_loss") or sig.get("StopLoss") or sig.get("stoploss"))
-            if stop_loss is None:
-                print(f"⚠️ Không có Stop Loss hợp lệ từ GPT cho {sym} -> BỎ QUA")
-                continue
-
-            sig["stop_loss"] = stop_loss
-
-            tps = sig.get("take_profits") or sig.get("take_profit") or sig.get("tp")
-            if isinstance(tps, str):
-                try:
-                    tps = json.loads(tps)
-                except:
-                    try:
-                        tps = [float(x.strip()) for x in tps.strip('[]').split(',') if x.strip()]
-                    except:
-                        print(f"⚠️ Không thể chuyển đổi TP cho {sym}, bỏ qua")
-                        sig["tp"] = []
-                        continue
-
-            if isinstance(tps, list):
-                tps_clean = [safe_float(tp) for tp in tps[:5]]
-                for i, tp_val in enumerate(tps_clean):
-                    sig[f"tp{i+1}"] = tp_val
-                sig["tp"] = tps_clean
-            else:
-                sig["tp"] = []
-
-            tp_list = sig.get("tp", [])
-            tp1 = safe_float(tp_list[0]) if isinstance(tp_list, list) and len(tp_list) > 0 else None
-
-            rr_ratio = abs(entry_1 - stop_loss)
-            if rr_ratio == 0:
-                print(f"⚠️ R:R không hợp lệ với {sym} -> BỎ QUA")
-                continue
-            if tp1:
-                rr_reward = abs(tp1 - entry_1)
-                rr = rr_reward / rr_ratio
-                if rr < 1.2:
-                    print(f"⚠️ R:R quá thấp ({rr:.2f}) cho {sym} | entry: {entry_1}, sl: {stop_loss}, tp1: {tp1}")
-                    continue
-                else:
-                    print(f"✅ R:R = {rr:.2f} cho {sym}")
-            else:
-                print(f"⚠️ Không có TP1 cho {sym} -> BỎ QUA")
-                continue
-
-                        # === ETA (4H-based back-of-the-envelope) ===
-            try:
-                tp_list_vals = [v for v in (sig.get("tp") or []) if v is not None]
-                etas = []
-                for tpv in tp_list_vals[:3]:
-                    eta_h = _estimate_eta_hours(entry_1, tpv, atr_val, tf_hours=4)
-                    etas.append(eta_h)
-
-                def _fmt(x, unit='h'):
-                    return f"{x:.0f}{unit}" if isinstance(x, (int, float)) and x is not None else "—"
-
-                print(f"🕒 ETA: TP1={_fmt(etas[0]) if len(etas)>0 else '—'}, TP2={_fmt(etas[1]) if len(etas)>1 else '—'}, TP3={_fmt(etas[2]) if len(etas)>2 else '—'}")
-
-                if len(etas)>0: sig["eta_tp1_h"] = etas[0]
-                if len(etas)>1: sig["eta_tp2_h"] = etas[1]
-                if len(etas)>2: sig["eta_tp3_h"] = etas[2]
-            except Exception as _e:
-                print(f"⚠️ ETA calc error for {sym}: {_e}")
-
-            sig = resolve_duplicate_signal(sig)
-            try:
-                text = format_message(sig)
-                message_id = send_message(text)
-                sig["message_id"] = message_id
-                final_signals.append(sig)
-            except Exception as e:
-                print(f"❌ Lỗi khi gửi {sym} tới Telegram: {e}")
+        FILTER_CHAIN.reorder()
+        started = time.perf_counter()
+        final_signals, data_by_symbol, stats = asyncio.run(_run_block_async(block_name, symbols))
+        print(f"✅ Số tín hiệu hợp lệ sau lọc: {stats['gpt']['passed']}")
+        print(f"⏱ Pipeline {block_name}: {time.perf_counter() - started:.1f}s | {stats}")
+
+        if USE_SR_STORE:
+            sr_store.save()
+        if HTF_RESULT_CACHE:
+            htf_cache.save()
+            print(f"🧮 HTF cache: {htf_cache.cache_stats()}")
+        FILTER_CHAIN.save()
+        print(f"🧮 Filters ({' → '.join(FILTER_CHAIN.order())}): {FILTER_CHAIN.report()}")
 
         save_signals(final_signals, list(data_by_symbol.keys()), data_by_symbol)
         save_active_signals(final_signals)
+        print(f"🧮 Indicator cache: {cache_stats()}")
 
     except Exception as e:
         print(f"❌ Main error in {block_name}: {e}")
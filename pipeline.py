@@ -0,0 +1,97 @@
+# pipeline.py
+# Pipeline async nhiều stage nối nhau bằng hàng đợi có giới hạn: mỗi item đi sang stage kế
+# ngay khi stage hiện tại xong, mỗi stage có số worker riêng (giới hạn đồng thời), nên thời
+# gian cả lô tiến về đường đi chậm nhất của một item thay vì tổng mọi item.
+#
+#   results, stats = await run_pipeline(items, [
+#       Stage("fetch", fetch_async, concurrency=8),
+#       Stage("compute", compute_sync, concurrency=4, blocking=True),
+#   ])
+#
+# Hàm stage (async hoặc thường) nhận item, trả về item cho stage kế (None = dừng item đó tại
+# đây). Hàm đồng bộ nặng / có I/O (blocking=True) chạy trong thread để không chặn event loop.
+# Lỗi của một item được in ra và chỉ bỏ item đó.
+
+import asyncio
+import inspect
+import os
+import time
+
+PIPELINE_QUEUE_SIZE = int(os.getenv("PIPELINE_QUEUE_SIZE", "8"))
+
+_DONE = object()
+
+class Stage:
+    def __init__(self, name, fn, concurrency=1, blocking=False, queue_size=PIPELINE_QUEUE_SIZE):
+        self.name = name
+        self.fn = fn
+        self.concurrency = max(1, concurrency)
+        self.blocking = blocking
+        self.queue_size = queue_size
+
+    async def call(self, item):
+        if self.blocking:
+            return await asyncio.to_thread(self.fn, item)
+        out = self.fn(item)
+        return await out if inspect.isawaitable(out) else out
+
+class StageStats:
+    __slots__ = ("passed", "dropped", "errors", "seconds")
+
+    def __init__(self):
+        self.passed = self.dropped = self.errors = 0
+        self.seconds = 0.0
+
+    def to_dict(self):
+        return {"passed": self.passed, "dropped": self.dropped, "errors": self.errors,
+                "seconds": round(self.seconds, 3)}
+
+async def run_pipeline(items, stages, label=str):
+    """
+    Chạy `items` qua `stages`; trả về (danh sách item ra khỏi stage cuối, {stage: stats}).
+    Thứ tự kết quả là thứ tự hoàn thành, không phải thứ tự đầu vào.
+    """
+    queues = [asyncio.Queue(maxsize=st.queue_size) for st in stages]
+    stats = {st.name: StageStats() for st in stages}
+    results = []
+    remaining = [st.concurrency for st in stages]   # worker còn chạy của mỗi stage
+
+    async def worker(i):
+        stage, q_in = stages[i], queues[i]
+        q_out = queues[i + 1] if i + 1 < len(stages) else None
+        st = stats[stage.name]
+        while True:
+            item = await q_in.get()
+            if item is _DONE:
+                break
+            start = time.perf_counter()
+            try:
+                out = await stage.call(item)
+            except Exception as e:
+                st.errors += 1
+                print(f"⚠️ Pipeline {stage.name} lỗi với {label(item)}: {e}")
+                out = None
+            st.seconds += time.perf_counter() - start
+            if out is None:
+                st.dropped += 1
+                continue
+            st.passed += 1
+            if q_out is None:
+                results.append(out)
+            else:
+                await q_out.put(out)
+        # worker cuối của stage đóng stage kế
+        remaining[i] -= 1
+        if remaining[i] == 0 and q_out is not None:
+            for _ in range(stages[i + 1].concurrency):
+                await q_out.put(_DONE)
+
+    async def feed():
+        for item in items:
+            await queues[0].put(item)
+        for _ in range(stages[0].concurrency):
+            await queues[0].put(_DONE)
+
+    workers = [asyncio.create_task(worker(i)) for i, st in enumerate(stages) for _ in range(st.concurrency)]
+    await asyncio.gather(feed(), *workers)
+    return results, {name: st.to_dict() for name, st in stats.items()}
@@ -0,0 +1,141 @@
+# resampler.py
+# Dựng nến 4H / 1D từ chuỗi 1H (căn mốc UTC) để không phải fetch riêng từng khung.
+
+import sys
+from datetime import datetime, timezone
+from typing import Dict, List
+
+import numpy as np
+from numpy.lib.stride_tricks import sliding_window_view
+
+from candle_frame import CandleFrame, as_frame
+
+HOUR = 3600
+
+# Khung dẫn xuất từ 1H: số giờ mỗi nến
+HTF_HOURS = {"4H": 4, "1D": 24}
+
+_OHLC = ("open", "close", "high", "low")
+
+def candle_ts(candle: Dict) -> int:
+    """Epoch giây của nến (ưu tiên 'ts', fallback parse 'time' ISO)."""
+    ts = candle.get("ts")
+    if ts is not None:
+        return int(ts)
+    return int(datetime.fromisoformat(candle["time"]).timestamp())
+
+def _aggregate(chunk: List[Dict], bucket_start: int) -> Dict:
+    return {
+        "time": datetime.fromtimestamp(bucket_start, tz=timezone.utc).isoformat(),
+        "open": chunk[0]["open"],
+        "close": chunk[-1]["close"],
+        "high": max(c["high"] for c in chunk),
+        "low": min(c["low"] for c in chunk),
+        "volume": sum(c["volume"] for c in chunk),
+    }
+
+def resample_candles(candles_1h: List[Dict], hours: int = 4, include_partial: bool = True) -> List[Dict]:
+    """
+    Gộp nến 1H thành nến `hours` giờ theo mốc UTC (4H: 0h,4h,8h...; 1D: 0h UTC), giống cách sàn chia nến.
+    - Bucket đầu tiên bị thiếu giờ đầu (cắt giữa chừng bởi cửa sổ fetch) bị bỏ.
+    - Bucket cuối chưa đóng là nến đang chạy: giữ lại nếu include_partial (sàn cũng trả về nến này).
+    """
+    if not candles_1h:
+        return []
+    span = hours * HOUR
+    buckets = []  # [(bucket_start, [nến 1H])]
+    for c in candles_1h:
+        ts = candle_ts(c)
+        b = ts - ts % span
+        if buckets and buckets[-1][0] == b:
+            buckets[-1][1].append(c)
+        else:
+            buckets.append((b, [c]))
+
+    if buckets and candle_ts(buckets[0][1][0]) != buckets[0][0]:
+        buckets = buckets[1:]  # bucket đầu bị cửa sổ fetch cắt mất giờ đầu
+
+    out = []
+    for i, (b, chunk) in enumerate(buckets):
+        is_last = i == len(buckets) - 1
+        if is_last and not include_partial and candle_ts(chunk[-1]) + HOUR < b + span:
+            break
+        out.append(_aggregate(chunk, b))
+    return out
+
+def derive_timeframes(candles_1h: List[Dict], limit: int = 100, tf_hours: Dict = None) -> Dict[str, List[Dict]]:
+    """
+    Trả về {"1H": ..., "4H": ..., "1D": ...} (mỗi khung tối đa `limit` nến) từ một chuỗi 1H.
+    Cần ~limit*24 nến 1H để đủ `limit` nến 1D.
+    """
+    tf_hours = tf_hours or HTF_HOURS
+    out = {"1H": candles_1h[-limit:]}
+    for tf, hours in tf_hours.items():
+        out[tf] = resample_candles(candles_1h, hours)[-limit:]
+    return out
+
+def rolling_ohlc(candles, group: int = 4, limit: int = 60, rolling: bool = True) -> CandleFrame:
+    """
+    Gộp `group` nến liên tiếp thành 1 nến proxy (không căn mốc UTC), trả về CandleFrame
+    (open/close/high/low). Dùng cho 4H mềm trong filters.build_soft_htf_from_1h.
+    - rolling=True : mỗi nến một proxy từ `group` nến gần nhất (cửa sổ chồng nhau)
+    - rolling=False: các cụm `group` nến không chồng nhau, cụm cuối kết thúc ở nến cuối
+    Cửa sổ thiếu open/close hoặc không có high/low hợp lệ nào bị bỏ.
+    """
+    frame = as_frame(candles)
+    n = len(frame)
+    start = max(0, n - limit*group)
+    if n - start < group:
+        return CandleFrame({k: np.empty(0) for k in _OHLC})
+    cols = {}
+    for k in _OHLC:
+        col = frame.get(k)
+        cols[k] = np.full(n - start, np.nan) if col is None else np.asarray(col[start:], dtype=np.float64)
+    step = 1 if rolling else group
+    first = (len(cols["close"]) - group) % step   # cụm cuối luôn kết thúc ở nến cuối
+    highs = sliding_window_view(np.where(np.isnan(cols["high"]), -np.inf, cols["high"]), group)[first::step]
+    lows = sliding_window_view(np.where(np.isnan(cols["low"]), np.inf, cols["low"]), group)[first::step]
+    soft = {
+        "open": cols["open"][first:len(cols["open"]) - group + 1:step],
+        "close": cols["close"][first + group - 1::step],
+        "high": highs.max(axis=1),
+        "low": lows.min(axis=1),
+    }
+    keep = ~np.isnan(soft["open"]) & ~np.isnan(soft["close"]) & ~np.isinf(soft["high"]) & ~np.isinf(soft["low"])
+    return CandleFrame({k: v[keep] for k, v in soft.items()})
+
+def verify_against_exchange(symbol: str, tf: str = "4H", limit: int = 100, rel_tol: float = 1e-6) -> List[str]:
+    """
+    So nến dẫn xuất với nến sàn trả về cho cùng khung (chỉ nến đã đóng).
+    Trả về danh sách sai lệch (rỗng = khớp).
+    """
+    from kucoin_api import fetch_coin_data
+    interval = {"4H": "4hour", "1D": "1day"}[tf]
+    hours = HTF_HOURS[tf]
+    candles_1h = fetch_coin_data(symbol, interval="1hour", limit=(limit + 1) * hours)
+    derived = {c["time"]: c for c in resample_candles(candles_1h, hours, include_partial=False)}
+    exchange = fetch_coin_data(symbol, interval=interval, limit=limit)[:-1]  # bỏ nến đang chạy
+
+    def close_enough(a, b):
+        return abs(a - b) <= rel_tol * max(abs(a), abs(b), 1e-12)
+
+    mismatches = []
+    for bar in exchange:
+        mine = derived.get(bar["time"])
+        if mine is None:
+            continue
+        for key in ("open", "high", "low", "close", "volume"):
+            if not close_enough(mine[key], bar[key]):
+                mismatches.append(f"{bar['time']} {key}: derived={mine[key]} exchange={bar[key]}")
+    return mismatches
+
+if __name__ == "__main__":
+    sym = sys.argv[1] if len(sys.argv) > 1 else "BTC/USDT"
+    for tf in HTF_HOURS:
+        diffs = verify_against_exchange(sym, tf)
+        if diffs:
+            print(f"❌ {sym} {tf}: {len(diffs)} sai lệch")
+            for d in diffs[:20]:
+                print("   ", d)
+        else:
+            print(f"✅ {sym} {tf}: nến dẫn xuất khớp với sàn")
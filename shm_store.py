@@ -0,0 +1,144 @@
+# shm_store.py
+# Kho nến dùng chung giữa các process (main / signal_tracker / track_runner) qua
+# multiprocessing.shared_memory: một process ghi, nhiều process đọc, không fetch trùng,
+# không giữ nhiều bản sao cùng một chuỗi nến trong RAM.
+#
+# Mỗi (symbol, interval) một segment: header int64 [seq, count, capacity, head, updated_ms]
+# + 6 cột vòng (ts, open, close, high, low, volume), mỗi cột `capacity` phần tử 8 byte.
+# seq lẻ = đang ghi (seqlock): reader đọc lại nếu seq đổi trong lúc copy.
+
+import os
+import time
+from multiprocessing import shared_memory, resource_tracker
+
+import numpy as np
+
+SHM_PREFIX = os.getenv("CANDLE_SHM_PREFIX", "altmap")
+SHM_CAPACITY = int(os.getenv("CANDLE_SHM_CAPACITY", "3000"))
+
+COLUMNS = ("ts", "open", "close", "high", "low", "volume")
+_HEADER = 5
+_SEQ, _COUNT, _CAP, _HEAD, _UPDATED = range(_HEADER)
+
+_segments = {}   # name -> SharedMemory đã attach trong process này
+
+def _name(symbol, interval):
+    return f"{SHM_PREFIX}_{symbol.replace('/', '-')}_{interval}"
+
+def _attach(name, create=False, capacity=SHM_CAPACITY):
+    shm = _segments.get(name)
+    if shm is not None:
+        return shm
+    try:
+        shm = shared_memory.SharedMemory(name=name)
+    except FileNotFoundError:
+        if not create:
+            return None
+        size = 8 * (_HEADER + len(COLUMNS) * capacity)
+        shm = shared_memory.SharedMemory(name=name, create=True, size=size)
+        header = np.ndarray((_HEADER,), dtype=np.int64, buffer=shm.buf)
+        header[:] = 0
+        header[_CAP] = capacity
+    # Segment phải sống lâu hơn process tạo/đọc nó (main.py chạy theo từng block):
+    # không để resource_tracker tự unlink khi process thoát. Dọn bằng unlink_all().
+    try:
+        resource_tracker.unregister(shm._name, "shared_memory")
+    except Exception:
+        pass
+    _segments[name] = shm
+    return shm
+
+def _views(shm):
+    header = np.ndarray((_HEADER,), dtype=np.int64, buffer=shm.buf)
+    cap = int(header[_CAP])
+    cols = {}
+    for i, col in enumerate(COLUMNS):
+        dtype = np.int64 if col == "ts" else np.float64
+        cols[col] = np.ndarray((cap,), dtype=dtype, buffer=shm.buf, offset=8 * (_HEADER + i * cap))
+    return header, cols
+
+def _begin(header):
+    header[_SEQ] += 1   # lẻ: đang ghi
+
+def _end(header):
+    header[_UPDATED] = int(time.time() * 1000)
+    header[_SEQ] += 1   # chẵn: ổn định
+
+def publish(symbol, interval, arrays):
+    """Writer: thay toàn bộ chuỗi bằng `arrays` (giữ `capacity` nến cuối)."""
+    shm = _attach(_name(symbol, interval), create=True)
+    header, cols = _views(shm)
+    cap = int(header[_CAP])
+    n = min(len(arrays["ts"]), cap)
+    _begin(header)
+    if n:
+        for col in COLUMNS:
+            cols[col][:n] = arrays[col][-n:]
+    header[_HEAD] = n % cap
+    header[_COUNT] = n
+    _end(header)
+
+def upsert(symbol, interval, row):
+    """Writer: cập nhật nến đang chạy (cùng ts) hoặc nối nến mới, O(1)."""
+    shm = _attach(_name(symbol, interval), create=True)
+    header, cols = _views(shm)
+    cap, count, head = int(header[_CAP]), int(header[_COUNT]), int(header[_HEAD])
+    last = (head - 1) % cap
+    _begin(header)
+    if count and cols["ts"][last] == row[0]:
+        pos = last
+    elif count and row[0] < cols["ts"][last]:
+        _end(header)
+        return  # nến cũ hơn đuôi: bỏ qua
+    else:
+        pos = head
+        header[_HEAD] = (head + 1) % cap
+        header[_COUNT] = min(count + 1, cap)
+    for i, col in enumerate(COLUMNS):
+        cols[col][pos] = row[i]
+    _end(header)
+
+def read(symbol, interval, limit=None, max_age=None):
+    """
+    Reader: trả về dict cột (copy của `limit` nến cuối) hoặc None nếu chưa có / quá cũ / không đủ nến.
+    """
+    shm = _attach(_name(symbol, interval))
+    if shm is None:
+        return None
+    header, cols = _views(shm)
+    for _ in range(100):
+        seq = int(header[_SEQ])
+        if seq % 2:
+            time.sleep(0.0005)
+            continue
+        cap, count, head = int(header[_CAP]), int(header[_COUNT]), int(header[_HEAD])
+        updated = int(header[_UPDATED])
+        n = count if limit is None else limit
+        if count == 0 or n > count:
+            return None
+        if max_age is not None and time.time() - updated / 1000.0 > max_age:
+            return None
+        idx = (np.arange(head - n, head)) % cap
+        out = {col: cols[col][idx] for col in COLUMNS}   # fancy index -> copy
+        if int(header[_SEQ]) == seq:
+            return out
+    return None
+
+def unlink_all(symbols, intervals):
+    """Xoá các segment (khi dừng hệ thống)."""
+    for symbol in symbols:
+        for interval in intervals:
+            name = _name(symbol, interval)
+            shm = _segments.pop(name, None)
+            if shm is None:
+                try:
+                    shm = shared_memory.SharedMemory(name=name)
+                except FileNotFoundError:
+                    continue
+            else:
+                resource_tracker.register(shm._name, "shared_memory")  # unlink() sẽ tự unregister
+            shm.close()
+            try:
+                shm.unlink()
+            except FileNotFoundError:
+                pass
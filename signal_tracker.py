@@ -10,9 +10,10 @@ def should_notify_timeout(signal):
     return not signal.get('timeout_notified', False)
 
 from datetime import datetime, timedelta, timezone
-from kucoin_api import fetch_realtime_price
+from kucoin_api import fetch_realtime_price, fetch_prices
 from telegram_bot import send_message
-from indicators import classify_trend, compute_indicators
+from indicators import classify_trend
+from indicator_cache import cached_indicators
 from kucoin_api import fetch_coin_data
 
 ACTIVE_FILE = "active_signals.json"
@@ -113,6 +114,11 @@ def check_signals():
     updated_signals = []
     now = datetime.now(timezone.utc)
 
+    # Giá từ kline stream / shm; chỉ cặp nguồn local không có mới cần 1 request allTickers,
+    # lỗi thì fallback level1 từng cặp
+    open_pairs = {s.get("pair") for s in active_signals if s.get("pair") and s.get("status", "open") == "open"}
+    prices = fetch_prices(sorted(open_pairs))
+
     for signal in active_signals:
         try:
             pair = signal.get("pair")
@@ -125,7 +131,9 @@ def check_signals():
                 updated_signals.append(signal)
                 continue
 
-            price = fetch_realtime_price(pair)
+            price = prices.get(pair)
+            if price is None:
+                price = fetch_realtime_price(pair)
             direction = (signal.get("direction") or "").lower()
             entry_1 = signal.get("entry_1")
             entry_2 = signal.get("entry_2")
@@ -144,10 +152,11 @@ def check_signals():
                 updated_signals.append(signal)
                 continue
 
-            # Kiểm tra đảo chiều xu hướng (4H)
+            # Kiểm tra đảo chiều xu hướng (4H): chỉ đọc close / MA20 / MA50 nên frame lười
+            # chỉ tính 2 đường MA, không RSI / BB / ATR / S/R
             try:
-                raw_candles = fetch_coin_data(pair, interval="4hour")
-                enriched = compute_indicators(raw_candles)
+                raw_candles = fetch_coin_data(pair, interval="4hour", as_arrays=True)
+                enriched = cached_indicators(pair, "4hour", raw_candles)
                 new_trend = classify_trend(enriched)
                 if (direction == "long" and new_trend == "downtrend") or (direction == "short" and new_trend == "uptrend"):
                     signal["status"] = "reversed"
@@ -0,0 +1,247 @@
+# sr_store.py
+# Kho mức hỗ trợ / kháng cự lâu dài theo (symbol, interval): pivot được xác nhận dần khi
+# nến đóng (đủ `window` nến mỗi bên, cùng điều kiện với detect_support_resistance), gộp với
+# mức cũ cùng loại trong ngưỡng tol ~ ATR, độ mạnh suy giảm theo thời gian (half-life) và
+# mức quá yếu bị bỏ. Giữ qua các lần chạy trong sr_levels.json, nên S/R lịch sử sâu không tốn
+# gì lúc quét: mỗi lần chỉ xử lý các nến mới đóng, phục vụ sr_levels trong O(số mức).
+#
+# Series mới được gieo từ candle_archive (lịch sử do backfill.py tải về) trước khi nhận nến
+# của lượt quét; khung 4H / 1D chưa có trong archive thì dựng từ archive 1H (chỉ bucket đủ giờ).
+
+import os
+import json
+import fcntl
+import threading
+from collections import deque
+from datetime import datetime
+
+import numpy as np
+
+import candle_archive
+import indicator_backends
+from candle_frame import as_frame
+
+SR_STORE_FILE = os.getenv("SR_STORE_FILE", "sr_levels.json")
+SR_WINDOW = int(os.getenv("SR_WINDOW", "20"))
+SR_TOL_ATR_MUL = float(os.getenv("SR_TOL_ATR_MUL", "0.6"))
+SR_HALF_LIFE_BARS = float(os.getenv("SR_HALF_LIFE_BARS", "300"))   # độ mạnh giảm một nửa sau N nến
+SR_MIN_STRENGTH = float(os.getenv("SR_MIN_STRENGTH", "0.25"))      # dưới ngưỡng thì bỏ mức
+SR_MAX_LEVELS = int(os.getenv("SR_MAX_LEVELS", "40"))              # mỗi loại
+SR_SEED_FROM_ARCHIVE = os.getenv("SR_SEED_FROM_ARCHIVE", "1") == "1"
+
+# Khung dựng được từ archive 1H khi archive chưa có khung đó: số giờ mỗi nến
+_HOURS_FROM_1H = {"4hour": 4, "1day": 24}
+
+def _bar_ts(frame):
+    if "ts" in frame.columns:
+        return frame["ts"].astype(np.int64)
+    return np.array([int(datetime.fromisoformat(t).timestamp()) for t in frame["time"]], dtype=np.int64)
+
+def _tol_from_atr(atr):
+    """Ngưỡng gộp mức = SR_TOL_ATR_MUL × ATR trung bình gần đây (None nếu không có ATR)."""
+    if atr is None:
+        return None
+    hist = atr[-(SR_WINDOW * 2 + 50):]
+    hist = hist[~np.isnan(hist)]
+    if len(hist) and hist.mean() > 0:
+        return SR_TOL_ATR_MUL * float(hist.mean())
+    return None
+
+def _resample_from_1h(arrays, hours):
+    """Cột 1H (ts tăng dần) -> cột `hours` giờ căn mốc UTC, chỉ giữ bucket đủ `hours` nến."""
+    ts = arrays["ts"]
+    if not len(ts):
+        return arrays
+    span = hours * 3600
+    buckets, starts, counts = np.unique(ts - ts % span, return_index=True, return_counts=True)
+    full = counts == hours
+    ends = starts + counts - 1
+    return {
+        "ts": buckets[full],
+        "high": np.maximum.reduceat(arrays["high"], starts)[full],
+        "low": np.minimum.reduceat(arrays["low"], starts)[full],
+        "close": arrays["close"][ends][full],
+    }
+
+def _archive_history(symbol, interval, end_ts, root=None):
+    """Nến đã lưu trong candle_archive với ts <= end_ts (dựng từ 1H nếu cần); None nếu không có."""
+    arrays = candle_archive.load(symbol, interval, end_ts=end_ts, root=root)
+    if not len(arrays["ts"]) and interval in _HOURS_FROM_1H:
+        hours = _HOURS_FROM_1H[interval]
+        hourly = candle_archive.load(symbol, "1hour", end_ts=end_ts + hours * 3600 - 1, root=root)
+        arrays = _resample_from_1h({k: np.asarray(hourly[k]) for k in ("ts", "high", "low", "close")}, hours)
+        keep = arrays["ts"] <= end_ts
+        arrays = {k: v[keep] for k, v in arrays.items()}
+    if not len(arrays["ts"]):
+        return None
+    return {k: np.array(arrays[k]) for k in ("ts", "high", "low", "close")}
+
+class SeriesLevels:
+    """Trạng thái của một (symbol, interval): hàng đợi nến chờ xác nhận pivot + danh sách mức."""
+
+    def __init__(self, window=SR_WINDOW):
+        self.window = window
+        self.last_ts = None          # nến đã đóng cuối cùng đã xử lý
+        self.step = None             # giây mỗi nến
+        self.pending = deque(maxlen=2 * window + 1)   # (ts, high, low) các nến đóng gần nhất
+        self.levels = []             # {"price", "type", "ts", "touches", "strength", "as_of"}
+
+    # --- độ mạnh ---
+    def _decayed(self, lvl, now_ts):
+        if not self.step or now_ts is None:
+            return lvl["strength"]
+        bars = max(0.0, (now_ts - lvl["as_of"]) / self.step)
+        return lvl["strength"] * 0.5 ** (bars / SR_HALF_LIFE_BARS)
+
+    def _too_close(self, p, q, tol):
+        if tol:
+            return abs(p - q) < tol
+        return abs(p - q) / ((p + q) / 2.0) < 0.005
+
+    def _add_pivot(self, ts, price, typ, tol):
+        best = None
+        for lvl in self.levels:
+            if lvl["type"] == typ and self._too_close(price, lvl["price"], tol):
+                if best is None or abs(lvl["price"] - price) < abs(best["price"] - price):
+                    best = lvl
+        if best is None:
+            self.levels.append({"price": price, "type": typ, "ts": ts, "touches": 1, "strength": 1.0, "as_of": ts})
+            return
+        best["strength"] = self._decayed(best, ts) + 1.0
+        best["as_of"] = ts
+        best["price"] = (best["price"] + price) / 2.0
+        best["ts"] = ts
+        best["touches"] += 1
+
+    def _prune(self, now_ts):
+        keep = []
+        for typ in ("support", "resistance"):
+            same = [l for l in self.levels if l["type"] == typ and self._decayed(l, now_ts) >= SR_MIN_STRENGTH]
+            same.sort(key=lambda l: self._decayed(l, now_ts), reverse=True)
+            keep.extend(same[:SR_MAX_LEVELS])
+        self.levels = keep
+
+    def update(self, ts, highs, lows, tol):
+        """Đưa các nến đã đóng (tăng dần theo ts) vào; xác nhận pivot ở tâm hàng đợi."""
+        w = self.window
+        new = ts > self.last_ts if self.last_ts is not None else np.ones(len(ts), dtype=bool)
+        if not new.any():
+            return
+        first = int(np.argmax(new))
+        if len(ts) > 1:
+            self.step = int(np.median(np.diff(ts)))
+        if self.last_ts is not None and self.step and ts[first] - self.last_ts > self.step:
+            self.pending.clear()   # hụt nến: không xác nhận pivot qua khoảng trống
+        for t, h, l in zip(ts[first:].tolist(), highs[first:].tolist(), lows[first:].tolist()):
+            self.pending.append((t, h, l))
+            if len(self.pending) == 2 * w + 1:
+                c_ts, c_h, c_l = self.pending[w]
+                others = [self.pending[k] for k in range(2 * w + 1) if k != w]
+                if c_h >= max(o[1] for o in others[:w]) and c_h >= max(o[1] for o in others[w:]):
+                    self._add_pivot(c_ts, c_h, "resistance", tol)
+                if c_l <= min(o[2] for o in others[:w]) and c_l <= min(o[2] for o in others[w:]):
+                    self._add_pivot(c_ts, c_l, "support", tol)
+        self.last_ts = int(ts[-1])
+        self._prune(self.last_ts)
+
+    def sr_levels(self, last_ts, n):
+        """Định dạng của detect_support_resistance: [(idx, price, type)], idx theo chuỗi hiện tại (âm = cũ hơn)."""
+        out = []
+        for lvl in sorted(self.levels, key=lambda l: l["price"]):
+            idx = n - 1 - int(round((last_ts - lvl["ts"]) / self.step)) if self.step else 0
+            out.append((idx, lvl["price"], lvl["type"]))
+        return out
+
+    def to_dict(self):
+        return {"window": self.window, "last_ts": self.last_ts, "step": self.step,
+                "pending": list(self.pending), "levels": self.levels}
+
+    @classmethod
+    def from_dict(cls, d):
+        obj = cls(d.get("window", SR_WINDOW))
+        obj.last_ts, obj.step = d.get("last_ts"), d.get("step")
+        obj.pending.extend(tuple(p) for p in d.get("pending", []))
+        obj.levels = d.get("levels", [])
+        return obj
+
+class SRStore:
+    def __init__(self, path=SR_STORE_FILE, archive_root=None, seed=SR_SEED_FROM_ARCHIVE):
+        self.path = path
+        self.archive_root = archive_root
+        self.seed = seed
+        self._series = None
+        self._dirty = set()
+        self._lock = threading.Lock()
+
+    def _load_file(self):
+        try:
+            with open(self.path, "r") as f:
+                return json.load(f)
+        except (FileNotFoundError, json.JSONDecodeError):
+            return {}
+
+    def _get(self, key):
+        if self._series is None:
+            self._series = {k: SeriesLevels.from_dict(v) for k, v in self._load_file().items()}
+        if key not in self._series:
+            self._series[key] = SeriesLevels()
+        return self._series[key]
+
+    def levels_for(self, symbol, interval, candles, running_last=True):
+        """
+        Cập nhật store bằng các nến đã đóng của `candles` (nến cuối coi là đang chạy, trừ khi
+        running_last=False: chuỗi chỉ gồm nến đã đóng) rồi trả về sr_levels cho chuỗi này.
+        """
+        frame = as_frame(candles)
+        if len(frame) < (2 if running_last else 1):
+            return []
+        key = f"{symbol}|{interval}"
+        ts = _bar_ts(frame)
+        tol = _tol_from_atr(frame.get("atr"))
+        with self._lock:
+            series = self._get(key)
+            closed = slice(None, -1) if running_last else slice(None)
+            if series.last_ts is None and self.seed:
+                self._seed(series, symbol, interval, int(ts[0]) - 1)
+            series.update(ts[closed], frame["high"][closed], frame["low"][closed], tol)
+            self._dirty.add(key)
+            return series.sr_levels(int(ts[-1]), len(frame))
+
+    def _seed(self, series, symbol, interval, end_ts):
+        """Đưa lịch sử trong candle_archive trước nến đầu của chuỗi hiện tại vào series mới."""
+        try:
+            hist = _archive_history(symbol, interval, end_ts, self.archive_root)
+        except OSError as e:
+            print(f"⚠️ Không đọc được candle_archive cho S/R {symbol} {interval}: {e}")
+            return
+        if hist is None:
+            return
+        tol = _tol_from_atr(indicator_backends.active().atr(hist["high"], hist["low"], hist["close"]))
+        series.update(hist["ts"], hist["high"], hist["low"], tol)
+
+    def save(self):
+        """Ghi các series đã đổi; gộp với file hiện có dưới khoá để các block chạy song song không ghi đè nhau."""
+        with self._lock:
+            if not self._dirty:
+                return
+            with open(self.path + ".lock", "a") as lock_file:
+                fcntl.flock(lock_file, fcntl.LOCK_EX)
+                try:
+                    data = self._load_file()
+                    for key in self._dirty:
+                        data[key] = self._series[key].to_dict()
+                    tmp = self.path + ".tmp"
+                    with open(tmp, "w") as f:
+                        json.dump(data, f)
+                    os.replace(tmp, self.path)
+                finally:
+                    fcntl.flock(lock_file, fcntl.LOCK_UN)
+            self._dirty.clear()
+
+_store = SRStore()
+
+def levels_for(symbol, interval, candles, running_last=True):
+    return _store.levels_for(symbol, interval, candles, running_last)
+
+def save():
+    _store.save()
@@ -0,0 +1,118 @@
+import json
+import types
+
+import numpy as np
+import pytest
+
+import backfill
+import candle_archive
+import kucoin_api
+
+STEP = 3600
+NOW = 1_700_000_000 - 1_700_000_000 % STEP + 1800   # giữa một nến 1 giờ đang chạy
+MAX_CANDLES = 11                                     # trang nhỏ để có nhiều trang
+
+def _bar(ts):
+    base = 100.0 + (ts // STEP) % 97
+    return [ts, base, base + 0.5, base + 1.0, base - 1.0, 10.0 + (ts // STEP) % 7]
+
+class FakeExchange:
+    """Giả /market/candles: nến trong [startAt, endAt), mới nhất trước, tối đa MAX_CANDLES nến/trang."""
+
+    def __init__(self, listed_at):
+        self.listed_at = listed_at
+        self.calls = []
+
+    def __call__(self, endpoint, path, params, label=""):
+        assert endpoint == "candles" and path == "/api/v1/market/candles"
+        self.calls.append(params)
+        start, end = params["startAt"], params["endAt"]
+        first = max(start, self.listed_at)
+        first += -first % STEP
+        last_open = NOW - NOW % STEP
+        ts = [t for t in range(first, min(end, last_open + STEP), STEP)][-MAX_CANDLES:]
+        return [[str(v) for v in _bar(t)] + ["0"] for t in reversed(ts)]
+
+def _expected(start, end):
+    rows = [_bar(t) for t in range(start, end + 1, STEP)]
+    return kucoin_api.arrays_from_rows(rows)
+
+@pytest.fixture
+def exchange(monkeypatch, tmp_path):
+    ex = FakeExchange(listed_at=NOW - 30 * 86400)
+    monkeypatch.setattr(kucoin_api, "_kucoin_get", ex)
+    monkeypatch.setattr(kucoin_api, "KUCOIN_MAX_CANDLES", MAX_CANDLES)
+    monkeypatch.setattr(backfill, "KUCOIN_MAX_CANDLES", MAX_CANDLES)
+    monkeypatch.setattr(backfill, "STATE_FILE", str(tmp_path / "state.json"))
+    monkeypatch.setattr(backfill, "time", types.SimpleNamespace(time=lambda: NOW))
+    monkeypatch.setattr(candle_archive, "ARCHIVE_DIR", str(tmp_path / "archive"))
+    return ex
+
+def _archive(symbol="ETH/USDT"):
+    return {k: np.array(v) for k, v in candle_archive.load(symbol, "1hour").items()}
+
+def _assert_same(got, want):
+    np.testing.assert_array_equal(got["ts"], want["ts"])
+    for col in ("open", "close", "high", "low", "volume"):
+        np.testing.assert_allclose(got[col], want[col])
+
+def test_fetch_candle_range_pages_backwards_without_overlap(exchange):
+    end = NOW - NOW % STEP
+    start = end - 35 * STEP
+    out = kucoin_api.fetch_candle_range("ETH/USDT", "1hour", start, end)
+
+    _assert_same(out, _expected(start, end - STEP))
+    assert len(exchange.calls) == 4
+    assert exchange.calls[0]["endAt"] == end and exchange.calls[-1]["startAt"] == start
+    for newer, older in zip(exchange.calls, exchange.calls[1:]):
+        assert older["endAt"] == newer["startAt"]            # trang liền nhau, không chồng
+    for call in exchange.calls:
+        assert call["endAt"] - call["startAt"] <= (MAX_CANDLES - 1) * STEP
+        assert call["symbol"] == "ETH-USDT" and call["type"] == "1hour"
+
+def test_fetch_candle_range_stops_at_listing(exchange):
+    exchange.listed_at = NOW - NOW % STEP - 15 * STEP
+    out = kucoin_api.fetch_candle_range("ETH/USDT", "1hour", exchange.listed_at - 100 * STEP, NOW)
+
+    assert out["ts"][0] == exchange.listed_at
+    assert len(exchange.calls) == 2                          # trang thứ hai thiếu nến cũ -> dừng
+
+def test_backfill_fills_empty_archive(exchange):
+    backfill.backfill(["ETH/USDT"], "1hour", days=2, workers=4)
+
+    start = NOW - 2 * 86400
+    got = _archive()
+    _assert_same(got, _expected(start - start % (10 * STEP), NOW - NOW % STEP))
+    assert np.all(np.diff(got["ts"]) == STEP)
+
+def test_backfill_dedups_against_archive_and_fills_gap(exchange):
+    start = NOW - 2 * 86400
+    head = _expected(start - start % (10 * STEP), start + 10 * STEP)
+    tail = _expected(NOW - NOW % STEP - 12 * STEP, NOW - NOW % STEP)
+    stale = dict(tail, close=tail["close"] - 50.0)         # nến cũ trong archive, sàn có giá mới
+    candle_archive.append("ETH/USDT", "1hour", head)
+    candle_archive.append("ETH/USDT", "1hour", stale)
+    assert np.any(np.diff(_archive()["ts"]) > STEP)          # có lỗ giữa head và tail
+
+    backfill.backfill(["ETH/USDT"], "1hour", days=2, workers=4)
+
+    got = _archive()
+    _assert_same(got, _expected(head["ts"][0], NOW - NOW % STEP))
+    assert len(np.unique(got["ts"])) == len(got["ts"])
+    assert np.all(np.diff(got["ts"]) == STEP)
+
+def test_backfill_resume_only_refetches_unfinished_chunks(exchange):
+    backfill.backfill(["ETH/USDT"], "1hour", days=2, workers=4)
+    first_calls = len(exchange.calls)
+
+    with open(backfill.STATE_FILE) as f:
+        state = json.load(f)
+    chunks = backfill.plan_chunks(NOW - 2 * 86400, NOW, "1hour")
+    done = {tuple(c) for c in state["ETH-USDT_1hour"]}
+    assert done == {c for c in chunks if c[1] < NOW - STEP}   # trang chứa nến đang chạy chưa xong
+
+    exchange.calls.clear()
+    backfill.backfill(["ETH/USDT"], "1hour", days=2, workers=4)
+    assert 0 < len(exchange.calls) < first_calls
+    assert all(c["startAt"] >= chunks[-1][0] for c in exchange.calls)
+    _assert_same(_archive(), _expected(chunks[0][0], NOW - NOW % STEP))
@@ -0,0 +1,106 @@
+from datetime import datetime, timedelta, timezone
+
+import numpy as np
+import pytest
+
+from batch_screen import screen
+from filters import FILTERS_CONFIG
+from resampler import derive_timeframes
+
+def _import_main():
+    try:
+        import main
+    except SyntaxError as e:   # telegram_bot.py dùng f-string lồng nháy (Python >= 3.12)
+        pytest.skip(f"main.py không import được trên Python này: {e}")
+    return main
+
+def _hourly(seed, hours, end, pump=0.0, last_volume=1.0):
+    """Chuỗi 1H kết thúc ở `end` (nến cuối đang chạy); `pump` đẩy giá 48 nến cuối."""
+    rng = np.random.default_rng(seed)
+    rets = rng.normal(0, 0.01, hours)
+    rets[-48:] += pump
+    close = 100 * np.cumprod(1 + rets)
+    open_ = np.concatenate([[100.0], close[:-1]])
+    wick = np.abs(rng.normal(0, 0.004, hours))
+    volume = rng.uniform(50, 150, hours)
+    volume[-1] *= last_volume
+    if last_volume > 1:
+        wick[-1] = 0.05          # nến cuối giãn biên độ mạnh -> spike ATR
+    start = end - timedelta(hours=hours - 1)
+    return [{
+        "time": (start + timedelta(hours=i)).isoformat(),
+        "open": float(open_[i]), "close": float(close[i]),
+        "high": float(max(open_[i], close[i]) * (1 + wick[i])),
+        "low": float(min(open_[i], close[i]) * (1 - wick[i])),
+        "volume": float(volume[i]),
+    } for i in range(hours)]
+
+def _universe(end):
+    uni = {}
+    for k in range(24):
+        hours = 101 * 24 if k % 3 else 60 * 24     # hai độ dài chuỗi -> hai nhóm trong stack
+        pump = (0.0, 0.004, 0.008, -0.006)[k % 4]
+        spike = 6.0 if k % 5 == 0 else 1.0
+        uni[f"C{k}/USDT"] = derive_timeframes(_hourly(k, hours, end, pump, spike), limit=100)
+    return uni
+
+def _per_symbol(main, universe):
+    """Đường từng mã của run_block: _enrich_symbol -> _filter_context -> 3 filter snapshot."""
+    out = {}
+    for symbol, raw in universe.items():
+        item = main._enrich_symbol({"symbol": symbol, "raw": raw})
+        ctx = main._filter_context(symbol, item["candles_map"], item["enriched"], item["htf"])
+        failed = [name for name, fn in (("rsi_regime", main._rsi_regime_filter),
+                                        ("anti_fomo", main._anti_fomo_filter),
+                                        ("exhaustion", main._exhaustion_filter)) if not fn(ctx)[0]]
+        out[symbol] = (failed, item["enriched"])
+    return out
+
+# 13:00 UTC: nến 4H 12:00 và nến 1D đang chạy; 23:00 UTC: nến cuối 1H đóng đúng lúc hết ngày
+@pytest.mark.parametrize("end", [datetime(2024, 3, 5, 13, tzinfo=timezone.utc),
+                                 datetime(2024, 3, 5, 23, tzinfo=timezone.utc)])
+def test_batch_matches_per_symbol_path(monkeypatch, end):
+    main = _import_main()
+    monkeypatch.setattr(main, "HTF_RESULT_CACHE", False)
+    monkeypatch.setattr(main, "USE_SR_STORE", False)
+    universe = _universe(end)
+    expected = _per_symbol(main, universe)
+    result = screen(universe, FILTERS_CONFIG)
+
+    assert result.passed() == [s for s, (failed, _) in expected.items() if not failed]
+    for symbol, why in result.rejected().items():
+        assert [w.split(" -> ")[0] for w in why] == expected[symbol][0]
+    # fixture phải chạm tới cả 3 filter để phép so có nghĩa
+    assert result.passed()
+    assert {w.split(" -> ")[0] for why in result.rejected().values() for w in why} == {
+        "rsi_regime", "anti_fomo", "exhaustion"}
+
+    for symbol, (_, enriched) in expected.items():
+        for tf in ("1H", "4H", "1D"):
+            snap = result.snapshot(symbol, tf)
+            assert snap["trend"] == enriched[tf]["trend"]
+            for key in ("close", "rsi", "ma20", "ma50", "atr", "bb_upper"):
+                assert snap[key] == pytest.approx(enriched[tf][key], rel=1e-9, nan_ok=True), (symbol, tf, key)
+        for key in ("atr_spike_ratio", "volume_spike_ratio", "bb_width_ratio", "pct_change_1h"):
+            assert result.snapshot(symbol, "1H")[key] == enriched["1H"][key]
+
+def test_both_paths_read_the_running_bar():
+    end = datetime(2024, 3, 5, 13, tzinfo=timezone.utc)
+    universe = _universe(end)
+    result = screen(universe, FILTERS_CONFIG)
+    for symbol, raw in universe.items():
+        # nến cuối 4H / 1D là nến đang chạy (12:00 và ngày 05/03), không phải nến đã đóng trước nó
+        assert raw["4H"][-1]["time"] == "2024-03-05T12:00:00+00:00"
+        assert raw["1D"][-1]["time"] == "2024-03-05T00:00:00+00:00"
+        for tf in ("4H", "1D"):
+            assert result.snapshot(symbol, tf)["close"] == raw[tf][-1]["close"] == raw["1H"][-1]["close"]
+
+def test_closed_bar_input_is_screened_on_the_closed_bar():
+    # truyền chuỗi đã bỏ nến đang chạy thì batch dùng nến đóng cuối, như _htf_layer (HTF_RESULT_CACHE=1)
+    end = datetime(2024, 3, 5, 13, tzinfo=timezone.utc)
+    universe = _universe(end)
+    closed = {s: {tf: c[:-1] if tf != "1H" else c for tf, c in raw.items()} for s, raw in universe.items()}
+    result = screen(closed, FILTERS_CONFIG)
+    for symbol, raw in universe.items():
+        assert result.snapshot(symbol, "4H")["close"] == raw["4H"][-2]["close"]
+        assert result.snapshot(symbol, "1D")["close"] == raw["1D"][-2]["close"]
@@ -0,0 +1,42 @@
+import os
+
+import numpy as np
+
+import candle_archive
+
+def _bars(start, count):
+    ts = np.arange(start, start + count, dtype=np.int64) * 3600
+    px = np.arange(start, start + count, dtype=np.float64)
+    return {"ts": ts, "open": px, "close": px + 0.5, "high": px + 1, "low": px - 1, "volume": px * 10}
+
+def test_append_overwrites_running_bar_and_extends(tmp_path):
+    root = str(tmp_path)
+    candle_archive.append("BTC-USDT", "1hour", _bars(0, 5), root=root)
+    update = _bars(4, 3)
+    update["close"][0] = 99.0
+    candle_archive.append("BTC-USDT", "1hour", update, root=root)
+    got = candle_archive.load("BTC-USDT", "1hour", root=root)
+    assert list(got["ts"]) == list(np.arange(7) * 3600)
+    assert got["close"][4] == 99.0
+    assert candle_archive.last_ts("BTC-USDT", "1hour", root=root) == 6 * 3600
+
+def test_append_drops_leftover_of_interrupted_append(tmp_path):
+    root = str(tmp_path)
+    candle_archive.append("ETH-USDT", "1hour", _bars(0, 5), root=root)
+    dirpath = candle_archive._series_dir("ETH-USDT", "1hour", root)
+    # lần append trước bị ngắt: chỉ cột open kịp ghi thêm 2 nến
+    with open(candle_archive._col_path(dirpath, "open"), "ab") as f:
+        f.write(np.array([123.0, 456.0]).tobytes())
+    candle_archive.append("ETH-USDT", "1hour", _bars(5, 1), root=root)
+    got = candle_archive.load("ETH-USDT", "1hour", root=root)
+    assert len(got["ts"]) == 6
+    assert got["open"][5] == 5.0
+    assert os.path.getsize(candle_archive._col_path(dirpath, "open")) == 6 * 8
+
+def test_backfill_older_bars_rewrites_series(tmp_path):
+    root = str(tmp_path)
+    candle_archive.append("SOL-USDT", "1hour", _bars(5, 5), root=root)
+    candle_archive.append("SOL-USDT", "1hour", _bars(0, 6), root=root)
+    got = candle_archive.load("SOL-USDT", "1hour", start_ts=2 * 3600, end_ts=7 * 3600, root=root)
+    assert list(got["ts"]) == list(np.arange(2, 8) * 3600)
+    assert candle_archive.load("ADA-USDT", "1hour", root=root)["ts"].size == 0
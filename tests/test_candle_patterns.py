@@ -0,0 +1,80 @@
+import numpy as np
+import pytest
+
+import candle_patterns as cp
+
+def _scan(rows):
+    """rows: [(open, high, low, close)] -> bitmask nến cuối."""
+    o, h, l, c = (np.array(col, dtype=np.float64) for col in zip(*rows))
+    return int(cp.scan_arrays(o, h, l, c)[-1])
+
+FLAT = (100.0, 100.5, 99.5, 100.2)   # nến nền không khớp mẫu nào nổi bật
+
+@pytest.mark.parametrize("bit, rows", [
+    (cp.BULLISH_ENGULFING, [FLAT, (102, 102.5, 100.5, 101), (100.8, 103.5, 100.5, 103)]),
+    (cp.BEARISH_ENGULFING, [FLAT, (100, 101.5, 99.5, 101), (101.2, 101.5, 98.5, 99)]),
+    (cp.DOJI, [FLAT, (100, 102, 98, 100.1)]),
+    (cp.HAMMER, [FLAT, (100, 100.6, 96, 100.5)]),
+    (cp.SHOOTING_STAR, [FLAT, (100.5, 104, 99.9, 100)]),
+    (cp.INSIDE_BAR, [(100, 105, 95, 102), (101, 103, 97, 102)]),
+    (cp.OUTSIDE_BAR, [(100, 101, 99, 100.5), (100.2, 102, 98, 101.8)]),
+    (cp.BULLISH_MARUBOZU, [FLAT, (100, 105.1, 99.95, 105)]),
+    (cp.BEARISH_MARUBOZU, [FLAT, (105, 105.05, 99.9, 100)]),
+    (cp.MORNING_STAR, [(110, 110.5, 99.5, 100), (99.5, 100.5, 98.5, 99.8), (100, 107, 99.5, 106.5)]),
+    (cp.EVENING_STAR, [(100, 110.5, 99.5, 110), (110.5, 111.5, 109.5, 110.2), (110, 110.5, 103, 103.5)]),
+])
+def test_each_pattern_on_hand_built_rows(bit, rows):
+    assert _scan(rows) & bit, cp.names(_scan(rows))
+
+def test_patterns_need_previous_bars():
+    # nến đầu chuỗi không có nến trước: mẫu 2-3 nến không được khớp
+    mask = cp.scan_arrays([100.0], [101.0], [95.0], [100.5])
+    assert not mask[0] & (cp.BULLISH_ENGULFING | cp.INSIDE_BAR | cp.OUTSIDE_BAR | cp.MORNING_STAR)
+    assert cp.scan([]).shape == (0,)
+
+def test_names_and_signal_priority():
+    both = cp.BULLISH_ENGULFING | cp.DOJI | cp.OUTSIDE_BAR
+    assert cp.names(both) == ["bullish engulfing", "doji", "outside bar"]
+    assert cp.signal(both) == "bullish engulfing"
+    assert cp.signal(cp.DOJI | cp.HAMMER) == "doji"
+    assert cp.signal(cp.HAMMER) == "none"
+
+def _baseline_detect_candle_signal(candles):
+    # main.detect_candle_signal bản list-of-dict gốc
+    if len(candles) < 2:
+        return "none"
+    c1 = candles[-2]
+    c2 = candles[-1]
+    if c1["close"] < c1["open"] and c2["close"] > c2["open"] and c2["close"] > c1["open"]:
+        return "bullish engulfing"
+    elif c1["close"] > c1["open"] and c2["close"] < c2["open"] and c2["close"] < c1["open"]:
+        return "bearish engulfing"
+    elif abs(c2["close"] - c2["open"]) < (c2["high"] - c2["low"]) * 0.1:
+        return "doji"
+    return "none"
+
+def test_signal_of_last_bar_matches_baseline_detect_candle_signal():
+    rng = np.random.default_rng(3)
+    seen = set()
+    for _ in range(3000):
+        n = int(rng.integers(1, 5))
+        o = np.round(100 + rng.normal(0, 2, n), 1)   # làm tròn để có thân bằng 0 / giá trùng
+        c = np.round(o + rng.normal(0, 2, n), 1)
+        h = np.maximum(o, c) + np.round(np.abs(rng.normal(0, 1, n)), 1)
+        l = np.minimum(o, c) - np.round(np.abs(rng.normal(0, 1, n)), 1)
+        rows = [{"open": o[i], "high": h[i], "low": l[i], "close": c[i]} for i in range(n)]
+        want = _baseline_detect_candle_signal(rows)
+        got = cp.signal(cp.scan(rows)[-1]) if n >= 2 else "none"
+        assert got == want, rows
+        seen.add(want)
+    assert seen == {"bullish engulfing", "bearish engulfing", "doji", "none"}
+
+def test_2d_scan_matches_rows():
+    rng = np.random.default_rng(5)
+    o = 100 + rng.normal(0, 2, (6, 40))
+    c = o + rng.normal(0, 2, (6, 40))
+    h = np.maximum(o, c) + np.abs(rng.normal(0, 1, (6, 40)))
+    l = np.minimum(o, c) - np.abs(rng.normal(0, 1, (6, 40)))
+    batch = cp.scan_arrays(o, h, l, c)
+    for i in range(6):
+        np.testing.assert_array_equal(batch[i], cp.scan_arrays(o[i], h[i], l[i], c[i]))
@@ -0,0 +1,34 @@
+from filter_chain import Filter, FilterChain
+
+def _boom(ctx):
+    raise ValueError("boom")
+
+def _reject(ctx):
+    return False, "nope"
+
+def _accept(ctx):
+    return True, "ok"
+
+def test_failing_filter_passes_by_default():
+    chain = FilterChain([("soft", _boom), ("gate", _accept)], stats_file=None, adaptive=False)
+    assert chain.run({"symbol": "BTC-USDT"}) == (True, None, None)
+    assert chain.stats()["soft"]["errors"] == 1
+
+def test_fail_closed_filter_rejects_on_error():
+    chain = FilterChain([("soft", _accept), Filter("gate", _boom, fail_closed=True)], stats_file=None, adaptive=False)
+    ok, name, why = chain.run({"symbol": "BTC-USDT"})
+    assert (ok, name) == (False, "gate")
+    assert "boom" in why
+    stats = chain.stats()["gate"]
+    assert stats["errors"] == 1 and stats["rejections"] == 1
+
+def test_reorder_keeps_fail_policy(monkeypatch):
+    import filter_chain
+    monkeypatch.setattr(filter_chain, "FILTER_MIN_SAMPLES", 1)
+    chain = FilterChain([Filter("gate", _boom, fail_closed=True), ("cheap", _reject)], stats_file=None)
+    chain.run({"symbol": "X"})
+    chain.run({"symbol": "X"})
+    chain._stats["cheap"].record(0.0, True)
+    chain.reorder()
+    assert chain.order() == ["cheap", "gate"]
+    assert chain._order[1].fail_closed
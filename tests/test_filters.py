@@ -0,0 +1,39 @@
+import random
+
+from filters import breakout_retest_ok
+
+def _baseline_retest(candles, zone, n):
+    # vòng retest của bản list-of-dict gốc
+    lo, hi = zone
+    for c in candles[-n:]:
+        if c.get("low") is None or c.get("high") is None or c.get("close") is None or c.get("open") is None:
+            continue
+        if c["low"] <= hi and c["low"] >= lo and c["close"] > c["open"]:
+            return True, "bull_retest"
+        if c["high"] >= lo and c["high"] <= hi and c["close"] < c["open"]:
+            return True, "bear_retest"
+    return False, "no_retest"
+
+def _candle(o, h, l, c):
+    return {"open": o, "high": h, "low": l, "close": c, "volume": 1.0}
+
+CFG = {"enable_breakout_retest": "on", "retest_max_candles": 3}
+
+def test_bar_with_missing_low_is_skipped():
+    # high chạm vùng + nến đỏ -> bear_retest nếu không bỏ nến thiếu low
+    candles = [_candle(100, 101, 99, 100.5)] * 5 + [_candle(105, 104.5, None, 103)]
+    assert breakout_retest_ok(candles, (104, 106), CFG) == (False, "no_retest")
+
+def test_matches_baseline_with_missing_values():
+    rng = random.Random(7)
+    for _ in range(2000):
+        candles = []
+        for _ in range(rng.randint(1, 6)):
+            o = rng.uniform(95, 105)
+            c = rng.uniform(95, 105)
+            bar = _candle(o, max(o, c) + rng.uniform(0, 3), min(o, c) - rng.uniform(0, 3), c)
+            if rng.random() < 0.3:
+                bar[rng.choice(("open", "high", "low", "close"))] = None
+            candles.append(bar)
+        zone = (rng.uniform(95, 102), rng.uniform(102, 108))
+        assert breakout_retest_ok(candles, zone, CFG) == _baseline_retest(candles, zone, 3)
@@ -0,0 +1,54 @@
+import numpy as np
+
+from htf_cache import HTFCache
+
+def _bars(n, last_close=None):
+    px = 100.0 + np.arange(n, dtype=np.float64)
+    close = px + 0.5
+    if last_close is not None:
+        close[-1] = last_close
+    return {"ts": np.arange(n) * 14400, "open": px, "close": close,
+            "high": px + 1, "low": px - 1, "volume": np.ones(n)}
+
+def _compute(calls):
+    def compute(closed):
+        calls.append(len(closed))
+        return {"last_close": closed.last("close"), "bars": len(closed)}
+    return compute
+
+def test_hit_while_running_bar_moves_then_miss_on_next_close(tmp_path):
+    cache = HTFCache(str(tmp_path / "htf.json"))
+    calls = []
+    first = cache.results_for("BTC-USDT", "4hour", _bars(50), _compute(calls))
+    assert first == {"last_close": 148.5, "bars": 49}   # bỏ nến đang chạy
+
+    # nến đang chạy đổi giá: vẫn cùng nến đóng cuối -> hit, không tính lại
+    again = cache.results_for("BTC-USDT", "4hour", _bars(50, last_close=200.0), _compute(calls))
+    assert again == first and calls == [49]
+
+    # nến mới đóng (chuỗi dài thêm 1): key đổi -> tính lại trên nến vừa đóng
+    after_close = cache.results_for("BTC-USDT", "4hour", _bars(51), _compute(calls))
+    assert after_close == {"last_close": 149.5, "bars": 50}
+    assert calls == [49, 50]
+    assert cache.stats() == {"hits": 1, "misses": 2, "hit_rate": 0.333}
+
+def test_extra_params_and_symbol_are_part_of_the_key(tmp_path):
+    cache = HTFCache(str(tmp_path / "htf.json"))
+    calls = []
+    cache.results_for("BTC-USDT", "4hour", _bars(30), _compute(calls), extra=(20,))
+    cache.results_for("BTC-USDT", "4hour", _bars(30), _compute(calls), extra=(14,))
+    cache.results_for("ETH-USDT", "4hour", _bars(30), _compute(calls), extra=(14,))
+    assert len(calls) == 3
+
+def test_saved_entries_survive_a_new_process(tmp_path):
+    path = str(tmp_path / "htf.json")
+    calls = []
+    writer = HTFCache(path)
+    writer.results_for("BTC-USDT", "1day", _bars(40), _compute(calls))
+    writer.save()
+
+    reader = HTFCache(path)
+    reader.results_for("BTC-USDT", "1day", _bars(40, last_close=1.0), _compute(calls))
+    assert calls == [39] and reader.stats()["hits"] == 1
+    reader.results_for("BTC-USDT", "1day", _bars(41), _compute(calls))
+    assert calls == [39, 40]
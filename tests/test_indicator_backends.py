@@ -0,0 +1,73 @@
+import numpy as np
+import pytest
+
+import indicator_backends
+from indicator_backends import NumpyBackend, ReferenceBackend
+
+def _series():
+    rng = np.random.default_rng(0)
+    cases = {}
+    for n in (13, 14, 15, 19, 20, 21, 49, 50, 51, 300):
+        cases[f"random_{n}"] = 100 * np.cumprod(1 + rng.normal(0, 0.02, n))
+    cases["empty"] = np.empty(0)
+    cases["one_bar"] = np.array([42.0])
+    cases["shorter_than_period"] = 100 * np.cumprod(1 + rng.normal(0, 0.02, 8))
+    cases["constant"] = np.full(120, 42.0)
+    cases["monotonic_up"] = np.linspace(1.0, 2.0, 120)
+    cases["monotonic_down"] = np.linspace(2.0, 1.0, 120)
+    cases["micro_price"] = 1e-8 * (1 + np.abs(rng.normal(0, 0.05, 200)))
+    cases["large_price"] = 6e4 * np.cumprod(1 + rng.normal(0, 0.001, 200))
+    cases["rounded_ties"] = np.round(100 * np.cumprod(1 + rng.normal(0, 0.01, 200)))
+    with_nan = 100 * np.cumprod(1 + rng.normal(0, 0.02, 120))
+    with_nan[[5, 60, 61]] = np.nan
+    cases["nan_inside"] = with_nan
+    return cases
+
+CASES = _series()
+
+def _hl(close, seed=1):
+    rng = np.random.default_rng(seed)
+    return (close * (1 + np.abs(rng.normal(0, 0.01, close.shape))),
+            close * (1 - np.abs(rng.normal(0, 0.01, close.shape))))
+
+def _assert_same(got, want):
+    got, want = np.asarray(got), np.asarray(want)
+    assert got.shape == want.shape
+    np.testing.assert_array_equal(np.isnan(got), np.isnan(want))
+    np.testing.assert_allclose(got, want, rtol=1e-12, atol=0.0, equal_nan=True)
+
+def _check(backend, close):
+    ref = ReferenceBackend
+    high, low = _hl(close)
+    _assert_same(backend.sma(close, 20), ref.sma(close, 20))
+    _assert_same(backend.sma(close, 50), ref.sma(close, 50))
+    for got, want in zip(backend.bollinger(close, 20), ref.bollinger(close, 20)):
+        _assert_same(got, want)
+    _assert_same(backend.rsi(close), ref.rsi(close))
+    _assert_same(backend.atr(high, low, close), ref.atr(high, low, close))
+
+def _check_2d(backend):
+    rng = np.random.default_rng(2)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.02, (16, 250)), axis=1)
+    high, low = close * 1.01, close * 0.99
+    ref = ReferenceBackend
+    _assert_same(backend.rsi(close), ref.rsi(close))
+    _assert_same(backend.atr(high, low, close), ref.atr(high, low, close))
+    _assert_same(backend.bollinger(close)[1], ref.bollinger(close)[1])
+    _assert_same(backend.sma(close, 20), ref.sma(close, 20))
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_numpy_matches_reference(case):
+    _check(NumpyBackend, CASES[case])
+
+def test_numpy_matches_reference_2d():
+    _check_2d(NumpyBackend)
+
+@pytest.mark.parametrize("case", sorted(CASES))
+def test_numba_matches_reference(case):
+    pytest.importorskip("numba")
+    _check(indicator_backends.NumbaBackend, CASES[case])
+
+def test_numba_matches_reference_2d():
+    pytest.importorskip("numba")
+    _check_2d(indicator_backends.NumbaBackend)
@@ -0,0 +1,33 @@
+import numpy as np
+
+from indicator_cache import IndicatorCache
+
+def _bars(n=30):
+    ts = 1704067200 + np.arange(n) * 14400
+    px = 100.0 + np.arange(n)
+    return ts, px
+
+def test_dict_rows_and_columns_share_one_entry():
+    from datetime import datetime, timezone
+    ts, px = _bars()
+    rows = [
+        {"time": datetime.fromtimestamp(int(t), tz=timezone.utc).isoformat(),
+         "open": p, "high": p + 1, "low": p - 1, "close": p + 0.5, "volume": 10.0}
+        for t, p in zip(ts, px)
+    ]
+    cols = {"ts": ts, "open": px, "high": px + 1, "low": px - 1, "close": px + 0.5, "volume": np.full(len(px), 10.0)}
+    cache = IndicatorCache(maxsize=4)
+    first = cache.get("BTC-USDT", "4H", rows)
+    second = cache.get("BTC-USDT", "4hour", cols)
+    assert second is first
+    assert cache.stats()["hits"] == 1 and cache.stats()["misses"] == 1
+
+def test_running_bar_change_recomputes():
+    ts, px = _bars()
+    cols = {"ts": ts, "open": px, "high": px + 1, "low": px - 1, "close": px + 0.5, "volume": np.full(len(px), 10.0)}
+    cache = IndicatorCache(maxsize=4)
+    cache.get("ETH-USDT", "1hour", cols)
+    moved = dict(cols, close=cols["close"].copy())
+    moved["close"][-1] += 1.0
+    cache.get("ETH-USDT", "1hour", moved)
+    assert cache.stats()["misses"] == 2
@@ -0,0 +1,16 @@
+import numpy as np
+
+from indicators import compute_indicators
+
+def _frame(n=80):
+    px = 100 + np.cumsum(np.random.default_rng(0).normal(0, 1, n))
+    return compute_indicators({"ts": np.arange(n) * 3600, "open": px, "close": px + 0.2,
+                               "high": px + 1, "low": px - 1, "volume": np.ones(n)})
+
+def test_patterns_column_stays_out_of_snapshots():
+    frame = _frame()
+    assert frame.get("patterns") is not None
+    assert "patterns" not in frame[-1]
+    assert "patterns" not in frame[-10:][-1]
+    assert all("patterns" not in row for row in frame[-3:].to_dicts())
+    assert {"rsi", "ma20", "atr", "sr_levels"} <= set(frame[-1])
@@ -0,0 +1,95 @@
+import json
+
+import numpy as np
+import pytest
+
+from indicator_state import IndicatorState, load_states, save_states
+from indicators import compute_indicators
+
+KEYS = ("rsi", "ma20", "ma50", "bb_lower", "bb_mid", "bb_upper", "atr")
+
+def _rows(n, seed=0, start_ts=0):
+    rng = np.random.default_rng(seed)
+    close = 100 * np.cumprod(1 + rng.normal(0, 0.02, n))
+    open_ = np.concatenate([[100.0], close[:-1]])
+    high = np.maximum(open_, close) * (1 + np.abs(rng.normal(0, 0.01, n)))
+    low = np.minimum(open_, close) * (1 - np.abs(rng.normal(0, 0.01, n)))
+    vol = rng.uniform(1, 10, n)
+    return [[start_ts + i * 3600, open_[i], close[i], high[i], low[i], vol[i]] for i in range(n)]
+
+def _batch(rows):
+    cols = np.array(rows, dtype=np.float64)
+    frame = compute_indicators({"ts": cols[:, 0].astype(np.int64), "open": cols[:, 1], "close": cols[:, 2],
+                                "high": cols[:, 3], "low": cols[:, 4], "volume": cols[:, 5]})
+    return {k: frame[-1][k] for k in KEYS}
+
+def _assert_matches(state, rows):
+    got, want = state.values(), _batch(rows)
+    for key in KEYS:
+        if want[key] is None:
+            assert got[key] is None, key
+        else:
+            assert got[key] == pytest.approx(want[key], rel=1e-9, abs=1e-9), key
+
+@pytest.mark.parametrize("n", [1, 2, 13, 14, 15, 19, 20, 21, 49, 50, 51, 300])
+def test_from_rows_matches_compute_indicators(n):
+    rows = _rows(n, seed=n)
+    _assert_matches(IndicatorState.from_rows(rows), rows)
+
+def test_constant_prices():
+    rows = [[i * 3600, 5.0, 5.0, 5.0, 5.0, 1.0] for i in range(80)]
+    _assert_matches(IndicatorState.from_rows(rows), rows)
+
+def test_replace_last_tracks_the_running_bar():
+    rows = _rows(120, seed=1)
+    state = IndicatorState.from_rows(rows)
+    rng = np.random.default_rng(2)
+    for _ in range(10):
+        running = list(rows[-1])
+        running[2] = running[2] * (1 + rng.normal(0, 0.01))
+        running[3] = max(running[3], running[2])
+        running[4] = min(running[4], running[2])
+        rows[-1] = running
+        state.upsert(running)
+        _assert_matches(state, rows)
+    # nến mới sau chuỗi thay đổi nến đang chạy
+    nxt = _rows(1, seed=3, start_ts=rows[-1][0] + 3600)[0]
+    rows.append(nxt)
+    state.upsert(nxt)
+    _assert_matches(state, rows)
+
+def test_older_rows_are_ignored():
+    rows = _rows(60, seed=4)
+    state = IndicatorState.from_rows(rows)
+    before = state.values()
+    stale = list(rows[-5])
+    stale[2] *= 2
+    state.upsert(stale)
+    assert state.values() == before
+
+def test_to_dict_round_trip_then_continue():
+    rows = _rows(200, seed=5)
+    state = IndicatorState.from_rows(rows[:150])
+    restored = IndicatorState.from_dict(json.loads(json.dumps(state.to_dict())))
+    assert restored.values() == state.values()
+    # state khôi phục vẫn replace_last / update đúng như state gốc
+    running = list(rows[149])
+    running[2] *= 1.01
+    rows[149] = running
+    for st in (state, restored):
+        st.upsert(running)
+        for row in rows[150:]:
+            st.upsert(row)
+    assert restored.values() == state.values()
+    _assert_matches(restored, rows)
+
+def test_save_and_load_states(tmp_path):
+    path = str(tmp_path / "state.json")
+    states = {("BTC/USDT", "1hour"): IndicatorState.from_rows(_rows(80, seed=6)),
+              ("ETH/USDT", "4hour"): IndicatorState.from_rows(_rows(30, seed=7))}
+    save_states(states, path)
+    loaded = load_states(path)
+    assert set(loaded) == set(states)
+    for key, st in states.items():
+        assert loaded[key].values() == st.values()
+    assert load_states(str(tmp_path / "missing.json")) == {}
@@ -0,0 +1,108 @@
+# Stream kline chạy với FakeKucoinServer: đồng bộ ban đầu, push trong lúc backfill,
+# reconnect + resubscribe và lấp khoảng trống bằng REST sau khi mất kết nối.
+
+import asyncio
+import time
+
+import kline_stream
+from kline_stream import FakeKucoinServer, KlineStream
+from kucoin_api import INTERVAL_SECONDS, arrays_from_rows
+
+SYMBOL, INTERVAL = "BTC/USDT", "1hour"
+STEP = INTERVAL_SECONDS[INTERVAL]
+
+class FakeRest:
+    """REST giả: trả các nến trong `bars` thuộc [start, end]; ghi lại từng lần gọi."""
+
+    def __init__(self, bars, delay=0.0):
+        self.bars = bars
+        self.delay = delay
+        self.calls = []
+
+    def __call__(self, symbol, interval, start_at, end_at):
+        self.calls.append((symbol, interval, start_at, end_at))
+        time.sleep(self.delay)
+        return arrays_from_rows([list(b) for b in self.bars if start_at <= b[0] <= end_at])
+
+def _bar(ts, close):
+    return [ts, close, close, close + 1, close - 1, 10.0]
+
+async def _wait(cond, timeout=5.0):
+    deadline = time.monotonic() + timeout
+    while not cond():
+        assert time.monotonic() < deadline, "timeout"
+        await asyncio.sleep(0.01)
+
+def _rows(stream):
+    return list(stream.buffers[(SYMBOL, INTERVAL)].rows)
+
+def test_reconnect_resubscribe_and_gap_backfill():
+    async def scenario():
+        t_last = int(time.time()) // STEP * STEP
+        rest = FakeRest([_bar(t_last - k * STEP, 100.0 + k) for k in range(10, 2, -1)])
+        server = await FakeKucoinServer().start()
+        stream = KlineStream([SYMBOL], [INTERVAL], ring_size=50, ws_url=server.url,
+                             rest_fetch=rest, track_indicators=False)
+        task = asyncio.create_task(stream.run())
+        try:
+            await _wait(lambda: stream.synced)
+            assert server.subscribes == 1
+            assert _rows(stream)[-1][0] == t_last - 3 * STEP
+
+            # nến mới qua WebSocket
+            await server.publish(SYMBOL, INTERVAL, _bar(t_last - 2 * STEP, 50.0))
+            await _wait(lambda: _rows(stream)[-1][0] == t_last - 2 * STEP)
+
+            # 2 nến đóng trong lúc mất kết nối: chỉ REST có
+            rest.bars += [_bar(t_last - STEP, 60.0), _bar(t_last, 61.0)]
+            calls_before = len(rest.calls)
+            await server.drop_all()
+            await _wait(lambda: stream.reconnects >= 1 and stream.synced)
+
+            assert server.subscribes == 2   # đã subscribe lại sau reconnect
+            assert any(kline_stream._topic(SYMBOL, INTERVAL) in t for t in server.clients.values())
+            gap_call = rest.calls[calls_before]
+            assert gap_call[2] == t_last - 2 * STEP   # lấp từ nến cuối đã có
+            assert [r[0] for r in _rows(stream)[-3:]] == [t_last - 2 * STEP, t_last - STEP, t_last]
+            assert stream.get_price(SYMBOL) == 61.0
+        finally:
+            stream.stop()
+            task.cancel()
+            await server.stop()
+
+    asyncio.run(scenario())
+
+def test_pings_and_pushes_during_slow_backfill():
+    async def scenario():
+        t_last = int(time.time()) // STEP * STEP
+        rest = FakeRest([_bar(t_last - STEP, 100.0)], delay=0.5)
+        server = await FakeKucoinServer().start()
+        stream = KlineStream([SYMBOL], [INTERVAL], ring_size=50, ws_url=server.url,
+                             rest_fetch=rest, track_indicators=False, ping_ms=50)
+        task = asyncio.create_task(stream.run())
+        try:
+            await _wait(lambda: server.subscribes == 1)
+            # push tới khi REST còn đang chạy: phải được giữ lại rồi áp sau backfill
+            await server.publish(SYMBOL, INTERVAL, _bar(t_last, 77.0))
+            assert not stream.synced
+            await _wait(lambda: stream.synced)
+            assert server.pings >= 3          # ping chạy ngay từ đầu, không chờ backfill
+            assert stream.reconnects == 0
+            assert [r[0] for r in _rows(stream)] == [t_last - STEP, t_last]
+            assert stream.get_price(SYMBOL) == 77.0
+        finally:
+            stream.stop()
+            task.cancel()
+            await server.stop()
+
+    asyncio.run(scenario())
+
+def test_backfill_fetches_buffers_concurrently(monkeypatch):
+    monkeypatch.setattr(kline_stream, "BACKFILL_CONCURRENCY", 8)
+    rest = FakeRest([], delay=0.2)
+    stream = KlineStream([f"C{i}/USDT" for i in range(8)], [INTERVAL], ring_size=10,
+                         rest_fetch=rest, track_indicators=False)
+    started = time.monotonic()
+    asyncio.run(stream._backfill())
+    assert len(rest.calls) == 8
+    assert time.monotonic() - started < 0.2 * 8 / 2
@@ -0,0 +1,130 @@
+import json
+import threading
+
+import pytest
+
+import kucoin_api
+
+class FakeResponse:
+    def __init__(self, status=200, body=None, text=None):
+        self.status_code = status
+        self.content = (json.dumps(body) if text is None else text).encode()
+        self.text = self.content.decode()
+        self.headers = {}
+
+class FakeSession:
+    def __init__(self, responses):
+        self.responses = list(responses)
+        self.calls = 0
+
+    def get(self, url, params=None, timeout=None):
+        self.calls += 1
+        return self.responses.pop(0)
+
+OK = FakeResponse(body={"code": "200000", "data": [1, 2, 3]})
+
+@pytest.fixture
+def session(monkeypatch):
+    holder = {}
+    monkeypatch.setattr(kucoin_api, "_get_session", lambda: holder["session"])
+    monkeypatch.setattr(kucoin_api, "_backoff_delay", lambda attempt: 0.0)
+    monkeypatch.setattr(kucoin_api, "_breaker", kucoin_api._CircuitBreaker(threshold=5, cooldown=30))
+    monkeypatch.setattr(kucoin_api, "KUCOIN_MAX_RETRIES", 4)
+
+    def install(*responses):
+        holder["session"] = FakeSession(responses)
+        return holder["session"]
+    return install
+
+def test_body_throttle_code_is_retried(session):
+    fake = session(FakeResponse(body={"code": "429000", "msg": "Too Many Requests"}), OK)
+    assert kucoin_api._kucoin_get("candles", "/x", {}) == [1, 2, 3]
+    assert fake.calls == 2
+    assert kucoin_api._breaker.failures == 0
+
+def test_transient_body_code_and_bad_json_are_retried(session):
+    fake = session(
+        FakeResponse(body={"code": "500000", "msg": "Internal Server Error"}),
+        FakeResponse(text="<html>bad gateway</html>"),
+        OK,
+    )
+    assert kucoin_api._kucoin_get("candles", "/x", {}) == [1, 2, 3]
+    assert fake.calls == 3
+
+def test_request_error_raises_without_retry(session):
+    fake = session(FakeResponse(body={"code": "900001", "msg": "Symbol not exists"}), OK)
+    with pytest.raises(Exception, match="900001"):
+        kucoin_api._kucoin_get("candles", "/x", {})
+    assert fake.calls == 1
+    assert kucoin_api._breaker.failures == 0
+
+def test_gives_up_after_max_retries(session):
+    fake = session(*[FakeResponse(body={"code": "500000"})] * 4)
+    with pytest.raises(Exception, match="sau 4 lần thử"):
+        kucoin_api._kucoin_get("candles", "/x", {})
+    assert fake.calls == 4
+
+def test_half_open_allows_one_trial(monkeypatch):
+    clock = [100.0]
+    monkeypatch.setattr(kucoin_api.time, "monotonic", lambda: clock[0])
+    breaker = kucoin_api._CircuitBreaker(threshold=2, cooldown=10)
+    breaker.record_failure()
+    breaker.record_failure()
+    with pytest.raises(Exception, match="circuit open"):
+        breaker.check()
+
+    clock[0] += 11
+    breaker.check()          # luồng này được thử
+    breaker.check()          # retry của chính luồng thử vẫn đi được
+    blocked = []
+
+    def other():
+        try:
+            breaker.check()
+        except Exception as e:
+            blocked.append(str(e))
+    t = threading.Thread(target=other)
+    t.start()
+    t.join()
+    assert blocked and "half-open" in blocked[0]
+
+    breaker.record_failure()  # lượt thử lỗi -> mở lại ngay
+    with pytest.raises(Exception, match="circuit open"):
+        breaker.check()
+
+    clock[0] += 11
+    breaker.check()
+    breaker.record_success()
+    t = threading.Thread(target=other)
+    blocked.clear()
+    t.start()
+    t.join()
+    assert not blocked
+
+class FakeLiveSource:
+    def __init__(self, prices):
+        self.prices = prices
+
+    def get_price(self, symbol):
+        return self.prices.get(symbol)
+
+def test_fetch_prices_skips_all_tickers_when_stream_has_every_pair(monkeypatch):
+    monkeypatch.setattr(kucoin_api, "_live_source", FakeLiveSource({"BTC/USDT": 65000.0, "ETH/USDT": 3000.0}))
+    calls = []
+    monkeypatch.setattr(kucoin_api, "fetch_all_prices", lambda: calls.append(1) or {})
+    assert kucoin_api.fetch_prices(["BTC/USDT", "ETH/USDT"]) == {"BTC/USDT": 65000.0, "ETH/USDT": 3000.0}
+    assert calls == []
+
+def test_fetch_prices_uses_all_tickers_only_for_missing_pairs(monkeypatch):
+    monkeypatch.setattr(kucoin_api, "_live_source", FakeLiveSource({"BTC/USDT": 65000.0}))
+    monkeypatch.setattr(kucoin_api, "fetch_all_prices", lambda: {"BTC/USDT": 1.0, "SOL/USDT": 150.0})
+    assert kucoin_api.fetch_prices(["BTC/USDT", "SOL/USDT", "XYZ/USDT"]) == {"BTC/USDT": 65000.0, "SOL/USDT": 150.0}
+
+def test_fetch_prices_reads_shm_when_no_stream(monkeypatch):
+    monkeypatch.setattr(kucoin_api, "_live_source", None)
+    monkeypatch.setattr(kucoin_api, "USE_CANDLE_SHM", True)
+    monkeypatch.setattr(kucoin_api, "CANDLE_SHM_WRITER", False)
+    monkeypatch.setattr(kucoin_api.shm_store, "read",
+                        lambda symbol, interval, limit, max_age=None: {"close": [42.0]} if symbol == "BTC/USDT" else None)
+    monkeypatch.setattr(kucoin_api, "fetch_all_prices", lambda: {"ETH/USDT": 3000.0})
+    assert kucoin_api.fetch_prices(["BTC/USDT", "ETH/USDT"]) == {"BTC/USDT": 42.0, "ETH/USDT": 3000.0}
@@ -0,0 +1,158 @@
+import asyncio
+import time
+
+import pytest
+
+from pipeline import Stage, run_pipeline
+
+def _run(coro, timeout=5.0):
+    return asyncio.run(asyncio.wait_for(coro, timeout))
+
+def test_items_visit_stages_in_order_and_fifo_with_single_workers():
+    log = []
+
+    def stage(name):
+        async def fn(item):
+            await asyncio.sleep(0)
+            log.append((item, name))
+            return item
+        return fn
+
+    results, stats = _run(run_pipeline(range(10), [Stage("a", stage("a")), Stage("b", stage("b")), Stage("c", stage("c"))]))
+    assert results == list(range(10))
+    for item in range(10):
+        assert [name for i, name in log if i == item] == ["a", "b", "c"]
+    assert stats["c"]["passed"] == 10
+
+def test_results_come_out_in_completion_order():
+    delays = {0: 0.15, 1: 0.05, 2: 0.10}
+
+    async def slow(item):
+        await asyncio.sleep(delays[item])
+        return item
+
+    results, _ = _run(run_pipeline([0, 1, 2], [Stage("slow", slow, concurrency=3)]))
+    assert results == [1, 2, 0]
+
+def test_bounded_queues_hold_back_fast_stages():
+    pulled = []
+    done = []
+    lead = []
+
+    def source():
+        for i in range(40):
+            pulled.append(i)
+            lead.append(len(pulled) - len(done))
+            yield i
+
+    def fast(item):
+        return item
+
+    async def slow(item):
+        await asyncio.sleep(0.005)
+        done.append(item)
+        return item
+
+    q = 2
+    stages = [Stage("fast", fast, concurrency=2, queue_size=q), Stage("slow", slow, concurrency=1, queue_size=q)]
+    results, _ = _run(run_pipeline(source(), stages))
+    assert sorted(results) == list(range(40))
+    # nguồn chỉ chạy trước stage chậm tối đa: 1 item feed đang chờ put + hàng đợi fast (q)
+    # + 2 worker fast đang chờ put + hàng đợi slow (q) + 1 item slow đang xử lý
+    assert max(lead) <= 1 + q + 2 + q + 1
+    assert max(lead) >= q   # và hàng đợi thực sự được dùng
+
+def test_sync_blocking_stage_runs_in_threads_concurrently():
+    def sleepy(item):
+        time.sleep(0.1)
+        return item
+
+    start = time.perf_counter()
+    results, _ = _run(run_pipeline(range(4), [Stage("io", sleepy, concurrency=4, blocking=True)]))
+    assert sorted(results) == [0, 1, 2, 3]
+    assert time.perf_counter() - start < 0.35
+
+@pytest.mark.parametrize("blocking", [False, True])
+def test_stage_error_drops_only_that_item(blocking, capsys):
+    def fetch(item):
+        if item == "BAD":
+            raise RuntimeError("boom")
+        return item
+
+    async def gate(item):
+        await asyncio.sleep(0.01)
+        return None if item == "SKIP" else item
+
+    items = ["A", "BAD", "B", "SKIP", "C"]
+    results, stats = _run(run_pipeline(items, [
+        Stage("fetch", fetch, concurrency=2, blocking=blocking, queue_size=1),
+        Stage("gate", gate, concurrency=1, queue_size=1),
+    ], label=str))
+    assert sorted(results) == ["A", "B", "C"]
+    assert stats["fetch"] == {"passed": 4, "dropped": 1, "errors": 1, "seconds": stats["fetch"]["seconds"]}
+    assert stats["gate"]["dropped"] == 1 and stats["gate"]["passed"] == 3
+    assert "BAD" in capsys.readouterr().out
+
+def test_every_item_failing_still_drains():
+    def boom(item):
+        raise ValueError(item)
+
+    results, stats = _run(run_pipeline(range(20), [
+        Stage("boom", boom, concurrency=3, queue_size=1),
+        Stage("next", lambda item: item, concurrency=2, queue_size=1),
+    ]))
+    assert results == []
+    assert stats["boom"]["errors"] == 20 and stats["next"]["passed"] == 0
+
+def test_empty_input():
+    results, stats = _run(run_pipeline([], [Stage("a", lambda x: x, concurrency=3)]))
+    assert results == [] and stats["a"]["passed"] == 0
+
+def _import_main():
+    try:
+        import main
+    except SyntaxError as e:   # telegram_bot.py dùng f-string lồng nháy (Python >= 3.12)
+        pytest.skip(f"main.py không import được trên Python này: {e}")
+    return main
+
+class _FakeOpenAI:
+    async def __aenter__(self):
+        return self
+
+    async def __aexit__(self, *exc):
+        return False
+
+def test_run_block_async_isolates_a_failing_symbol(monkeypatch):
+    main = _import_main()
+    sent = []
+
+    def fetch(item):
+        if item["symbol"] == "BAD/USDT":
+            raise RuntimeError("fetch failed")
+        item["raw"] = {}
+        return item
+
+    def enrich(item):
+        item.update(enriched={"4H": {"close": 1.0}}, candles_map={}, htf={})
+        return item
+
+    async def gpt(client, symbol, enriched, tps, test_mode=False):
+        await asyncio.sleep(0.01)
+        return {"pair": symbol}
+
+    monkeypatch.setattr(main, "BATCH_SCREEN", False)
+    monkeypatch.setattr(main, "_fetch_symbol", fetch)
+    monkeypatch.setattr(main, "_enrich_symbol", enrich)
+    monkeypatch.setattr(main, "_filter_symbol", lambda item: item)
+    monkeypatch.setattr(main, "_suggest_tps", lambda item: dict(item, tps=[]))
+    monkeypatch.setattr(main, "gpt_signal_for", gpt)
+    monkeypatch.setattr(main, "_validate_signal", lambda item: item)
+    monkeypatch.setattr(main, "_send_signal", lambda item: sent.append(item["symbol"]) or item["signal"])
+    monkeypatch.setattr(main.openai, "AsyncOpenAI", _FakeOpenAI)
+
+    symbols = ["A/USDT", "BAD/USDT", "B/USDT", "C/USDT"]
+    signals, data_by_symbol, stats = _run(main._run_block_async("test", symbols))
+    assert sorted(s["pair"] for s in signals) == ["A/USDT", "B/USDT", "C/USDT"]
+    assert sorted(sent) == ["A/USDT", "B/USDT", "C/USDT"]
+    assert sorted(data_by_symbol) == ["A/USDT", "B/USDT", "C/USDT"]
+    assert stats["fetch"]["errors"] == 1
@@ -0,0 +1,77 @@
+from datetime import datetime, timedelta, timezone
+
+from resampler import derive_timeframes, resample_candles
+
+# 1H bắt đầu 2024-01-01 22:00 UTC (giữa bucket 4H 20:00 và giữa ngày 01/01), hết ở 2024-01-03 01:00
+START = datetime(2024, 1, 1, 22, tzinfo=timezone.utc)
+
+def _hourly(count=28, tz=timezone.utc):
+    bars = []
+    for h in range(count):
+        t = (START + timedelta(hours=h)).astimezone(tz)
+        bars.append({
+            "time": t.isoformat(),
+            "open": 10.0 + h,
+            "close": 10.5 + h,
+            "high": 11.0 + h + (30.0 if h == 7 else 0.0),
+            "low": 9.0 + h - (15.0 if h == 12 else 0.0),
+            "volume": 1.0,
+        })
+    return bars
+
+def _bar(time, o, h, l, c, v):
+    return {"time": time, "open": o, "high": h, "low": l, "close": c, "volume": v}
+
+# Nến sàn trả về cho cùng khoảng (nến cuối là nến đang chạy)
+EXCHANGE_4H = [
+    _bar("2024-01-02T00:00:00+00:00", 12.0, 16.0, 11.0, 15.5, 4.0),
+    _bar("2024-01-02T04:00:00+00:00", 16.0, 48.0, 15.0, 19.5, 4.0),
+    _bar("2024-01-02T08:00:00+00:00", 20.0, 24.0, 6.0, 23.5, 4.0),
+    _bar("2024-01-02T12:00:00+00:00", 24.0, 28.0, 23.0, 27.5, 4.0),
+    _bar("2024-01-02T16:00:00+00:00", 28.0, 32.0, 27.0, 31.5, 4.0),
+    _bar("2024-01-02T20:00:00+00:00", 32.0, 36.0, 31.0, 35.5, 4.0),
+    _bar("2024-01-03T00:00:00+00:00", 36.0, 38.0, 35.0, 37.5, 2.0),
+]
+EXCHANGE_1D = [
+    _bar("2024-01-02T00:00:00+00:00", 12.0, 48.0, 6.0, 35.5, 24.0),
+    _bar("2024-01-03T00:00:00+00:00", 36.0, 38.0, 35.0, 37.5, 2.0),
+]
+
+def _ohlcv(bars):
+    return [(b["time"], b["open"], b["high"], b["low"], b["close"], b["volume"]) for b in bars]
+
+def test_matches_exchange_bars_with_running_bar():
+    hourly = _hourly()
+    assert _ohlcv(resample_candles(hourly, 4)) == _ohlcv(EXCHANGE_4H)
+    assert _ohlcv(resample_candles(hourly, 24)) == _ohlcv(EXCHANGE_1D)
+
+def test_leading_partial_bucket_is_dropped():
+    # 22:00 và 23:00 ngày 01/01 thuộc bucket 4H 20:00 / ngày 01/01 nhưng thiếu giờ đầu
+    for hours in (4, 24):
+        assert resample_candles(_hourly(), hours)[0]["time"] == "2024-01-02T00:00:00+00:00"
+
+def test_buckets_align_to_utc_whatever_the_input_offset():
+    local = _hourly(tz=timezone(timedelta(hours=7)))
+    assert _ohlcv(resample_candles(local, 4)) == _ohlcv(EXCHANGE_4H)
+    assert _ohlcv(resample_candles(local, 24)) == _ohlcv(EXCHANGE_1D)
+
+def test_epoch_ts_input_gives_same_buckets():
+    hourly = [dict(b, ts=int(datetime.fromisoformat(b.pop("time")).timestamp())) for b in _hourly()]
+    assert _ohlcv(resample_candles(hourly, 4)) == _ohlcv(EXCHANGE_4H)
+
+def test_include_partial_false_drops_only_the_running_bar():
+    assert _ohlcv(resample_candles(_hourly(), 4, include_partial=False)) == _ohlcv(EXCHANGE_4H[:-1])
+    assert _ohlcv(resample_candles(_hourly(), 24, include_partial=False)) == _ohlcv(EXCHANGE_1D[:-1])
+    # chuỗi kết thúc đúng ở giờ cuối của bucket: bucket cuối đã đóng nên được giữ
+    closed = _hourly(count=26)
+    assert _ohlcv(resample_candles(closed, 4, include_partial=False)) == _ohlcv(EXCHANGE_4H[:-1])
+    assert _ohlcv(resample_candles(closed, 24, include_partial=False)) == _ohlcv(EXCHANGE_1D[:-1])
+
+def test_derive_timeframes_limits_each_frame():
+    out = derive_timeframes(_hourly(), limit=3)
+    assert len(out["1H"]) == 3 and out["1H"][-1]["time"] == "2024-01-03T01:00:00+00:00"
+    assert _ohlcv(out["4H"]) == _ohlcv(EXCHANGE_4H[-3:])
+    assert _ohlcv(out["1D"]) == _ohlcv(EXCHANGE_1D)
+
+def test_empty_input():
+    assert resample_candles([], 4) == []
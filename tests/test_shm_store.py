@@ -0,0 +1,96 @@
+import os
+import uuid
+
+import numpy as np
+import pytest
+
+import shm_store
+
+SYMBOL, INTERVAL = "BTC/USDT", "1hour"
+
+@pytest.fixture(autouse=True)
+def prefix(monkeypatch):
+    # tên segment riêng cho từng test; dọn cả khi test lỗi
+    monkeypatch.setattr(shm_store, "SHM_PREFIX", f"t{os.getpid()}_{uuid.uuid4().hex[:8]}")
+    yield
+    shm_store.unlink_all([SYMBOL, "ETH/USDT"], [INTERVAL, "4hour"])
+
+def _row(i, close=None):
+    c = float(i) if close is None else close
+    return [i * 3600, c - 0.5, c, c + 1, c - 1, 10.0 + i]
+
+def _arrays(rows):
+    mat = np.array(rows, dtype=np.float64)
+    out = {col: mat[:, k] for k, col in enumerate(shm_store.COLUMNS)}
+    out["ts"] = out["ts"].astype(np.int64)
+    return out
+
+def _small_segment(capacity):
+    shm_store._attach(shm_store._name(SYMBOL, INTERVAL), create=True, capacity=capacity)
+
+def test_missing_segment_reads_none():
+    assert shm_store.read(SYMBOL, INTERVAL) is None
+
+def test_upsert_appends_and_updates_running_bar():
+    for i in range(3):
+        shm_store.upsert(SYMBOL, INTERVAL, _row(i))
+    shm_store.upsert(SYMBOL, INTERVAL, _row(2, close=42.0))   # cùng ts: nến đang chạy đổi giá
+    got = shm_store.read(SYMBOL, INTERVAL)
+    assert got["ts"].tolist() == [0, 3600, 7200]
+    assert got["close"].tolist() == [0.0, 1.0, 42.0]
+    assert got["high"][-1] == 43.0
+
+def test_upsert_wraps_around_capacity():
+    _small_segment(5)
+    for i in range(8):
+        shm_store.upsert(SYMBOL, INTERVAL, _row(i))
+    got = shm_store.read(SYMBOL, INTERVAL)
+    assert got["ts"].tolist() == [i * 3600 for i in range(3, 8)]
+    assert got["close"].tolist() == [3.0, 4.0, 5.0, 6.0, 7.0]
+    assert shm_store.read(SYMBOL, INTERVAL, limit=2)["ts"].tolist() == [6 * 3600, 7 * 3600]
+    # nến đang chạy ở vị trí vừa quay vòng
+    shm_store.upsert(SYMBOL, INTERVAL, _row(7, close=99.0))
+    assert shm_store.read(SYMBOL, INTERVAL, limit=1)["close"].tolist() == [99.0]
+
+def test_rows_older_than_tail_are_dropped():
+    for i in range(4):
+        shm_store.upsert(SYMBOL, INTERVAL, _row(i))
+    shm_store.upsert(SYMBOL, INTERVAL, _row(1, close=-5.0))
+    got = shm_store.read(SYMBOL, INTERVAL)
+    assert got["close"].tolist() == [0.0, 1.0, 2.0, 3.0]
+
+def test_publish_keeps_last_capacity_rows_then_upsert_continues():
+    _small_segment(4)
+    shm_store.publish(SYMBOL, INTERVAL, _arrays([_row(i) for i in range(6)]))
+    assert shm_store.read(SYMBOL, INTERVAL)["ts"].tolist() == [i * 3600 for i in range(2, 6)]
+    shm_store.upsert(SYMBOL, INTERVAL, _row(6))
+    assert shm_store.read(SYMBOL, INTERVAL)["ts"].tolist() == [i * 3600 for i in range(3, 7)]
+
+def test_read_more_than_available_returns_none():
+    for i in range(3):
+        shm_store.upsert(SYMBOL, INTERVAL, _row(i))
+    assert shm_store.read(SYMBOL, INTERVAL, limit=3) is not None
+    assert shm_store.read(SYMBOL, INTERVAL, limit=4) is None
+
+def test_read_returns_a_copy():
+    shm_store.upsert(SYMBOL, INTERVAL, _row(0))
+    got = shm_store.read(SYMBOL, INTERVAL)
+    shm_store.upsert(SYMBOL, INTERVAL, _row(0, close=7.0))
+    assert got["close"].tolist() == [0.0]
+
+def test_max_age_expires_stale_segments():
+    shm_store.upsert(SYMBOL, INTERVAL, _row(0))
+    assert shm_store.read(SYMBOL, INTERVAL, max_age=60) is not None
+    header, _ = shm_store._views(shm_store._attach(shm_store._name(SYMBOL, INTERVAL)))
+    header[shm_store._UPDATED] -= 120_000   # lần ghi cuối cách đây 2 phút
+    assert shm_store.read(SYMBOL, INTERVAL, max_age=60) is None
+    assert shm_store.read(SYMBOL, INTERVAL) is not None
+
+def test_unlink_all_removes_segments():
+    shm_store.upsert(SYMBOL, INTERVAL, _row(0))
+    shm_store.upsert("ETH/USDT", "4hour", _row(0))
+    shm_store.unlink_all([SYMBOL, "ETH/USDT"], [INTERVAL, "4hour"])
+    assert not any(k.startswith(shm_store.SHM_PREFIX) for k in shm_store._segments)
+    assert shm_store.read(SYMBOL, INTERVAL) is None
+    assert shm_store.read("ETH/USDT", "4hour") is None
+    shm_store.unlink_all([SYMBOL], [INTERVAL])   # gọi lại khi đã xoá: không lỗi
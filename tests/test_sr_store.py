@@ -0,0 +1,128 @@
+import numpy as np
+import pytest
+
+import candle_archive
+import sr_store
+from sr_store import SeriesLevels, SRStore
+
+H4 = 14400
+
+def _flat(n, start=0, price=100.0):
+    ts = (start + np.arange(n)) * H4
+    return ts, np.full(n, price + 1.0), np.full(n, price - 1.0)
+
+def _with_spike(n, at, high=None, low=None, start=0):
+    ts, highs, lows = _flat(n, start)
+    if high is not None:
+        highs[at] = high
+    if low is not None:
+        lows[at] = low
+    return ts, highs, lows
+
+def _levels(series, typ):
+    return [l for l in series.levels if l["type"] == typ]
+
+def test_pivot_confirmed_only_with_window_bars_on_both_sides():
+    s = SeriesLevels(window=2)
+    ts, highs, lows = _with_spike(6, at=3, high=110.0)
+    s.update(ts[:5], highs[:5], lows[:5], tol=1.0)
+    assert not any(l["price"] == 110.0 for l in s.levels)   # mới có 1 nến bên phải
+    s.update(ts, highs, lows, tol=1.0)
+    res = [l for l in _levels(s, "resistance") if l["price"] == 110.0]
+    assert len(res) == 1 and res[0]["ts"] == ts[3]
+
+def test_nearby_pivots_merge_into_one_level():
+    s = SeriesLevels(window=2)
+    ts, highs, lows = _flat(20)
+    highs[4], highs[12] = 110.0, 110.4
+    s.update(ts, highs, lows, tol=1.0)
+    res = [l for l in _levels(s, "resistance") if l["price"] > 105]
+    assert len(res) == 1
+    lvl = res[0]
+    assert lvl["touches"] == 2
+    assert lvl["price"] == pytest.approx(110.2)
+    assert lvl["ts"] == ts[12]
+    # độ mạnh mức cũ suy giảm 8 nến rồi cộng 1
+    assert lvl["strength"] == pytest.approx(0.5 ** (8 / sr_store.SR_HALF_LIFE_BARS) + 1.0)
+
+def test_far_pivots_stay_separate():
+    s = SeriesLevels(window=2)
+    ts, highs, lows = _flat(20)
+    highs[4], highs[12] = 110.0, 115.0
+    s.update(ts, highs, lows, tol=1.0)
+    assert sorted(l["price"] for l in _levels(s, "resistance") if l["price"] > 105) == [110.0, 115.0]
+
+def test_strength_halves_every_half_life():
+    s = SeriesLevels(window=2)
+    s.step = H4
+    lvl = {"strength": 2.0, "as_of": 0}
+    assert s._decayed(lvl, int(sr_store.SR_HALF_LIFE_BARS) * H4) == pytest.approx(1.0)
+    assert s._decayed(lvl, 2 * int(sr_store.SR_HALF_LIFE_BARS) * H4) == pytest.approx(0.5)
+
+def test_prune_drops_weak_levels_and_caps_per_type(monkeypatch):
+    monkeypatch.setattr(sr_store, "SR_MAX_LEVELS", 2)
+    s = SeriesLevels(window=2)
+    s.step = H4
+    now = 1000 * H4
+    s.levels = [
+        {"price": 90.0 + i, "type": "support", "ts": now, "touches": 1, "strength": 1.0 + i, "as_of": now}
+        for i in range(3)
+    ] + [
+        {"price": 120.0, "type": "resistance", "ts": 0, "touches": 1, "strength": 1.0, "as_of": 0},
+        {"price": 121.0, "type": "resistance", "ts": now, "touches": 1, "strength": 1.0, "as_of": now},
+    ]
+    s._prune(now)
+    # 3 support mạnh dần: giữ 2 mạnh nhất; resistance cũ 1000 nến đã suy giảm dưới ngưỡng
+    assert sorted(l["price"] for l in _levels(s, "support")) == [91.0, 92.0]
+    assert [l["price"] for l in _levels(s, "resistance")] == [121.0]
+
+def test_running_bar_is_not_fed_to_the_store(tmp_path):
+    store = SRStore(str(tmp_path / "sr.json"), seed=False)
+    ts, highs, lows = _flat(60)
+    candles = {"ts": ts, "open": highs - 1, "close": highs - 1, "high": highs, "low": lows}
+    store.levels_for("BTC-USDT", "4hour", candles)
+    assert store._series["BTC-USDT|4hour"].last_ts == ts[-2]
+    store.levels_for("ETH-USDT", "4hour", candles, running_last=False)
+    assert store._series["ETH-USDT|4hour"].last_ts == ts[-1]
+
+def test_new_series_is_seeded_from_archive(tmp_path):
+    root = str(tmp_path / "archive")
+    # lịch sử trong archive có một đáy sâu ở nến 30, trước cửa sổ 100 nến của lượt quét
+    hist_ts, hist_h, hist_l = _with_spike(200, at=30, low=50.0)
+    candle_archive.write("BTC-USDT", "4hour", {
+        "ts": hist_ts, "open": hist_h - 1, "close": hist_h - 1, "high": hist_h, "low": hist_l,
+        "volume": np.ones(200),
+    }, root=root)
+    ts, highs, lows = _flat(100, start=150)
+    candles = {"ts": ts, "open": highs - 1, "close": highs - 1, "high": highs, "low": lows}
+
+    seeded = SRStore(str(tmp_path / "sr.json"), archive_root=root)
+    levels = seeded.levels_for("BTC-USDT", "4hour", candles)
+    assert any(typ == "support" and price == 50.0 for _, price, typ in levels)
+
+    plain = SRStore(str(tmp_path / "sr2.json"), archive_root=root, seed=False)
+    assert not any(price == 50.0 for _, price, _ in plain.levels_for("BTC-USDT", "4hour", candles))
+
+def test_4h_seed_built_from_1h_archive(tmp_path):
+    root = str(tmp_path / "archive")
+    n = 200 * 4
+    ts = np.arange(n) * 3600
+    highs, lows = np.full(n, 101.0), np.full(n, 99.0)
+    highs[30 * 4 + 2] = 130.0          # đỉnh trong nến 4H thứ 30
+    candle_archive.write("BTC-USDT", "1hour", {
+        "ts": ts, "open": highs - 1, "close": highs - 1, "high": highs, "low": lows, "volume": np.ones(n),
+    }, root=root)
+    ts4, highs4, lows4 = _flat(100, start=150)
+    candles = {"ts": ts4, "open": highs4 - 1, "close": highs4 - 1, "high": highs4, "low": lows4}
+    store = SRStore(str(tmp_path / "sr.json"), archive_root=root)
+    levels = store.levels_for("BTC-USDT", "4hour", candles)
+    assert any(typ == "resistance" and price == 130.0 for _, price, typ in levels)
+
+def test_resample_from_1h_keeps_only_full_buckets():
+    ts = np.arange(2, 14) * 3600            # 02:00 .. 13:00 -> bucket 0h thiếu giờ đầu
+    px = np.arange(12, dtype=np.float64)
+    out = sr_store._resample_from_1h({"ts": ts, "high": px + 1, "low": px - 1, "close": px}, 4)
+    assert list(out["ts"]) == [4 * 3600, 8 * 3600]   # bucket 12h mới có 2 giờ
+    assert list(out["high"]) == [6.0, 10.0]
+    assert list(out["low"]) == [1.0, 5.0]
+    assert list(out["close"]) == [5.0, 9.0]
@@ -1,10 +1,15 @@
+import os
 import time
 from signal_tracker import check_signals
 
 INTERVAL_MINUTES = 30
+USE_KLINE_STREAM = os.getenv("USE_KLINE_STREAM", "0") == "1"  # "1" = đọc giá/nến từ WebSocket thay vì REST
 
 if __name__ == "__main__":
     print("Bắt đầu theo dõi tín hiệu (mỗi 30 phút)...")
+    if USE_KLINE_STREAM:
+        from kline_stream import start_background
+        start_background()
     while True:
         try:
             check_signals()